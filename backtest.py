@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+"""
+Offline backtesting of HVAC control policies against recorded history.
+
+A recorded temperature series from sensor_readings is used as the
+free-running room temperature: a first-order thermal model relaxes the
+simulated room towards it with a time constant, and heating or cooling
+push the room at a fixed rate while they run. A policy decides the mode
+at every step from the simulated temperature, and the run reports
+
+- energy: runtime of heating and cooling, weighted by their power in kW
+- comfort: time and degree-hours spent outside setpoint +/- comfort_band
+- cycles: how often heating or cooling was switched on
+
+Many configurations are evaluated in one pass: each configuration is a
+lane of a vectorized policy (HvacController accepts per-zone parameter
+arrays), so the per-step cost is shared by the whole batch. sweep()
+splits a parameter grid across a process pool on top of that.
+
+    python backtest.py --days 90 --deadband 0.25 0.5 1.0 --min-on 0 300 600
+"""
+
+import argparse
+import csv
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from controller import COOL_ON, HEAT_ON, IDLE, HvacController, setpoint_history
+from data_store import DataStore
+from protocols import ControlPolicy
+
+# Builds a policy with one lane per configuration from {parameter: array of values}
+PolicyFactory = Callable[[Dict[str, np.ndarray]], ControlPolicy]
+
+
+class ThermalModel:
+    """First-order room model driven by a recorded temperature series."""
+
+    def __init__(self, time_constant: float = 3 * 3600, heat_rate: float = 2.0,
+                 cool_rate: float = 2.0, heat_kw: float = 3.0, cool_kw: float = 2.5):
+        """
+        Args:
+            time_constant: Seconds for the room to close ~63% of the gap to the recorded temperature
+            heat_rate: °C per hour added while heating
+            cool_rate: °C per hour removed while cooling
+            heat_kw: Power drawn while heating, for the energy proxy
+            cool_kw: Power drawn while cooling, for the energy proxy
+        """
+        self.time_constant = time_constant
+        self.heat_rate = heat_rate
+        self.cool_rate = cool_rate
+        self.heat_kw = heat_kw
+        self.cool_kw = cool_kw
+
+    def step(self, temps: np.ndarray, drive: float, modes: np.ndarray, dt: float) -> np.ndarray:
+        """Room temperatures dt seconds later, holding the modes and drive constant."""
+        # exact solution of dT/dt = (drive - T) / tau + u, stable for any dt
+        equilibrium = drive + self._rates[modes] * self.time_constant
+        return equilibrium + (temps - equilibrium) * np.exp(-dt / self.time_constant)
+
+    @property
+    def _rates(self) -> np.ndarray:
+        # °C per second indexed by Mode code
+        rates = np.zeros(3)
+        rates[HEAT_ON] = self.heat_rate / 3600
+        rates[COOL_ON] = -self.cool_rate / 3600
+        return rates
+
+
+class PredictivePolicy:
+    """Feed a policy with predicted instead of current temperatures.
+
+    predict(timestamp, temps) returns the temperature expected at the
+    decision horizon for every lane, e.g. a wrapped Temp_Predictor.
+    """
+
+    def __init__(self, predict: Callable[[float, np.ndarray], np.ndarray], policy: ControlPolicy):
+        self.predict = predict
+        self.policy = policy
+
+    def step(self, timestamp: float, temps: np.ndarray, setpoints) -> np.ndarray:
+        return self.policy.step(timestamp, self.predict(timestamp, temps), setpoints)
+
+
+def threshold_policy(params: Dict[str, np.ndarray]) -> ControlPolicy:
+    """HvacController with one lane per configuration (the default policy).
+
+    Without a hysteresis parameter each lane runs until its setpoint is
+    reached (hysteresis equal to its deadband).
+    """
+    lanes = len(next(iter(params.values())))
+    params = dict(params)
+    if 'deadband' in params:
+        params.setdefault('hysteresis', params['deadband'])
+    return HvacController(range(lanes), **params)
+
+
+def valid_thresholds(params: Dict[str, float]) -> bool:
+    """Whether a configuration is accepted by HvacController."""
+    deadband = params.get('deadband', 0.5)
+    return 0 <= params.get('hysteresis', deadband) <= 2 * deadband
+
+
+def load_history(db_path: str, days: float, resolution: float = 60,
+                 sensor_id: Optional[str] = None, until: Optional[float] = None
+                 ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Recorded temperature on a regular grid, with the setpoint in force at each step.
+
+    Reads the rollup at the given resolution (per-minute means by default),
+    carries the last value forward over gaps, and looks the setpoint up in
+    the actions table.
+
+    Returns:
+        (timestamps, temperatures, setpoints), each of shape (steps,)
+    """
+    until = time.time() if until is None else until
+    store = DataStore(db_path, read_only=True)
+    try:
+        rollup = store.query_rollup(until - days * 86400, until, resolution, sensor_id, format='numpy')
+        if len(rollup['time_bucket']) == 0:
+            return np.empty(0), np.empty(0), np.empty(0)
+        if sensor_id is None and len(np.unique(rollup['sensor_id'])) > 1:
+            sensors = ', '.join(sorted(repr(s) for s in np.unique(rollup['sensor_id'])))
+            raise ValueError(f"History holds several sensors ({sensors}), choose one with sensor_id")
+
+        timestamps = np.arange(rollup['time_bucket'][0], rollup['time_bucket'][-1] + resolution, resolution)
+        # index of the latest bucket at or before each grid step
+        latest = np.searchsorted(rollup['time_bucket'], timestamps, side='right') - 1
+        temps = rollup['temperature_mean'][latest]
+        setpoints = setpoint_history(store, timestamps)
+    finally:
+        store.close()
+    return timestamps, temps, setpoints
+
+
+def run_backtest(timestamps: np.ndarray, drive: np.ndarray, setpoints: np.ndarray,
+                 policy: ControlPolicy, lanes: int, model: Optional[ThermalModel] = None,
+                 comfort_band: float = 1.0) -> Dict[str, np.ndarray]:
+    """Simulate every lane of a policy over a recorded history.
+
+    Args:
+        timestamps: Regular epoch-second grid, shape (steps,)
+        drive: Recorded (free-running) temperature per step
+        setpoints: Setpoint per step
+        policy: ControlPolicy deciding for `lanes` lanes at once
+        lanes: Number of configurations evaluated together
+        model: Thermal model, defaults to ThermalModel()
+        comfort_band: Allowed distance from the setpoint before a step counts as a violation
+
+    Returns:
+        Metric arrays of shape (lanes,): energy_kwh, heating_hours, cooling_hours,
+        cycles, violation_hours and discomfort_degree_hours
+    """
+    model = model or ThermalModel()
+    steps = len(timestamps)
+    dts = np.diff(timestamps, append=timestamps[-1] + (timestamps[-1] - timestamps[-2] if steps > 1 else 60))
+
+    temps = np.full(lanes, float(drive[0]))
+    previous = np.zeros(lanes, dtype=np.int8)
+    lane_index = np.arange(lanes)
+    # seconds spent in each mode per lane, indexed [mode, lane]
+    time_in_mode = np.zeros((3, lanes))
+    cycles = np.zeros(lanes, dtype=np.int64)
+    violation = np.zeros(lanes)
+    discomfort = np.zeros(lanes)
+
+    for step in range(steps):
+        dt = dts[step]
+        modes = policy.step(timestamps[step], temps, setpoints[step])
+        excess = np.abs(temps - setpoints[step]) - comfort_band
+        violation += (excess > 0) * dt
+        discomfort += np.maximum(excess, 0) * dt
+        time_in_mode[modes, lane_index] += dt
+        cycles += (modes != IDLE) & (previous == IDLE)
+        previous = modes.copy()
+        temps = model.step(temps, drive[step], modes, dt)
+
+    heating, cooling = time_in_mode[HEAT_ON], time_in_mode[COOL_ON]
+    return {
+        'energy_kwh': (heating * model.heat_kw + cooling * model.cool_kw) / 3600,
+        'heating_hours': heating / 3600,
+        'cooling_hours': cooling / 3600,
+        'cycles': cycles,
+        'violation_hours': violation / 3600,
+        'discomfort_degree_hours': discomfort / 3600,
+    }
+
+
+def _run_chunk(timestamps, drive, setpoints, params, policy_factory, model, comfort_band):
+    # one process-pool task: all configurations of a chunk as lanes of one policy
+    lanes = len(next(iter(params.values())))
+    return run_backtest(timestamps, drive, setpoints, policy_factory(params), lanes, model, comfort_band)
+
+
+def sweep(timestamps: np.ndarray, drive: np.ndarray, setpoints: np.ndarray,
+          grid: Dict[str, Sequence[float]], policy_factory: PolicyFactory = threshold_policy,
+          model: Optional[ThermalModel] = None, comfort_band: float = 1.0,
+          processes: Optional[int] = None,
+          constraint: Optional[Callable[[Dict[str, float]], bool]] = None) -> List[Dict[str, float]]:
+    """Backtest every combination of a parameter grid across a process pool.
+
+    The combinations are split into one chunk per process and each chunk
+    runs as a single vectorized backtest, so adding configurations costs
+    far less than adding steps.
+
+    Args:
+        grid: Parameter name -> values, e.g. {'deadband': [0.25, 0.5], 'min_on_time': [0, 300]};
+            names are keyword arguments of the policy factory
+        policy_factory: Module-level function (it is sent to worker processes)
+        processes: Worker processes, defaults to the CPU count
+        constraint: Optional filter; combinations for which it returns False are skipped
+
+    Returns:
+        One dictionary of parameters and metrics per combination, in grid order
+    """
+    names = list(grid)
+    combinations = [c for c in itertools.product(*grid.values())
+                    if constraint is None or constraint(dict(zip(names, c)))]
+    if not combinations:
+        return []
+    combinations = np.array(combinations, dtype=np.float64)
+    processes = max(1, min(processes or os.cpu_count() or 1, len(combinations)))
+    chunks = [chunk for chunk in np.array_split(np.arange(len(combinations)), processes) if len(chunk)]
+
+    if processes == 1:
+        results = [_run_chunk(timestamps, drive, setpoints,
+                              {name: combinations[chunk, i] for i, name in enumerate(names)},
+                              policy_factory, model, comfort_band) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            futures = [pool.submit(_run_chunk, timestamps, drive, setpoints,
+                                   {name: combinations[chunk, i] for i, name in enumerate(names)},
+                                   policy_factory, model, comfort_band) for chunk in chunks]
+            results = [future.result() for future in futures]
+
+    rows = []
+    for chunk, metrics in zip(chunks, results):
+        for lane, index in enumerate(chunk):
+            row = {name: float(combinations[index, i]) for i, name in enumerate(names)}
+            row.update({metric: float(values[lane]) for metric, values in metrics.items()})
+            rows.append(row)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backtest HVAC control parameters against recorded history")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'HVAC_Data.duckdb'), help="DuckDB database file")
+    parser.add_argument('--days', type=float, default=90, help="days of history to replay")
+    parser.add_argument('--resolution', type=float, default=60, help="seconds per simulation step")
+    parser.add_argument('--sensor', default=None, help="sensor id when several are recorded")
+    parser.add_argument('--deadband', type=float, nargs='+', default=[0.25, 0.5, 1.0])
+    parser.add_argument('--hysteresis', type=float, nargs='+', default=None,
+                        help="defaults to the deadband of each configuration")
+    parser.add_argument('--min-on', type=float, nargs='+', default=[0, 180, 600], help="minimum on times in seconds")
+    parser.add_argument('--min-off', type=float, nargs='+', default=[0, 180, 600], help="minimum off times in seconds")
+    parser.add_argument('--comfort-band', type=float, default=1.0, help="°C from the setpoint counted as comfortable")
+    parser.add_argument('--time-constant', type=float, default=3.0, help="thermal time constant in hours")
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--output', default=None, help="write all results to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        timestamps, drive, setpoints = load_history(args.db, args.days, args.resolution, args.sensor)
+    except ValueError as e:
+        print(f"❌ {e} (--sensor)")
+        return
+    if len(timestamps) < 2:
+        print("📭 Not enough readings in the selected range")
+        return
+
+    grid = {'deadband': args.deadband, 'min_on_time': args.min_on, 'min_off_time': args.min_off}
+    if args.hysteresis is not None:
+        grid['hysteresis'] = args.hysteresis
+
+    print(f"🔁 Backtesting over {len(timestamps):,} steps ({(timestamps[-1] - timestamps[0]) / 86400:.1f} days)")
+    started = time.perf_counter()
+    rows = sweep(timestamps, drive, setpoints, grid,
+                 model=ThermalModel(time_constant=args.time_constant * 3600),
+                 comfort_band=args.comfort_band, processes=args.processes,
+                 constraint=valid_thresholds)
+    print(f"⏱️  {len(rows)} configurations done in {time.perf_counter() - started:.2f}s")
+
+    rows.sort(key=lambda row: (row['discomfort_degree_hours'], row['energy_kwh']))
+    print(f"{'deadband':>8} {'hyst':>5} {'min_on':>7} {'min_off':>7} {'kWh':>9} {'cycles':>7} {'viol h':>8} {'°C·h':>8}")
+    for row in rows[:20]:
+        print(f"{row['deadband']:>8.2f} {row.get('hysteresis', row['deadband']):>5.2f} {row['min_on_time']:>7.0f} "
+              f"{row['min_off_time']:>7.0f} {row['energy_kwh']:>9.1f} {row['cycles']:>7.0f} "
+              f"{row['violation_hours']:>8.1f} {row['discomfort_degree_hours']:>8.1f}")
+
+    if args.output:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
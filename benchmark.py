@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the HVAC ingestion, query and dashboard paths.
+
+Runs entirely offline: DuckDB files live in a temporary directory (or
+--fixture-dir), stored history is synthesized by demo.generate_sample_data
+and the collector reads FakeBleakClient sensors, so it never touches the
+real HVAC database or Bluetooth hardware.
+
+    decode     _parse_sensor_data against decode_sensor_frames
+    write      DataStore.write_packet, per-row and buffered
+    collector  collect_from_sensors over fake sensors into a PersistenceQueue
+    timer      record_packet cost over a long run, PacketTimer and StreamingPacketTimer
+    query      read_packets / read_range / query_rollup / query_stats latency per table size
+    dashboard  load_history frames and the plotly history figure
+    dataset    feature export and HvacDataset iteration
+
+Results can be saved as JSON and compared with an earlier run:
+
+    python benchmark.py --output results.json
+    python benchmark.py --only query --query-rows 1000000 10000000 100000000 --fixture-dir fixtures/
+    python benchmark.py --baseline results.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import functools
+import json
+import logging
+import math
+import os
+import platform
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from contants import Config
+from data_store import DataStore
+from demo import generate_sample_data
+from fake_client import FakeBleakClient
+from packet_handler import _parse_sensor_data, decode_sensor_frames
+from packet_timer import PacketTimer, StreamingPacketTimer
+from persistence_queue import PersistenceQueue
+from setpoint import DEFAULT_SETPOINT
+
+BENCHMARKS = ('decode', 'write', 'collector', 'timer', 'query', 'dashboard', 'dataset')
+
+# the synthetic query fixtures: a table of N rows spans N * interval / sensors seconds
+FIXTURE_SENSORS = 4
+FIXTURE_INTERVAL = 10.0
+
+# a result this much worse than the baseline is flagged as a regression
+REGRESSION_THRESHOLD = 0.10
+
+
+def bench_write_packet(rows: int, batch_size: int = 0) -> Dict[str, float]:
+    """Measure DataStore.write_packet insert throughput.
+
+    Args:
+        rows: Number of readings to insert
+        batch_size: DataStore batch size, 0 for the per-row insert path
+
+    Returns:
+        Dictionary with elapsed seconds and rows per second
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        store = DataStore(os.path.join(tmp, 'bench.duckdb'), batch_size=batch_size, max_batch_age=60.0)
+        base = time.time()
+
+        start = time.perf_counter()
+        for i in range(rows):
+            store.write_packet(base + i, 20.0 + (i % 50) * 0.1, 40 + i % 20)
+        store.flush()
+        elapsed = time.perf_counter() - start
+
+        stored = store.conn.execute('SELECT COUNT(*) FROM sensor_readings;').fetchone()[0]
+        store.close()
+
+    if stored != rows:
+        raise RuntimeError(f"Expected {rows} rows, found {stored}")
+    return {"rows": rows, "seconds": elapsed, "rows_per_second": rows / elapsed}
+
+
+def _random_frames(count: int, seed: int = 0) -> bytes:
+    rng = np.random.default_rng(seed)
+    frames = np.zeros(count, dtype=[('temperature', '<i2'), ('humidity', 'u1'), ('battery', '<u2')])
+    frames['temperature'] = rng.integers(1500, 3500, count)
+    frames['humidity'] = rng.integers(20, 80, count)
+    frames['battery'] = 3000
+    return frames.tobytes()
+
+
+def bench_decode(frames: int, temp_correction: float = 2.7) -> Dict[str, float]:
+    """Compare the scalar and vectorized payload decoders.
+
+    Args:
+        frames: Number of 5-byte payloads to decode
+        temp_correction: Temperature correction offset
+
+    Returns:
+        Dictionary with frames per second for each decoder
+    """
+    buffer = _random_frames(frames)
+    view = memoryview(buffer)
+
+    start = time.perf_counter()
+    for offset in range(0, len(buffer), 5):
+        _parse_sensor_data(view[offset:offset + 5], temp_correction)
+    scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    decode_sensor_frames(buffer, temp_correction)
+    vectorized = time.perf_counter() - start
+
+    return {
+        "frames": frames,
+        "scalar_frames_per_second": frames / scalar,
+        "vectorized_frames_per_second": frames / vectorized,
+    }
+
+
+def _latency(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    # one untimed call first: the first query pays for planning and a cold page cache
+    fn()
+    times = np.empty(repeat)
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn()
+        times[i] = time.perf_counter() - start
+    times *= 1000
+    return {"median_ms": float(np.median(times)), "min_ms": float(times.min()), "max_ms": float(times.max())}
+
+
+def fixture_database(directory: str, rows: int, seed: int = 0) -> str:
+    """Path of a synthetic database with about `rows` readings, generated if missing.
+
+    Fixtures are named by size and deterministic for a seed, so a kept
+    --fixture-dir is generated once and reused by later runs.
+    """
+    path = os.path.join(directory, f'readings_{rows}.duckdb')
+    if not os.path.exists(path):
+        # generated under a temporary name so an interrupted run leaves no partial fixture
+        partial = path + '.partial'
+        for stale in (partial, partial + '.wal'):
+            if os.path.exists(stale):
+                os.remove(stale)
+        days = rows * FIXTURE_INTERVAL / (FIXTURE_SENSORS * 86400)
+        generate_sample_data(partial, FIXTURE_SENSORS, days, FIXTURE_INTERVAL, seed=seed)
+        os.replace(partial, path)
+    return path
+
+
+def _fixture_span(store: DataStore) -> Tuple[int, float]:
+    rows, end = store.conn.execute('SELECT count(*), max(timestamp) FROM sensor_readings;').fetchone()
+    return rows, end
+
+
+def bench_collector(sensors: int, seconds: float, notify_interval: float = 0.01) -> Dict[str, float]:
+    """Run the notify-mode collector over fake sensors into a PersistenceQueue.
+
+    The collector only logs, so the figure is the cost of receiving,
+    timing, parsing and queueing each payload; the time spent handling
+    each payload is read from the collector's metrics.
+
+    Args:
+        sensors: Number of FakeBleakClient sensors
+        seconds: How long to collect
+        notify_interval: Seconds between each sensor's notifications
+
+    Returns:
+        Dictionary with packets received and written, packets per second
+        (and the rate the fake sensors offered), microseconds of handling
+        per packet and queue statistics
+    """
+    from connection_handler import collect_from_sensors
+    from packet_handler import HANDLE_SECONDS
+
+    def handled() -> Tuple[float, int]:
+        series = [series for _, series in HANDLE_SECONDS.series()]
+        return sum(s.sum for s in series), sum(s.count for s in series)
+
+    addresses = [f"00:00:00:00:{i // 256:02X}:{i % 256:02X}" for i in range(sensors)]
+    # Config reads the device list and read mode from the environment: set them
+    # for its construction only, so callers importing this module keep theirs
+    overrides = {'DEVICE_ADDRESSES': ','.join(addresses), 'READ_MODE': 'notify'}
+    saved = {name: os.environ.get(name) for name in overrides}
+    os.environ.update(overrides)
+    try:
+        config = Config()
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+    async def collect(db_path: str) -> Tuple[float, int, Dict[str, float]]:
+        persistence = PersistenceQueue(store_factory=functools.partial(DataStore, db_path))
+        await persistence.start()
+        start = time.perf_counter()
+        timers = await collect_from_sensors(
+            config, addresses, seconds / 60, persistence,
+            client_factory=lambda address: FakeBleakClient(address, notify_interval=notify_interval),
+            max_connections=sensors
+        )
+        elapsed = time.perf_counter() - start
+        await persistence.close()
+        return elapsed, sum(timer.packet_count for timer in timers.values()), persistence.get_stats()
+
+    handled_before = handled()
+    with tempfile.TemporaryDirectory() as tmp:
+        elapsed, packets, stats = asyncio.run(collect(os.path.join(tmp, 'collector.duckdb')))
+    handle_seconds, handle_count = (after - before for after, before in zip(handled(), handled_before))
+
+    return {
+        "sensors": sensors,
+        "seconds": elapsed,
+        "packets": packets,
+        "packets_per_second": packets / elapsed,
+        "offered_per_second": sensors / notify_interval,
+        "handle_us_per_packet": handle_seconds / max(handle_count, 1) * 1e6,
+        "written": stats['written'],
+        "batches": stats['batches'],
+        "max_queue_depth": stats['max_depth'],
+    }
+
+
+def bench_packet_timer(packets: int, blocks: int = 10) -> Dict[str, Dict[str, float]]:
+    """Measure record_packet cost at the start and end of a long run.
+
+    Args:
+        packets: Packets recorded per timer
+        blocks: The run is timed in this many equal blocks
+
+    Returns:
+        Per timer class: microseconds per record_packet in the first and
+        last block, and the cost of one get_stats call at the end
+    """
+    results = {}
+    block = max(packets // blocks, 1)
+    for timer in (PacketTimer(), StreamingPacketTimer()):
+        per_block = []
+        for _ in range(blocks):
+            start = time.perf_counter()
+            for _ in range(block):
+                timer.record_packet()
+            per_block.append((time.perf_counter() - start) / block * 1e6)
+        start = time.perf_counter()
+        timer.get_stats()
+        results[type(timer).__name__] = {
+            "packets": timer.packet_count,
+            "first_block_us_per_packet": per_block[0],
+            "last_block_us_per_packet": per_block[-1],
+            "get_stats_ms": (time.perf_counter() - start) * 1000,
+        }
+    return results
+
+
+def bench_queries(db_path: str, repeat: int = 10) -> Dict[str, Dict[str, float]]:
+    """Measure read latencies against a fixture, with windows ending at its newest reading.
+
+    Args:
+        db_path: Database to query (see fixture_database)
+        repeat: Timed calls per query
+
+    Returns:
+        Median/min/max milliseconds per query, plus the table's row count
+    """
+    with DataStore(db_path, read_only=True) as store:
+        rows, end = _fixture_span(store)
+        # the dashboard asks for whole minutes per bucket so a rollup applies
+        week_resolution = math.ceil(7 * 86400 / 1500 / 60) * 60
+        return {
+            "rows": rows,
+            "read_packets_100": _latency(lambda: store.read_packets(100), repeat),
+            "read_range_1h": _latency(lambda: store.read_range(end - 3600, end), repeat),
+            "read_range_1d_one_sensor": _latency(lambda: store.read_range(end - 86400, end, 'sensor-01'), repeat),
+            "query_rollup_7d": _latency(
+                lambda: store.query_rollup(end - 7 * 86400, end, week_resolution, format='numpy'), repeat),
+            "query_stats_30d_daily": _latency(
+                lambda: store.query_stats(end - 30 * 86400, end, 86400, DEFAULT_SETPOINT), repeat),
+        }
+
+
+def bench_dashboard(db_path: str, repeat: int = 10, max_points: int = 1500) -> Dict[str, Dict[str, float]]:
+    """Measure the dashboard's data frames and figure building, caches cleared each call.
+
+    Args:
+        db_path: Database to read (see fixture_database)
+        repeat: Timed calls per measurement
+        max_points: Chart point budget, as in streamlit_app.py
+
+    Returns:
+        Median/min/max milliseconds for load_history, the plotly history
+        figure and its JSON serialization for each range, and for the
+        frame of the live section
+    """
+    from streamlit.logger import set_log_level
+    # outside `streamlit run` every cached call warns that there is no runtime
+    set_log_level(logging.ERROR)
+    import dashboard_data
+    from dashboard_charts import history_figure
+
+    store = dashboard_data.get_store(db_path)
+    try:
+        _, end = store.run(_fixture_span)
+        results = {}
+        for label, seconds in (('1h', 3600), ('24h', 86400), ('7d', 7 * 86400)):
+            def load(since=end - seconds):
+                dashboard_data.load_history.clear()
+                dashboard_data.load_rollup.clear()
+                return dashboard_data.load_history(since, end, max_points, None, db_path)
+
+            history = load()
+            figure = history_figure(history, DEFAULT_SETPOINT)
+            results[f"load_history_{label}"] = _latency(load, repeat)
+            results[f"history_figure_{label}"] = _latency(
+                lambda history=history: history_figure(history, DEFAULT_SETPOINT), repeat)
+            results[f"figure_json_{label}"] = _latency(figure.to_json, repeat)
+        # what LiveReadings does on its first refresh of a two hour window
+        results["live_frame_2h"] = _latency(
+            lambda: dashboard_data._to_frame(store.read_range(since=end - 7200, until=end)), repeat)
+        return results
+    finally:
+        dashboard_data.get_store.clear()
+
+
+def bench_dataset(db_path: str, history: int = 60, horizon: int = 15, batch_size: int = 256,
+                  samples: int = 10000) -> Dict[str, float]:
+    """Export features from a fixture and measure HvacDataset iteration.
+
+    Args:
+        db_path: Database to export (see fixture_database)
+        history, horizon: Window shape, in steps
+        batch_size: DataLoader batch size for the shuffled epoch
+        samples: Windows fetched one at a time through __getitem__
+
+    Returns:
+        Dictionary with export seconds and steps per second, windows per
+        second for one shuffled DataLoader epoch and for single-item access
+    """
+    # torch is only needed here, as in train.py
+    import torch
+    from torch.utils.data import DataLoader
+
+    from dataset import HvacDataset, collate_windows, export_features
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        meta = export_features(db_path, tmp)
+        export_seconds = time.perf_counter() - start
+
+        dataset = HvacDataset(tmp, history, horizon)
+        loader = DataLoader(dataset, batch_size=batch_size, shuffle=True,
+                            generator=torch.Generator().manual_seed(0), collate_fn=collate_windows)
+        start = time.perf_counter()
+        windows = sum(len(x) for x, _ in loader)
+        epoch_seconds = time.perf_counter() - start
+
+        indices = np.random.default_rng(0).integers(0, len(dataset), min(samples, len(dataset)))
+        start = time.perf_counter()
+        for index in indices:
+            dataset[index]
+        item_seconds = time.perf_counter() - start
+        # drop the memory maps before the directory goes away
+        del dataset, loader
+
+    return {
+        "steps": meta['rows'],
+        "columns": len(meta['columns']),
+        "export_seconds": export_seconds,
+        "export_steps_per_second": meta['rows'] / export_seconds,
+        "windows": windows,
+        "epoch_windows_per_second": windows / epoch_seconds,
+        "getitem_windows_per_second": len(indices) / item_seconds,
+    }
+
+
+def _flatten(results: Dict, prefix: str = '') -> Dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = float(value)
+    return flat
+
+
+def compare(baseline: Dict, results: Dict, threshold: float = REGRESSION_THRESHOLD) -> List[Dict[str, float]]:
+    """Relative change of every timing and rate measured in both runs.
+
+    Args:
+        baseline: 'results' of an earlier JSON report
+        results: 'results' of this run
+        threshold: Fraction by which a metric must get worse to count as a regression
+
+    Returns:
+        One dictionary per metric with its name, both values, the change
+        as a fraction of the baseline and whether it is a regression
+        (worse by more than threshold)
+    """
+    before, after = _flatten(baseline), _flatten(results)
+    rows = []
+    for name in sorted(before.keys() & after.keys()):
+        # rates should not drop, durations should not grow; counts and the
+        # (noisy) min/max of repeated calls are not compared
+        if name.endswith(('.min_ms', '.max_ms')):
+            continue
+        if name.endswith('per_second'):
+            higher_is_better = True
+        elif name.endswith(('_ms', '_per_packet', 'seconds')):
+            higher_is_better = False
+        else:
+            continue
+        if before[name] == 0:
+            continue
+        change = (after[name] - before[name]) / before[name]
+        worse = -change if higher_is_better else change
+        rows.append({"metric": name, "baseline": before[name], "current": after[name],
+                     "change": change, "regression": worse > threshold})
+    return rows
+
+
+def _print_latencies(results: Dict[str, Dict[str, float]]) -> None:
+    for name, latency in results.items():
+        if isinstance(latency, dict):
+            print(f"  {name:<26}: {latency['median_ms']:>10.2f} ms median "
+                  f"({latency['min_ms']:.2f}-{latency['max_ms']:.2f})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="HVAC ingestion, query and dashboard benchmarks")
+    parser.add_argument('--only', nargs='+', choices=BENCHMARKS, default=list(BENCHMARKS),
+                        help="benchmarks to run, all by default")
+    parser.add_argument('--rows', type=int, default=20000, help="readings per buffered run")
+    parser.add_argument('--per-row-rows', type=int, default=2000, help="readings for the (slow) per-row run")
+    parser.add_argument('--batch-size', type=int, default=5000, help="DataStore batch size for the buffered run")
+    parser.add_argument('--frames', type=int, default=1_000_000, help="payloads for the decoder benchmark")
+    parser.add_argument('--sensors', type=int, default=20, help="fake sensors for the collector benchmark")
+    parser.add_argument('--collect-seconds', type=float, default=5, help="collector benchmark duration")
+    parser.add_argument('--notify-interval', type=float, default=0.01, help="seconds between each fake sensor's packets")
+    parser.add_argument('--timer-packets', type=int, default=1_000_000, help="packets per packet timer run")
+    parser.add_argument('--query-rows', type=int, nargs='+', default=[1_000_000],
+                        help="fixture sizes for the query benchmark, e.g. 1000000 10000000 100000000")
+    parser.add_argument('--repeat', type=int, default=10, help="timed calls per query or figure")
+    parser.add_argument('--fixture-dir', default=None,
+                        help="keep generated fixtures here and reuse them (a temporary directory by default)")
+    parser.add_argument('--output', default=None, help="write the results to this JSON file")
+    parser.add_argument('--baseline', default=None, help="compare against the results of an earlier --output")
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help="relative slowdown flagged as a regression")
+    args = parser.parse_args()
+
+    results = {}
+    with contextlib.ExitStack() as stack:
+        fixture_dir = args.fixture_dir or stack.enter_context(tempfile.TemporaryDirectory())
+        os.makedirs(fixture_dir, exist_ok=True)
+        # the dashboard and dataset benchmarks use the smallest query fixture
+        smallest = min(args.query_rows)
+
+        if 'decode' in args.only:
+            print("🔎 Payload decode rate")
+            decode = results['decode'] = bench_decode(args.frames)
+            print(f"  scalar         : {decode['scalar_frames_per_second']:>12,.0f} frames/s ({decode['frames']} frames)")
+            print(f"  vectorized     : {decode['vectorized_frames_per_second']:>12,.0f} frames/s")
+            print(f"  speedup        : {decode['vectorized_frames_per_second'] / decode['scalar_frames_per_second']:>12.1f}x")
+
+        if 'write' in args.only:
+            print("\n📦 DataStore.write_packet throughput")
+            per_row = bench_write_packet(args.per_row_rows, batch_size=0)
+            print(f"  per-row INSERT : {per_row['rows_per_second']:>12,.0f} rows/s ({per_row['rows']} rows)")
+            buffered = bench_write_packet(args.rows, batch_size=args.batch_size)
+            print(f"  buffered bulk  : {buffered['rows_per_second']:>12,.0f} rows/s ({buffered['rows']} rows, batch {args.batch_size})")
+            print(f"  speedup        : {buffered['rows_per_second'] / per_row['rows_per_second']:>12.1f}x")
+            results['write'] = {'per_row': per_row, 'buffered': buffered}
+
+        if 'collector' in args.only:
+            print(f"\n📡 Collector with {args.sensors} fake sensors for {args.collect_seconds:g}s")
+            collector = results['collector'] = bench_collector(args.sensors, args.collect_seconds, args.notify_interval)
+            print(f"  received       : {collector['packets_per_second']:>12,.0f} packets/s "
+                  f"(offered {collector['offered_per_second']:,.0f})")
+            print(f"  handling       : {collector['handle_us_per_packet']:>12.1f} µs/packet")
+            print(f"  written        : {collector['written']:>12,} readings in {collector['batches']} batches, "
+                  f"max queue depth {collector['max_queue_depth']}")
+
+        if 'timer' in args.only:
+            print(f"\n⏱️  record_packet over {args.timer_packets:,} packets")
+            timers = results['timer'] = bench_packet_timer(args.timer_packets)
+            for name, timer in timers.items():
+                print(f"  {name:<21}: {timer['first_block_us_per_packet']:.2f} → "
+                      f"{timer['last_block_us_per_packet']:.2f} µs/packet, get_stats {timer['get_stats_ms']:.2f} ms")
+
+        if 'query' in args.only:
+            results['query'] = {}
+            for rows in args.query_rows:
+                start = time.perf_counter()
+                path = fixture_database(fixture_dir, rows)
+                print(f"\n🗄️  Queries at {rows:,} rows (fixture ready in {time.perf_counter() - start:.1f}s)")
+                results['query'][str(rows)] = bench_queries(path, args.repeat)
+                _print_latencies(results['query'][str(rows)])
+
+        if 'dashboard' in args.only:
+            print(f"\n📈 Dashboard at {smallest:,} rows")
+            results['dashboard'] = bench_dashboard(fixture_database(fixture_dir, smallest), args.repeat)
+            _print_latencies(results['dashboard'])
+
+        if 'dataset' in args.only:
+            print(f"\n🧠 Feature export and HvacDataset at {smallest:,} rows")
+            dataset = results['dataset'] = bench_dataset(fixture_database(fixture_dir, smallest))
+            print(f"  export         : {dataset['export_steps_per_second']:>12,.0f} steps/s "
+                  f"({dataset['steps']:,} steps × {dataset['columns']} columns)")
+            print(f"  loader epoch   : {dataset['epoch_windows_per_second']:>12,.0f} windows/s ({dataset['windows']:,} windows)")
+            print(f"  __getitem__    : {dataset['getitem_windows_per_second']:>12,.0f} windows/s")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            changes = compare(json.load(f)['results'], results, args.threshold)
+        regressions = [row for row in changes if row['regression']]
+        print(f"\n📊 Against {args.baseline}: {len(changes)} metrics compared, {len(regressions)} regressed")
+        for row in changes:
+            flag = '⚠️ ' if row['regression'] else '  '
+            print(f"{flag}{row['metric']:<58} {row['baseline']:>14,.3f} → {row['current']:>14,.3f} ({row['change']:+.1%})")
+
+    if args.output:
+        report = {
+            "created": time.time(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpus": os.cpu_count(),
+            "args": vars(args),
+            "results": results,
+        }
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\n💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
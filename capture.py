@@ -0,0 +1,342 @@
+"""
+Raw packet capture and replay.
+
+Captures are append-only binary files of everything the sensors sent:
+
+    magic  b"HVACCAP1"
+    record <B d H B> type, timestamp, device index, payload length, then payload
+
+Record type b"D" declares a device (the payload is its UTF-8 id) the first
+time it appears in a file, and b"P" holds one raw GATT payload. Replaying a
+capture pushes those payloads back through the parsing and storage path,
+either at the pace they were recorded or as fast as possible, so the
+ingestion pipeline can be load-tested without hardware and readings can be
+re-derived after calibration changes such as Config.temp_correction.
+"""
+
+import asyncio
+import inspect
+import os
+import struct
+import time
+from array import array
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from contants import Config, PacketParsingError
+from data_store import DataStore
+from packet_handler import SENSOR_FRAME_SIZE, _handle_payload, decode_sensor_frames
+from packet_timer import StreamingPacketTimer
+from persistence_queue import PersistenceQueue
+from protocols import TimerInterface
+
+CAPTURE_MAGIC = b"HVACCAP1"
+RECORD_HEADER = struct.Struct("<BdHB")
+RECORD_DEVICE = ord("D")
+RECORD_PACKET = ord("P")
+
+# bytes read from a capture at a time while replaying it
+_READ_CHUNK = 1 << 20
+
+
+class CaptureRecord(NamedTuple):
+    timestamp: float
+    device_id: str
+    payload: bytes
+
+
+class CaptureWriter:
+    """Append raw payloads to a capture file.
+
+    Reopening an existing capture drops a partial record left at its end
+    (e.g. by a collector killed mid-write) before appending, so new records
+    are never read as the tail of a broken one.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records = 0
+        self._device_index: Dict[str, int] = {}
+        end = 0
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            end, devices = _scan_complete(path)
+            # Keep appending to the same device numbering
+            for index, device_id in enumerate(devices):
+                self._device_index[device_id] = index
+            if end < os.path.getsize(path):
+                os.truncate(path, end)
+        self._file = open(path, "ab")
+        if end == 0:
+            self._file.write(CAPTURE_MAGIC)
+
+    def write(self, timestamp: float, device_id: str, payload: bytes) -> None:
+        """Append one payload received from device_id at timestamp."""
+        index = self._device_index.get(device_id)
+        if index is None:
+            index = len(self._device_index)
+            self._device_index[device_id] = index
+            name = device_id.encode("utf-8")
+            self._file.write(RECORD_HEADER.pack(RECORD_DEVICE, timestamp, index, len(name)) + name)
+        payload = bytes(payload)
+        self._file.write(RECORD_HEADER.pack(RECORD_PACKET, timestamp, index, len(payload)) + payload)
+        self.records += 1
+
+    def flush(self) -> None:
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def __enter__(self) -> 'CaptureWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+def _iter_raw(path: str) -> Iterator[tuple]:
+    header_size = RECORD_HEADER.size
+    with open(path, "rb") as f:
+        if f.read(len(CAPTURE_MAGIC)) != CAPTURE_MAGIC:
+            raise PacketParsingError(f"{path} is not an HVAC capture file")
+
+        # Read chunk by chunk; a record split across chunks is completed by the next one
+        data = b""
+        while True:
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                # Anything left is a truncated final record, e.g. the collector was killed mid-write
+                return
+            data += chunk
+            offset = 0
+            while offset + header_size <= len(data):
+                kind, timestamp, index, length = RECORD_HEADER.unpack_from(data, offset)
+                end = offset + header_size + length
+                if end > len(data):
+                    break
+                yield kind, timestamp, index, data[offset + header_size:end]
+                offset = end
+            data = data[offset:]
+
+
+def _scan_complete(path: str) -> Tuple[int, List[str]]:
+    """The length of path up to the end of its last complete record, and the devices it declares.
+
+    Only record headers and device declarations are read, so this stays
+    cheap on large captures. A file cut off inside the magic has length 0.
+    """
+    devices: List[str] = []
+    header_size = RECORD_HEADER.size
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        magic = f.read(len(CAPTURE_MAGIC))
+        if len(magic) < len(CAPTURE_MAGIC) and CAPTURE_MAGIC.startswith(magic):
+            return 0, devices
+        if magic != CAPTURE_MAGIC:
+            raise PacketParsingError(f"{path} is not an HVAC capture file")
+
+        end = len(CAPTURE_MAGIC)
+        while end + header_size <= size:
+            kind, _, _, length = RECORD_HEADER.unpack(f.read(header_size))
+            if end + header_size + length > size:
+                break
+            if kind == RECORD_DEVICE:
+                devices.append(f.read(length).decode("utf-8"))
+            else:
+                f.seek(length, os.SEEK_CUR)
+            end += header_size + length
+    return end, devices
+
+
+def read_capture(path: str) -> Iterator[CaptureRecord]:
+    """Iterate over the payloads in a capture file in recorded order."""
+    devices: Dict[int, str] = {}
+    for kind, timestamp, index, payload in _iter_raw(path):
+        if kind == RECORD_DEVICE:
+            devices[index] = payload.decode("utf-8")
+        else:
+            yield CaptureRecord(timestamp, devices[index], payload)
+
+
+class CapturingClient:
+    """Wraps a Bluetooth client and records every payload it returns or pushes."""
+
+    def __init__(self, client: Any, writer: CaptureWriter, device_id: str):
+        self._client = client
+        self._writer = writer
+        self._device_id = device_id
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+    async def __aenter__(self) -> 'CapturingClient':
+        await self._client.__aenter__()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self._client.__aexit__(exc_type, exc, tb)
+
+    async def read_gatt_char(self, char_specifier) -> bytearray:
+        data = await self._client.read_gatt_char(char_specifier)
+        self._writer.write(time.time(), self._device_id, data)
+        return data
+
+    async def start_notify(self, char_specifier, callback: Callable[[Any, bytearray], Any]) -> None:
+        async def record_and_forward(sender: Any, data: bytearray) -> None:
+            self._writer.write(time.time(), self._device_id, data)
+            result = callback(sender, data)
+            if inspect.isawaitable(result):
+                await result
+
+        await self._client.start_notify(char_specifier, record_and_forward)
+
+
+def capturing_factory(client_factory: Callable[[str], Any], writer: CaptureWriter) -> Callable[[str], CapturingClient]:
+    """Wrap a client factory (e.g. BleakClient) so every client records to writer."""
+    def factory(address: str) -> CapturingClient:
+        return CapturingClient(client_factory(address), writer, address)
+    return factory
+
+
+async def replay_capture(
+    path: str,
+    config: Config,
+    data_store: Optional[DataStore] = None,
+    persistence: Optional[PersistenceQueue] = None,
+    realtime: bool = False,
+    speed: float = 1.0,
+    chunk_size: int = 100_000,
+    packet_timer: Optional[TimerInterface] = None
+) -> Dict[str, float]:
+    """Feed a capture back through parsing and storage.
+
+    With realtime=True every payload goes through the collector's own
+    per-packet path, spaced out as recorded (divided by speed). Otherwise
+    payloads are decoded in bulk with decode_sensor_frames and written in
+    chunks, as fast as storage allows. Either way readings keep their
+    captured timestamps and are parsed with config.temp_correction.
+
+    Args:
+        path: Capture file to replay
+        config: Configuration providing temp_correction
+        data_store: Optional data store for persisting readings synchronously
+        persistence: Optional queue for persisting readings off the event loop
+        realtime: Reproduce the recorded packet spacing
+        speed: Playback speed multiplier for realtime replays
+        chunk_size: Payloads per bulk write in as-fast-as-possible mode
+        packet_timer: Timer for realtime replays, a new StreamingPacketTimer by default
+
+    Returns:
+        Dictionary with packets replayed, parse errors, elapsed seconds and packets per second
+    """
+    start = time.perf_counter()
+    if realtime:
+        packets, errors = await _replay_realtime(path, config, data_store, persistence, speed,
+                                                 packet_timer or StreamingPacketTimer())
+    else:
+        packets, errors = await _replay_fast(path, config, data_store, persistence, chunk_size)
+    elapsed = time.perf_counter() - start
+    return {
+        "packets": packets,
+        "errors": errors,
+        "seconds": elapsed,
+        "packets_per_second": packets / elapsed if elapsed > 0 else 0.0,
+    }
+
+
+async def _replay_realtime(
+    path: str,
+    config: Config,
+    data_store: Optional[DataStore],
+    persistence: Optional[PersistenceQueue],
+    speed: float,
+    packet_timer: TimerInterface
+) -> tuple:
+    packets = errors = 0
+    first_recorded: Optional[float] = None
+    started = time.monotonic()
+    for record in read_capture(path):
+        if first_recorded is None:
+            first_recorded = record.timestamp
+        delay = (record.timestamp - first_recorded) / speed - (time.monotonic() - started)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await _handle_payload(record.payload, config, packet_timer, data_store, persistence,
+                                  record.device_id, received_at=record.timestamp)
+            packets += 1
+        except PacketParsingError:
+            errors += 1
+    return packets, errors
+
+
+async def _replay_fast(
+    path: str,
+    config: Config,
+    data_store: Optional[DataStore],
+    persistence: Optional[PersistenceQueue],
+    chunk_size: int
+) -> tuple:
+    packets = errors = 0
+    devices: Dict[int, str] = {}
+    timestamps = array("d")
+    device_indexes: List[int] = []
+    frames = bytearray()
+
+    async def write_chunk() -> int:
+        if not timestamps:
+            return 0
+        temperatures, humidities = decode_sensor_frames(frames, config.temp_correction)
+        sensor_ids = [devices[i] for i in device_indexes]
+        if persistence is not None:
+            for ts, temp, hum, sensor_id in zip(timestamps, temperatures.tolist(), humidities.tolist(), sensor_ids):
+                await persistence.put(ts, temp, hum, sensor_id)
+        elif data_store is not None:
+            data_store.flush()
+            data_store.write_packets(np.frombuffer(timestamps, dtype=np.float64), temperatures, humidities, sensor_ids)
+        return len(timestamps)
+
+    for kind, timestamp, index, payload in _iter_raw(path):
+        if kind == RECORD_DEVICE:
+            devices[index] = payload.decode("utf-8")
+            continue
+        if len(payload) < SENSOR_FRAME_SIZE:
+            errors += 1
+            continue
+        timestamps.append(timestamp)
+        device_indexes.append(index)
+        frames += payload[:SENSOR_FRAME_SIZE]
+        if len(timestamps) >= chunk_size:
+            packets += await write_chunk()
+            timestamps = array("d")
+            device_indexes = []
+            frames = bytearray()
+            # Let other tasks (e.g. the persistence drain) run between chunks
+            await asyncio.sleep(0)
+
+    packets += await write_chunk()
+    return packets, errors
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Replay an HVAC packet capture into DuckDB")
+    parser.add_argument('capture', help="capture file written by the collector (CAPTURE_PATH)")
+    parser.add_argument('--db', default=None, help="DuckDB file to write readings to (default: DB_PATH)")
+    parser.add_argument('--realtime', action='store_true', help="reproduce the recorded packet spacing")
+    parser.add_argument('--speed', type=float, default=1.0, help="playback speed multiplier for --realtime")
+    args = parser.parse_args()
+
+    config = Config()
+    with DataStore(args.db or config.db_path) as store:
+        stats = asyncio.run(replay_capture(args.capture, config, data_store=store,
+                                           realtime=args.realtime, speed=args.speed))
+
+    print(f"🔁 Replayed {stats['packets']} packets in {stats['seconds']:.2f} seconds "
+          f"({stats['packets_per_second']:,.0f} packets/s, {stats['errors']} parse errors)")
+
+
+if __name__ == "__main__":
+    main()
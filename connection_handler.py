@@ -1,12 +1,21 @@
 
 import asyncio
 import datetime
-from typing import Optional
+import logging
+from typing import Callable, Dict, List, Optional
 from bleak import BleakClient, BleakScanner
 
-from contants import Config, DeviceConnectionError
-from packet_handler import parse_packet
-from packet_timer import PacketTimer
+from contants import Config, DeviceConnectionError, PacketParsingError
+from metrics import REGISTRY
+from packet_handler import parse_packet, subscribe_packets
+from packet_timer import StreamingPacketTimer
+from protocols import TimerInterface
+from persistence_queue import PersistenceQueue
+
+logger = logging.getLogger(__name__)
+
+CONNECTED = REGISTRY.gauge('hvac_connected_devices', "Sensors currently connected")
+CONNECTION_ERRORS = REGISTRY.counter('hvac_connection_errors_total', "Failed or dropped sensor connections", ('device',))
 
 
 async def scan_for_device(device_name: str = "LYWSD03MMC") -> Optional[str]:
@@ -18,57 +27,173 @@ async def scan_for_device(device_name: str = "LYWSD03MMC") -> Optional[str]:
     Returns:
         Device address if found, None otherwise
     """
-    print(f"Scanning for {device_name} device...")
+    logger.info("Scanning for %s device...", device_name)
     devices = await BleakScanner.discover(timeout=10.0)
     
     for device in devices:
         if device.name == device_name:
-            print(f"Found {device_name}: {device.address} (RSSI: signal strength)")
+            logger.info("Found %s: %s", device_name, device.address)
             return device.address
         else:
-            print(f"Found device: {device.name} - {device.address}")
+            logger.debug("Found device: %s - %s", device.name, device.address)
     
-    print(f"{device_name} device not found in scan")
+    logger.warning("%s device not found in scan", device_name)
     return None
 
 
+ClientFactory = Callable[[str], BleakClient]
+
+
+async def _read_until(
+    client: BleakClient,
+    config: Config,
+    packet_timer: TimerInterface,
+    end_time: datetime.datetime,
+    persistence: Optional[PersistenceQueue] = None,
+    sensor_id: Optional[str] = None
+) -> int:
+    """Read a connected client until end_time or until it disconnects.
+    
+    Uses GATT notifications when config.read_mode is 'notify', otherwise polls.
+    Either way a read or payload that fails is logged and counted, and
+    collection carries on.
+    
+    Returns:
+        Number of reads or payloads that failed
+    """
+    if config.read_mode == "notify":
+        return await subscribe_packets(client, config, packet_timer, end_time, persistence=persistence,
+                                       sensor_id=sensor_id)
+    
+    errors = 0
+    while client.is_connected and datetime.datetime.now() < end_time:
+        logger.debug("Attempting to read temperature/humidity data...")
+        try:
+            await parse_packet(client, config, packet_timer, persistence=persistence, sensor_id=sensor_id)
+        except PacketParsingError as e:
+            # already counted under PARSE_ERRORS or READ_ERRORS by parse_packet
+            errors += 1
+            logger.warning("❌ %s: %s", sensor_id or client.address, e)
+        await asyncio.sleep(config.packet_interval / 1000)
+    return errors
+
+
 async def connect_and_read_sensor(
     config: Config,
-    packet_timer: PacketTimer,
-    duration_minutes: int = 5
+    packet_timer: TimerInterface,
+    duration_minutes: int = 5,
+    persistence: Optional[PersistenceQueue] = None,
+    client_factory: ClientFactory = BleakClient
 ) -> None:
     """Connect to the HVAC sensor and read data for the specified duration.
     
     Args:
         config: Configuration object containing device settings
-        packet_timer: PacketTimer instance for tracking intervals
+        packet_timer: TimerInterface instance for tracking intervals
         duration_minutes: How long to monitor in minutes
+        persistence: Optional queue that persists readings off the event loop
+        client_factory: Builds a client for an address (BleakClient or a fake)
         
     Raises:
         DeviceConnectionError: If connection to device fails
     """
     device_info = config.device_info
-    print(f"Connecting to {device_info['name']} device")
-    print(f"MAC Address: {device_info['address']}")
-    print(f"Will monitor for {duration_minutes} minutes to calculate packet intervals")
-    print("=" * 60)
+    logger.info("Connecting to %s device", device_info['name'])
+    logger.info("MAC Address: %s", device_info['address'])
+    logger.info("Will monitor for %s minutes to calculate packet intervals", duration_minutes)
     
     try:
-        async with BleakClient(device_info['address']) as client:
-            print(f"Connected: {client.is_connected}")
+        async with client_factory(device_info['address']) as client:
+            logger.info("Connected: %s", client.is_connected)
             
             start_time = datetime.datetime.now()
             end_time = start_time + datetime.timedelta(minutes=duration_minutes)
             
-            while client.is_connected and datetime.datetime.now() < end_time:
-                print(f"\nAttempting to read temperature/humidity data...")
-                await parse_packet(client, config, packet_timer)
-                await asyncio.sleep(config.packet_interval)
+            CONNECTED.inc()
+            try:
+                await _read_until(client, config, packet_timer, end_time, persistence, device_info['address'])
+            finally:
+                CONNECTED.dec()
             
-            # Print final statistics
-            print("\n" + "🏁 FINAL PACKET INTERVAL ANALYSIS ".center(80, "="))
-            packet_timer.print_detailed_stats()
-            print("="*80)
+            logger.debug("Final packet timing for %s:\n%s", device_info['address'], packet_timer.format_stats())
             
     except Exception as e:
+        CONNECTION_ERRORS.labels(device_info['address']).inc()
         raise DeviceConnectionError(f"Failed to connect to device: {e}")
+
+
+async def _collect_one(
+    address: str,
+    config: Config,
+    packet_timer: TimerInterface,
+    end_time: datetime.datetime,
+    connection_slots: asyncio.Semaphore,
+    persistence: Optional[PersistenceQueue],
+    client_factory: ClientFactory,
+    errors: Dict[str, Exception]
+) -> None:
+    """Read one device until end_time, recording (not raising) connection failures."""
+    async with connection_slots:
+        if datetime.datetime.now() >= end_time:
+            return
+        try:
+            async with client_factory(address) as client:
+                logger.info("Connected to %s: %s", address, client.is_connected)
+                CONNECTED.inc()
+                try:
+                    await _read_until(client, config, packet_timer, end_time, persistence, address)
+                finally:
+                    CONNECTED.dec()
+        except Exception as e:
+            # One unreachable sensor must not cancel the rest of the task group
+            errors[address] = DeviceConnectionError(f"Failed to connect to device {address}: {e}")
+            CONNECTION_ERRORS.labels(address).inc()
+            logger.error("❌ %s", errors[address])
+
+
+async def collect_from_sensors(
+    config: Config,
+    device_addresses: Optional[List[str]] = None,
+    duration_minutes: float = 5,
+    persistence: Optional[PersistenceQueue] = None,
+    client_factory: ClientFactory = BleakClient,
+    max_connections: Optional[int] = None
+) -> Dict[str, StreamingPacketTimer]:
+    """Read many sensors concurrently, one task per device.
+    
+    All devices share the same persistence queue; every reading is tagged
+    with the address of the sensor it came from. Devices beyond
+    max_connections wait for a free connection slot.
+    
+    Args:
+        config: Configuration object containing device settings
+        device_addresses: Addresses to read, defaults to config.device_addresses
+        duration_minutes: How long to monitor in minutes
+        persistence: Optional queue that persists readings off the event loop
+        client_factory: Builds a client for an address (BleakClient or a fake)
+        max_connections: Cap on simultaneous BLE connections, defaults to config.max_connections
+        
+    Returns:
+        StreamingPacketTimer for each device address
+        
+    Raises:
+        DeviceConnectionError: If no device could be read
+    """
+    addresses = device_addresses if device_addresses is not None else config.device_addresses
+    slots = asyncio.Semaphore(max_connections or config.max_connections)
+    timers = {address: StreamingPacketTimer() for address in addresses}
+    errors: Dict[str, Exception] = {}
+    end_time = datetime.datetime.now() + datetime.timedelta(minutes=duration_minutes)
+    
+    logger.info("Collecting from %d sensors for %s minutes", len(addresses), duration_minutes)
+    
+    async with asyncio.TaskGroup() as group:
+        for address in addresses:
+            group.create_task(_collect_one(
+                address, config, timers[address], end_time, slots,
+                persistence, client_factory, errors
+            ))
+    
+    if addresses and len(errors) == len(addresses):
+        raise DeviceConnectionError(f"Failed to connect to any device: {list(errors.values())}")
+    return timers
@@ -32,10 +32,22 @@ class Config:
         
         # Conditionally set MAC address based on OS
         self.current_os = platform.system()
-        if self.current_os == "Darwin":  # macOS
+        addresses = os.getenv('DEVICE_ADDRESSES')
+        if addresses:
+            # Comma-separated list for multi-sensor collection
+            self.device_addresses = [a.strip() for a in addresses.split(',') if a.strip()]
+            if not self.device_addresses:
+                raise ConfigurationError("Environment variable 'DEVICE_ADDRESSES' contains no addresses")
+            self.device_address = self.device_addresses[0]
+        elif self.current_os == "Darwin":  # macOS
             self.device_address = self._get_required_env('DEVICE_ADDRESS_MACOS')
+            self.device_addresses = [self.device_address]
         else:
             self.device_address = self._get_required_env('DEVICE_ADDRESS')
+            self.device_addresses = [self.device_address]
+        
+        # Maximum simultaneous BLE connections for multi-sensor collection
+        self.max_connections = int(self._get_required_env('MAX_CONNECTIONS', '5'))
             
         self.temperature_humidity_uuid = self._get_required_env(
             'TEMPERATURE_HUMIDITY_UUID',
@@ -47,6 +59,42 @@ class Config:
         
         # Expected packet interval in milliseconds
         self.packet_interval = 1000
+        
+        # 'poll' reads the characteristic every packet_interval,
+        # 'notify' subscribes and lets the sensor push readings
+        self.read_mode = self._get_required_env('READ_MODE', 'poll')
+        if self.read_mode not in ('poll', 'notify'):
+            raise ConfigurationError(f"READ_MODE must be 'poll' or 'notify', got '{self.read_mode}'")
+        
+        # Persistence settings
+        self.db_path = self._get_required_env('DB_PATH', 'HVAC_Data.duckdb')
+        self.queue_capacity = int(self._get_required_env('QUEUE_CAPACITY', '10000'))
+        self.queue_policy = self._get_required_env('QUEUE_POLICY', 'block')
+        self.queue_spill_path = os.getenv('QUEUE_SPILL_PATH')
+        
+        # Optional raw packet capture file for later replay
+        self.capture_path = os.getenv('CAPTURE_PATH')
+        
+        # Optional model (exported .npz artifact or train.py checkpoint) for live HVAC decisions
+        self.model_path = os.getenv('MODEL_PATH')
+        self.inference_max_batch = int(self._get_required_env('INFERENCE_MAX_BATCH', '64'))
+        self.inference_max_delay = float(self._get_required_env('INFERENCE_MAX_DELAY_MS', '5')) / 1000
+        
+        # Console output: INFO shows connections and summaries, DEBUG adds every packet
+        self.log_level = self._get_required_env('LOG_LEVEL', 'INFO').upper()
+        if self.log_level not in ('DEBUG', 'INFO', 'WARNING', 'ERROR'):
+            raise ConfigurationError(f"LOG_LEVEL must be DEBUG, INFO, WARNING or ERROR, got '{self.log_level}'")
+        
+        # Optional metrics export: a local Prometheus endpoint and/or a file rewritten periodically
+        metrics_port = os.getenv('METRICS_PORT')
+        self.metrics_port = int(metrics_port) if metrics_port else None
+        self.metrics_path = os.getenv('METRICS_PATH')
+        self.metrics_interval = float(self._get_required_env('METRICS_INTERVAL', '15'))
+        
+        # Local endpoint through which the dashboard reads the database while the collector
+        # has it open (DuckDB allows one process per file); an empty STORE_PORT disables it
+        store_port = os.getenv('STORE_PORT', '8766')
+        self.store_port = int(store_port) if store_port else None
     
     def _get_required_env(self, key: str, default: Optional[str] = None) -> str:
         """Get environment variable with optional default value."""
@@ -0,0 +1,326 @@
+#!/usr/bin/env python3
+"""
+Vectorized HVAC decision engine.
+
+actions.hvac_action decides for one prediction at a time with a stateless
+deadband. This module decides for many zones at once with NumPy and adds
+the state a real compressor needs:
+
+- hysteresis: heating switches on below setpoint - deadband but only
+  switches off once the temperature is back above
+  setpoint - deadband + hysteresis (cooling mirrors this), so a
+  temperature hovering at the threshold does not toggle the output
+- minimum on/off times: a zone stays in a mode for at least min_on_time
+  seconds and stays idle for at least min_off_time seconds before it is
+  switched on again, which prevents compressor short-cycling
+
+Modes are small integer codes (Mode) rather than strings. HvacController
+steps all zones forward for live use and buffers transitions so they can
+be logged with one DataStore.write_actions call. simulate() applies the
+same rules to a whole history; it walks from transition to transition
+instead of from sample to sample, so a year of minute data takes well
+under a second per zone.
+
+    python controller.py --days 365 --resolution 60
+"""
+
+import argparse
+import os
+import time
+from enum import IntEnum
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from data_store import DataStore
+from setpoint import SETPOINT_ACTION
+
+
+class Mode(IntEnum):
+    """HVAC output state, stored as int8 in decision arrays."""
+    IDLE = 0
+    HEAT_ON = 1
+    COOL_ON = 2
+
+
+# Mode code -> action name as logged in the actions table (same names as hvac_action)
+MODE_NAMES = np.array([mode.name for mode in Mode], dtype=object)
+
+# plain int codes for per-step code paths, where Enum attribute lookups add up
+IDLE, HEAT_ON, COOL_ON = (int(mode) for mode in Mode)
+
+
+def decide(pred_temps, setpoints, deadband: float = 0.5) -> np.ndarray:
+    """Stateless vectorized hvac_action: Mode codes for arrays of predictions.
+
+    Args:
+        pred_temps: Predicted temperatures, any shape
+        setpoints: Target temperatures, broadcastable to pred_temps
+        deadband: Half-width of the band around the setpoint where nothing runs
+
+    Returns:
+        int8 array of Mode codes with the shape of pred_temps
+    """
+    pred_temps = np.asarray(pred_temps, dtype=np.float64)
+    setpoints = np.asarray(setpoints, dtype=np.float64)
+    modes = np.zeros(pred_temps.shape, dtype=np.int8)
+    modes[pred_temps > setpoints + deadband] = Mode.COOL_ON
+    modes[pred_temps < setpoints - deadband] = Mode.HEAT_ON
+    return modes
+
+
+class HvacController:
+    """
+    Stateful decisions for a fixed set of zones.
+
+    Each call to step() moves every zone forward to one timestamp. Mode
+    changes are kept in a buffer until flush() writes them to the actions
+    table in a single bulk insert.
+    """
+
+    def __init__(self, zones: Sequence[str], deadband: float = 0.5, hysteresis: float = 0.5,
+                 min_on_time: float = 180.0, min_off_time: float = 180.0):
+        """
+        Args:
+            zones: Zone (sensor) names, one per column of the temperature arrays
+            deadband: Half-width of the band around the setpoint
+            hysteresis: How far back inside the band a zone must get before it is
+                switched off; equal to deadband means "run until the setpoint is reached"
+            min_on_time: Seconds a zone must stay heating/cooling once switched on
+            min_off_time: Seconds a zone must stay idle before it is switched on again
+
+        The four parameters may also be arrays with one value per zone, which
+        is how backtest.py evaluates many configurations in one pass.
+        """
+        if np.any(np.asarray(hysteresis) < 0) or np.any(np.asarray(hysteresis) > 2 * np.asarray(deadband)):
+            raise ValueError("hysteresis must be between 0 and 2 * deadband")
+        self.zones = list(zones)
+        self.deadband = deadband
+        self.hysteresis = hysteresis
+        self.min_on_time = min_on_time
+        self.min_off_time = min_off_time
+
+        self.modes = np.zeros(len(self.zones), dtype=np.int8)
+        # time of each zone's last switch; -inf lets the first decision act immediately
+        self.switched_at = np.full(len(self.zones), -np.inf)
+        self._pending: List[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = []
+
+    def step(self, timestamp: float, temps, setpoints) -> np.ndarray:
+        """Advance every zone to timestamp and return the new modes.
+
+        Args:
+            timestamp: Epoch seconds of this decision
+            temps: Current or predicted temperature per zone
+            setpoints: Target temperature, scalar or per zone
+
+        Returns:
+            int8 array of Mode codes, one per zone (a view of the controller state)
+        """
+        temps = np.asarray(temps, dtype=np.float64)
+        setpoints = np.asarray(setpoints, dtype=np.float64)
+        heat_on, heat_off, cool_on, cool_off = _thresholds(setpoints, self.deadband, self.hysteresis)
+        elapsed = timestamp - self.switched_at
+        idle = self.modes == IDLE
+        may_start = idle & (elapsed >= self.min_off_time)
+        may_stop = ~idle & (elapsed >= self.min_on_time)
+
+        new_modes = self.modes.copy()
+        new_modes[may_start & (temps < heat_on)] = HEAT_ON
+        new_modes[may_start & (temps > cool_on)] = COOL_ON
+        new_modes[may_stop & (self.modes == HEAT_ON) & (temps >= heat_off)] = IDLE
+        new_modes[may_stop & (self.modes == COOL_ON) & (temps <= cool_off)] = IDLE
+
+        changed = np.flatnonzero(new_modes != self.modes)
+        if len(changed):
+            self.modes[changed] = new_modes[changed]
+            self.switched_at[changed] = timestamp
+            self._pending.append((np.full(len(changed), timestamp), changed, self.modes[changed].copy(),
+                                  np.broadcast_to(setpoints, temps.shape)[changed].copy()))
+        return self.modes
+
+    @property
+    def pending_count(self) -> int:
+        # number of transitions waiting to be logged
+        return sum(len(batch[1]) for batch in self._pending)
+
+    def take_pending(self) -> Optional[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]]:
+        """Remove buffered transitions and return them as write_actions arguments.
+
+        Returns:
+            (timestamps, action names, target temps, zones) arrays, or None if
+            nothing is buffered
+        """
+        if not self._pending:
+            return None
+        pending, self._pending = self._pending, []
+        timestamps, zone_index, modes, setpoints = (np.concatenate(column) for column in zip(*pending))
+        return timestamps, MODE_NAMES[modes], setpoints, np.asarray(self.zones, dtype=object)[zone_index]
+
+    def restore_pending(self, pending: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]) -> None:
+        """Put transitions returned by take_pending back in front of the buffer.
+
+        Used when logging them failed, so the next flush tries again.
+        """
+        timestamps, names, setpoints, zones = pending
+        zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        self._pending.insert(0, (np.asarray(timestamps, dtype=np.float64),
+                                 np.array([zone_index[zone] for zone in zones], dtype=np.intp),
+                                 np.array([Mode[name] for name in names], dtype=np.int8),
+                                 np.asarray(setpoints, dtype=np.float64)))
+
+    def flush(self, store: DataStore) -> int:
+        """Log buffered transitions with one write_actions call, returns the row count."""
+        pending = self.take_pending()
+        return store.write_actions(*pending) if pending is not None else 0
+
+
+def _thresholds(setpoints, deadband: float, hysteresis: float):
+    # (heat on, heat off, cool on, cool off) temperatures
+    return (setpoints - deadband, setpoints - deadband + hysteresis,
+            setpoints + deadband, setpoints + deadband - hysteresis)
+
+
+def _next_at_or_after(candidates: np.ndarray, index: int) -> int:
+    # first candidate index >= index, or -1
+    position = np.searchsorted(candidates, index)
+    return int(candidates[position]) if position < len(candidates) else -1
+
+
+def _simulate_zone(timestamps: np.ndarray, temps: np.ndarray, setpoints: np.ndarray,
+                   deadband: float, hysteresis: float, min_on_time: float, min_off_time: float) -> np.ndarray:
+    heat_on, heat_off, cool_on, cool_off = _thresholds(setpoints, deadband, hysteresis)
+    # indices where each switch condition holds; the walk below only ever
+    # searches these, so its cost is per transition rather than per sample
+    start_heat = np.flatnonzero(temps < heat_on)
+    start_cool = np.flatnonzero(temps > cool_on)
+    stop_heat = np.flatnonzero(temps >= heat_off)
+    stop_cool = np.flatnonzero(temps <= cool_off)
+
+    n = len(timestamps)
+    modes = np.zeros(n, dtype=np.int8)
+    # a zone switches at most once per sample, so after a switch at index the
+    # next one is searched from index + 1
+    mode, index, first, switched_at = Mode.IDLE, 0, 0, -np.inf
+    while first < n:
+        if mode == Mode.IDLE:
+            # earliest sample allowed to start, then the earliest start condition from there
+            earliest = max(first, int(np.searchsorted(timestamps, switched_at + min_off_time)))
+            heat = _next_at_or_after(start_heat, earliest)
+            cool = _next_at_or_after(start_cool, earliest)
+            candidates = [(i, m) for i, m in ((heat, Mode.HEAT_ON), (cool, Mode.COOL_ON)) if i >= 0]
+            if not candidates:
+                break
+            index, mode = min(candidates)
+        else:
+            earliest = max(first, int(np.searchsorted(timestamps, switched_at + min_on_time)))
+            stop = _next_at_or_after(stop_heat if mode == Mode.HEAT_ON else stop_cool, earliest)
+            modes[index:n if stop < 0 else stop] = mode
+            if stop < 0:
+                break
+            index, mode = stop, Mode.IDLE
+        first, switched_at = index + 1, timestamps[index]
+    return modes
+
+
+def simulate(timestamps, temps, setpoints, deadband: float = 0.5, hysteresis: float = 0.5,
+             min_on_time: float = 180.0, min_off_time: float = 180.0) -> np.ndarray:
+    """Decisions HvacController.step would make at every sample of a history.
+
+    Every zone starts idle with no minimum time pending, like a new controller.
+
+    Args:
+        timestamps: Increasing epoch seconds, shape (n,)
+        temps: Temperatures, shape (n,) or (n, zones)
+        setpoints: Target temperatures: a scalar, shape (n,) per sample, or shape (n, zones)
+        deadband, hysteresis, min_on_time, min_off_time: As for HvacController
+
+    Returns:
+        int8 array of Mode codes with the shape of temps
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    temps = np.asarray(temps, dtype=np.float64)
+    single_zone = temps.ndim == 1
+    temps = temps.reshape(len(timestamps), -1)
+    setpoints = np.asarray(setpoints, dtype=np.float64)
+    if setpoints.ndim == 1:
+        # one setpoint per sample, shared by every zone
+        setpoints = setpoints[:, None]
+    setpoints = np.broadcast_to(setpoints, temps.shape)
+
+    modes = np.empty(temps.shape, dtype=np.int8)
+    for zone in range(temps.shape[1]):
+        modes[:, zone] = _simulate_zone(timestamps, temps[:, zone], setpoints[:, zone],
+                                        deadband, hysteresis, min_on_time, min_off_time)
+    return modes[:, 0] if single_zone else modes
+
+
+def transitions(timestamps, modes, zones: Optional[Sequence[str]] = None):
+    """Mode changes in a simulated history, ready for DataStore.write_actions.
+
+    Returns:
+        (timestamps, action names, zone names) of every sample where a zone's
+        mode differs from the previous sample (a zone starting in a non-idle
+        mode counts as a change)
+    """
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    modes = np.asarray(modes).reshape(len(timestamps), -1)
+    zones = np.asarray(zones if zones is not None else [None] * modes.shape[1], dtype=object)
+    previous = np.vstack([np.zeros((1, modes.shape[1]), dtype=modes.dtype), modes[:-1]])
+    rows, columns = np.nonzero(modes != previous)
+    return timestamps[rows], MODE_NAMES[modes[rows, columns]], zones[columns]
+
+
+def setpoint_history(store: DataStore, timestamps, default: float = 22.0) -> np.ndarray:
+    """The setpoint in force at each timestamp, from the target_temp of the latest earlier setpoint change."""
+    actions = store.read_actions(action_name=SETPOINT_ACTION, format='numpy')
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if len(actions['timestamp']) == 0:
+        return np.full(len(timestamps), default)
+    position = np.searchsorted(actions['timestamp'], timestamps, side='right') - 1
+    return np.where(position >= 0, actions['target_temp'][np.maximum(position, 0)], default)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate HVAC decisions over stored history")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'HVAC_Data.duckdb'), help="DuckDB database file")
+    parser.add_argument('--days', type=float, default=365, help="days of history to simulate")
+    parser.add_argument('--resolution', type=float, default=60, help="seconds per decision")
+    parser.add_argument('--deadband', type=float, default=0.5)
+    parser.add_argument('--hysteresis', type=float, default=0.5)
+    parser.add_argument('--min-on', type=float, default=180, help="minimum on time in seconds")
+    parser.add_argument('--min-off', type=float, default=180, help="minimum off time in seconds")
+    args = parser.parse_args()
+
+    store = DataStore(args.db, read_only=True)
+    until = time.time()
+    rollup = store.query_rollup(until - args.days * 86400, until, args.resolution, format='numpy')
+    if len(rollup['time_bucket']) == 0:
+        print("📭 No readings in the selected range")
+        return
+
+    # one column per sensor on a shared time grid, gaps carried forward
+    zones, zone_index = np.unique(rollup['sensor_id'], return_inverse=True)
+    timestamps, time_index = np.unique(rollup['time_bucket'], return_inverse=True)
+    temps = np.full((len(timestamps), len(zones)), np.nan)
+    temps[time_index, zone_index] = rollup['temperature_mean']
+    for zone in range(len(zones)):
+        valid = np.flatnonzero(~np.isnan(temps[:, zone]))
+        temps[:, zone] = temps[valid[np.maximum(np.searchsorted(valid, np.arange(len(timestamps)), side='right') - 1, 0)], zone]
+    setpoints = setpoint_history(store, timestamps)[:, None]
+    store.close()
+
+    started = time.perf_counter()
+    modes = simulate(timestamps, temps, setpoints, args.deadband, args.hysteresis, args.min_on, args.min_off)
+    elapsed = time.perf_counter() - started
+
+    print(f"🧮 Simulated {modes.size:,} decisions ({len(timestamps):,} steps × {len(zones)} zones) in {elapsed:.3f}s")
+    changes = transitions(timestamps, modes, zones)[0]
+    print(f"🔁 Transitions: {len(changes):,}")
+    for zone, name in enumerate(zones):
+        heating = np.mean(modes[:, zone] == Mode.HEAT_ON)
+        cooling = np.mean(modes[:, zone] == Mode.COOL_ON)
+        print(f"   {name or 'default'}: heating {heating:.1%}, cooling {cooling:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Plotly figures for the Streamlit dashboard.
+
+Kept free of Streamlit calls so the figures can be built (and timed by
+benchmark.py) outside a running app; streamlit_app.py caches them.
+"""
+
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
+
+def history_figure(history, target_temp):
+    """Build the historical temperature/humidity figure.
+
+    Args:
+        history: load_history result, {'temperature': frame, 'humidity': frame}
+        target_temp: Target temperature drawn as a dashed line
+
+    Returns:
+        plotly Figure with one subplot per series
+    """
+    temperature_series = history['temperature']
+    humidity_series = history['humidity']
+    # Markers only help when points are sparse
+    trace_mode = 'lines+markers' if len(temperature_series) <= 200 else 'lines'
+    
+    # Create subplots with shared x-axis
+    fig = make_subplots(
+        rows=2, cols=1,
+        subplot_titles=('Temperature Over Time', 'Humidity Over Time'),
+        vertical_spacing=0.12,
+        specs=[[{"secondary_y": False}], [{"secondary_y": False}]]
+    )
+    
+    # Temperature graph
+    fig.add_trace(
+        go.Scatter(
+            x=temperature_series['timestamp'],
+            y=temperature_series['value'],
+            mode=trace_mode,
+            name='Temperature',
+            line=dict(color='#00d4ff', width=3),
+            marker=dict(size=6, color='#00d4ff'),
+            hovertemplate='<b>Time:</b> %{x|%H:%M:%S}<br><b>Temp:</b> %{y:.1f}°C<extra></extra>'
+        ),
+        row=1, col=1
+    )
+    
+    # Add target temperature line
+    fig.add_hline(
+        y=target_temp,
+        line_dash="dash",
+        line_color="rgba(255, 100, 100, 0.5)",
+        annotation_text=f"Target: {target_temp:.1f}°C",
+        annotation_position="right",
+        row=1, col=1
+    )
+    
+    # Humidity graph
+    fig.add_trace(
+        go.Scatter(
+            x=humidity_series['timestamp'],
+            y=humidity_series['value'],
+            mode=trace_mode,
+            name='Humidity',
+            line=dict(color='#00ff9f', width=3),
+            marker=dict(size=6, color='#00ff9f'),
+            hovertemplate='<b>Time:</b> %{x|%H:%M:%S}<br><b>Humidity:</b> %{y:.0f}%<extra></extra>'
+        ),
+        row=2, col=1
+    )
+    
+    # Update layout for dark theme
+    fig.update_layout(
+        height=700,
+        showlegend=False,
+        hovermode='x unified',
+        plot_bgcolor='rgba(20, 20, 40, 0.8)',
+        paper_bgcolor='rgba(0, 0, 0, 0)',
+        font=dict(color='#e0e0e0', size=12),
+        margin=dict(l=50, r=50, t=80, b=50)
+    )
+    
+    # Update x-axes
+    fig.update_xaxes(
+        showgrid=True,
+        gridwidth=1,
+        gridcolor='rgba(100, 100, 120, 0.2)',
+        showline=True,
+        linewidth=2,
+        linecolor='rgba(0, 212, 255, 0.3)',
+        color='#a0a0c0'
+    )
+    
+    # Update y-axes
+    fig.update_yaxes(
+        title_text="Temperature (°C)",
+        showgrid=True,
+        gridwidth=1,
+        gridcolor='rgba(100, 100, 120, 0.2)',
+        showline=True,
+        linewidth=2,
+        linecolor='rgba(0, 212, 255, 0.3)',
+        color='#a0a0c0',
+        row=1, col=1
+    )
+    
+    fig.update_yaxes(
+        title_text="Humidity (%)",
+        showgrid=True,
+        gridwidth=1,
+        gridcolor='rgba(100, 100, 120, 0.2)',
+        showline=True,
+        linewidth=2,
+        linecolor='rgba(0, 212, 255, 0.3)',
+        color='#a0a0c0',
+        row=2, col=1
+    )
+    
+    return fig
@@ -0,0 +1,312 @@
+"""
+Data layer for the Streamlit dashboard.
+
+Every browser session runs streamlit_app.py in its own thread, so anything
+a session computes for itself is repeated once per wall display. This
+module keeps the expensive parts process-wide instead:
+
+- one DashboardStore shared by all sessions via st.cache_resource, plus
+  one DashboardSetpoints on top of it
+- aggregate queries cached with st.cache_data and a short TTL
+- chart series capped at a point budget (rollups or LTTB), so the
+  payload per refresh does not grow with stored history
+- summary statistics aggregated in DuckDB from the 1-minute rollup,
+  so a render never scans raw readings
+- one shared LiveReadings frame that fetches only rows newer than the
+  last one it has seen, at most once per refresh interval
+
+DuckDB lets only one process at a time open a database file for writing,
+and a read-only open fails too while another process holds it. So while
+the collector runs, it owns the file and the dashboard sends its queries
+and setpoint changes to the collector's store endpoint (STORE_URL, see
+store_server.py). With no collector serving the file, the dashboard opens
+it itself but never keeps a connection: every query opens the file
+read-only, runs and closes it again, and setpoint changes open it for
+writing just as briefly. An open that finds the file locked is retried
+with backoff before DatabaseUnavailable is raised.
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+import duckdb
+import pandas as pd
+import streamlit as st
+
+from data_store import DataStore
+from downsample import lttb_indices
+from features import local_timezone
+from store_server import (DEFAULT_STORE_PORT, WRITE_METHODS, StoreNotServed, StoreRequestError, call_store,
+                          run_method)
+
+DEFAULT_DB_PATH = os.getenv('DB_PATH', 'HVAC_Data.duckdb')
+# the collector's store endpoint; empty to always open the file directly
+DEFAULT_STORE_URL = os.getenv('STORE_URL', f'http://127.0.0.1:{DEFAULT_STORE_PORT}')
+# IANA zone the dashboard shows times and per-day/per-hour statistics in
+LOCAL_TIMEZONE = local_timezone()
+READING_COLUMNS = ['timestamp', 'temperature', 'humidity', 'sensor_id']
+ROLLUP_COLUMNS = ['bucket', 'sensor_id', 'count',
+                  'temperature_mean', 'temperature_min', 'temperature_max',
+                  'humidity_mean', 'humidity_min', 'humidity_max']
+STATS_COLUMNS = ['period_start', 'count',
+                 'temperature_mean', 'temperature_min', 'temperature_max',
+                 'humidity_mean', 'humidity_min', 'humidity_max',
+                 'minutes', 'deadband_minutes']
+
+T = TypeVar('T')
+
+
+class DatabaseUnavailable(Exception):
+    """Raised when the dashboard cannot open the database."""
+    pass
+
+
+class DashboardStore:
+    """
+    The dashboard's queries, served by the collector or by short-lived connections.
+
+    Each call first goes to the collector's store endpoint at store_url.
+    If no collector answers there, or it has another database open, the
+    call opens the database itself, runs one query and closes it, so the
+    file is only locked for the duration of a query. Those local calls are
+    serialized by a lock: within one process DuckDB refuses to open a file
+    read-only while it is open for writing, and vice versa.
+    """
+
+    def __init__(self, db_path: str, store_url: Optional[str] = None, attempts: int = 5,
+                 retry_delay: float = 0.1):
+        self.db_path = db_path
+        self.store_url = store_url
+        self.attempts = attempts
+        self.retry_delay = retry_delay
+        self._lock = threading.Lock()
+
+    def run(self, fn: Callable[[DataStore], T], write: bool = False) -> T:
+        """Open the database (read-only unless write), return fn(store) and close it again."""
+        with self._lock:
+            for attempt in range(self.attempts):
+                try:
+                    store = DataStore(self.db_path, read_only=not write)
+                    break
+                except duckdb.IOException as e:
+                    # usually another process writing to the file; it is released between its writes
+                    error = e
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                except duckdb.CatalogException as e:
+                    raise DatabaseUnavailable(f"{self.db_path} has not been initialized by the collector: {e}")
+            else:
+                raise DatabaseUnavailable(f"Cannot open {self.db_path}: {error}")
+            try:
+                return fn(store)
+            finally:
+                store.close()
+
+    def call(self, method: str, **kwargs):
+        """Run one of store_server's methods, through the collector if it serves this database."""
+        if self.store_url:
+            try:
+                return call_store(self.store_url, method, kwargs, self.db_path)
+            except (OSError, StoreNotServed):
+                pass
+            except StoreRequestError as e:
+                raise DatabaseUnavailable(str(e))
+        return self.run(lambda store: run_method(store, method, kwargs), write=method in WRITE_METHODS)
+
+    def read_range(self, **kwargs) -> dict:
+        return self.call('read_range', **kwargs)
+
+    def query_rollup(self, **kwargs) -> dict:
+        return self.call('query_rollup', **kwargs)
+
+    def query_stats(self, **kwargs) -> dict:
+        return self.call('query_stats', **kwargs)
+
+    def list_sensors(self) -> List[str]:
+        return self.call('list_sensors')
+
+    def get_setpoint(self) -> Tuple[float, float]:
+        return self.call('get_setpoint')
+
+    def adjust_setpoint(self, delta: float) -> Tuple[float, float]:
+        return self.call('adjust_setpoint', delta=delta)
+
+
+class DashboardSetpoints:
+    """The setpoint as last read through a DashboardStore; the parts of SetpointService the app uses."""
+
+    def __init__(self, store: DashboardStore):
+        self.store = store
+        self._setpoint, self._version = store.get_setpoint()
+
+    @property
+    def setpoint(self) -> float:
+        return self._setpoint
+
+    @property
+    def version(self) -> float:
+        return self._version
+
+    def refresh(self) -> bool:
+        """Re-read the stored setpoint; True if it changed."""
+        previous = self._setpoint
+        self._setpoint, self._version = self.store.get_setpoint()
+        return self._setpoint != previous
+
+    def adjust(self, delta: float) -> float:
+        """Move the stored setpoint by delta and return its version."""
+        self._setpoint, self._version = self.store.adjust_setpoint(delta)
+        return self._version
+
+
+@st.cache_resource
+def get_store(db_path: str = DEFAULT_DB_PATH, store_url: str = DEFAULT_STORE_URL) -> DashboardStore:
+    """The database access shared by the whole Streamlit process."""
+    return DashboardStore(db_path, store_url)
+
+
+@st.cache_resource
+def get_setpoints(db_path: str = DEFAULT_DB_PATH) -> DashboardSetpoints:
+    """The process-wide setpoint cache."""
+    return DashboardSetpoints(get_store(db_path))
+
+
+def local_times(seconds) -> pd.Series:
+    """Epoch seconds as naive local datetimes, as the dashboard displays them."""
+    return pd.to_datetime(pd.Series(seconds, dtype='float64'), unit='s', utc=True).dt.tz_convert(LOCAL_TIMEZONE).dt.tz_localize(None)
+
+
+def _to_frame(columns: dict) -> pd.DataFrame:
+    frame = pd.DataFrame(columns, columns=READING_COLUMNS)
+    frame['timestamp'] = local_times(frame['timestamp'])
+    return frame
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_rollup(since: float, until: float, resolution: Optional[float] = None,
+                sensor_id: Optional[str] = None, db_path: str = DEFAULT_DB_PATH) -> pd.DataFrame:
+    """Aggregated readings between since and until (epoch seconds), cached for 30 seconds."""
+    frame = pd.DataFrame(get_store(db_path).query_rollup(
+        since=since, until=until, resolution=resolution, sensor_id=sensor_id))
+    frame.columns = ROLLUP_COLUMNS
+    frame['bucket'] = local_times(frame['bucket'])
+    return frame
+
+
+class LiveReadings:
+    """
+    Recent raw readings shared by every session.
+
+    The frame is extended incrementally: each refresh asks DuckDB only for
+    rows after the newest (timestamp, sensor_id, rowid) already held, using
+    the same keyset condition as DataStore.read_range, and rows older than the
+    window are dropped. Refreshes closer together than min_interval reuse
+    the current frame, so N displays cost one query per interval, not N.
+    """
+
+    def __init__(self, store: DashboardStore, window_seconds: float, min_interval: float):
+        self.store = store
+        self.window_seconds = window_seconds
+        self.min_interval = min_interval
+        self.frame = _to_frame({column: [] for column in READING_COLUMNS})
+        self.version = 0
+        self._cursor: Optional[Tuple[float, Optional[str], int]] = None
+        self._last_refresh = 0.0
+        self._lock = threading.Lock()
+
+    def refresh(self) -> pd.DataFrame:
+        """Fetch rows newer than the last seen one (rate limited) and return the frame."""
+        with self._lock:
+            now = time.time()
+            if now - self._last_refresh < self.min_interval:
+                return self.frame
+            self._last_refresh = now
+
+            since = now - self.window_seconds
+            if self._cursor is None:
+                new_rows = self.store.read_range(since=since, with_rowid=True)
+            else:
+                new_rows = self.store.read_range(after=self._cursor, with_rowid=True)
+            rowids = new_rows.pop('rowid')
+
+            if len(new_rows['timestamp']):
+                self._cursor = (float(new_rows['timestamp'][-1]), new_rows['sensor_id'][-1], int(rowids[-1]))
+                new_frame = _to_frame(new_rows)
+                self.frame = new_frame if self.frame.empty else pd.concat([self.frame, new_frame], ignore_index=True)
+                self.version += 1
+
+            cutoff = local_times([since]).iloc[0]
+            if len(self.frame) and self.frame['timestamp'].iloc[0] < cutoff:
+                self.frame = self.frame[self.frame['timestamp'] >= cutoff].reset_index(drop=True)
+                self.version += 1
+            return self.frame
+
+
+@st.cache_resource
+def get_live_readings(window_seconds: float = 2 * 3600, min_interval: float = 2.0,
+                      db_path: str = DEFAULT_DB_PATH) -> LiveReadings:
+    """The process-wide LiveReadings for this window."""
+    return LiveReadings(get_store(db_path), window_seconds, min_interval)
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_history(since: float, until: float, max_points: int = 1500,
+                 sensor_id: Optional[str] = None, db_path: str = DEFAULT_DB_PATH) -> Dict[str, pd.DataFrame]:
+    """Temperature and humidity series for a time range, at most max_points each.
+
+    Long ranges are served from the rollup tables at a bucket width of
+    (until - since) / max_points, so DuckDB returns the budget and no more.
+    Ranges short enough to need raw readings (under a minute per point) are
+    read raw, which bounds them to max_points * 60 rows, and then reduced
+    with LTTB. Either way the payload sent to the browser is bounded by
+    max_points regardless of how much history is stored.
+
+    Returns:
+        {'temperature': frame, 'humidity': frame}, each with timestamp and value columns
+    """
+    resolution = (until - since) / max_points
+    if resolution >= 60:
+        # Round up to a whole number of minutes so a rollup table applies
+        frame = load_rollup(since, until, math.ceil(resolution / 60) * 60, sensor_id, db_path)
+        return {
+            'temperature': pd.DataFrame({'timestamp': frame['bucket'], 'value': frame['temperature_mean']}),
+            'humidity': pd.DataFrame({'timestamp': frame['bucket'], 'value': frame['humidity_mean']}),
+        }
+
+    rows = get_store(db_path).read_range(since=since, until=until, sensor_id=sensor_id)
+    series = {}
+    for column in ('temperature', 'humidity'):
+        kept = lttb_indices(rows['timestamp'], rows[column], max_points)
+        series[column] = pd.DataFrame({
+            'timestamp': local_times(rows['timestamp'][kept]),
+            'value': rows[column][kept],
+        })
+    return series
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_stats(since: float, until: float, period: Optional[float] = None,
+               target_temp: Optional[float] = None, deadband: float = 0.5,
+               sensor_id: Optional[str] = None, db_path: str = DEFAULT_DB_PATH) -> pd.DataFrame:
+    """Statistics for a time window from DataStore.query_stats, cached for 30 seconds.
+
+    With a period (3600 or 86400 seconds) there is one row per local hour or
+    day; without one a single row covers the window. deadband_fraction is the
+    share of sensor-minutes whose mean temperature was within target_temp +/-
+    deadband.
+    """
+    frame = pd.DataFrame(get_store(db_path).query_stats(
+        since=since, until=until, period=period, target_temp=target_temp, deadband=deadband,
+        sensor_id=sensor_id, timezone=LOCAL_TIMEZONE))
+    frame.columns = STATS_COLUMNS
+    frame['period_start'] = local_times(frame['period_start'])
+    frame['deadband_fraction'] = frame['deadband_minutes'] / frame['minutes'].where(frame['minutes'] > 0)
+    return frame
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def list_sensors(db_path: str = DEFAULT_DB_PATH) -> List[str]:
+    """Sensor ids that have rollup data, '' standing for untagged readings."""
+    return get_store(db_path).list_sensors()
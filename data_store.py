@@ -1,33 +1,468 @@
 import duckdb
 import time
+from array import array
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+
+# rollup table name -> bucket width in seconds, finest first
+ROLLUPS = {
+    'sensor_rollup_1m': 60,
+    'sensor_rollup_15m': 15 * 60,
+    'sensor_rollup_1h': 60 * 60,
+}
+
+
+RESULT_FORMATS = ('tuples', 'numpy', 'arrow', 'pandas')
 
 
 class DataStore:
-    def __init__(self) -> None:
-        # Initialize DuckDB and create a database for HVAC data
+    def __init__(self, db_path: str = 'HVAC_Data.duckdb', batch_size: int = 0, max_batch_age: float = 1.0,
+                 read_only: bool = False) -> None:
+        # Initialize DuckDB and create a database for HVAC data.
+        # read_only opens an existing database for queries only (e.g. the dashboard)
+        self.conn = duckdb.connect(db_path, read_only=read_only)
+        self.read_only = read_only
+        if not read_only:
+            self._create_schema()
+
+        # batch_size == 0 keeps the original one-INSERT-per-reading behaviour; the
+        # rollups of those readings are folded in bulk by the next flush() or once the
+        # oldest is max_batch_age seconds old, so each row costs a single INSERT.
+        # Otherwise readings are buffered column by column and written in bulk
+        # once batch_size rows are pending or the oldest is max_batch_age seconds old.
+        self.batch_size = batch_size
+        self.max_batch_age = max_batch_age
+        self._buffer_ts = array('d')
+        self._buffer_temp = array('d')
+        self._buffer_humidity = array('i')
+        self._buffer_sensor_id: List[Optional[str]] = []
+        self._buffer_started: Optional[float] = None
+        # readings written one by one whose rollups are still to be updated
+        self._unrolled: List[Tuple[float, float, int, Optional[str]]] = []
+        self._unrolled_started: Optional[float] = None
+
+    def _create_schema(self) -> None:
         # Use IF NOT EXISTS so re-running the script doesn't error
-        self.conn = duckdb.connect('HVAC_Data.duckdb')
         # create tables if they don't exist
         self.conn.execute('CREATE TABLE IF NOT EXISTS sensor_readings (timestamp DOUBLE, temperature DOUBLE, humidity INTEGER);')
         self.conn.execute('CREATE TABLE IF NOT EXISTS actions (timestamp DOUBLE, action_name VARCHAR, target_temp DOUBLE);')
+        # readings from multi-sensor collectors are tagged with the sensor they came from
+        self.conn.execute('ALTER TABLE sensor_readings ADD COLUMN IF NOT EXISTS sensor_id VARCHAR;')
+        # controller transitions are logged per zone; setpoint changes leave it NULL
+        self.conn.execute('ALTER TABLE actions ADD COLUMN IF NOT EXISTS zone VARCHAR;')
+
+        # per-sensor time-bucketed aggregates, kept up to date on every write.
+        # sums rather than means are stored so buckets can be merged; untagged
+        # readings are rolled up under sensor_id ''
+        existing = {row[0] for row in self.conn.execute('SELECT table_name FROM duckdb_tables();').fetchall()}
+        for table in ROLLUPS:
+            self.conn.execute(f'''CREATE TABLE IF NOT EXISTS {table} (
+                bucket DOUBLE, sensor_id VARCHAR, count BIGINT,
+                temperature_sum DOUBLE, temperature_min DOUBLE, temperature_max DOUBLE,
+                humidity_sum BIGINT, humidity_min INTEGER, humidity_max INTEGER,
+                PRIMARY KEY (bucket, sensor_id));''')
+        if not set(ROLLUPS) <= existing:
+            self.rebuild_rollups()
+
+    @property
+    def buffered(self) -> bool:
+        return self.batch_size > 0
 
-    def write_packet(self, timeStamp, temperature, humidity) -> None:
+    @property
+    def pending_count(self) -> int:
+        # number of readings waiting to be flushed
+        return len(self._buffer_ts)
+
+    def write_packet(self, timeStamp, temperature, humidity, sensor_id: Optional[str] = None) -> None:
         # write a sensor reading
-        self.conn.execute('INSERT INTO sensor_readings (timestamp, temperature, humidity) VALUES (?, ?, ?);', (timeStamp, temperature, humidity))
+        if not self.buffered:
+            self.conn.execute('INSERT INTO sensor_readings (timestamp, temperature, humidity, sensor_id) VALUES (?, ?, ?, ?);', (timeStamp, temperature, humidity, sensor_id))
+            if self._unrolled_started is None:
+                self._unrolled_started = time.monotonic()
+            self._unrolled.append((timeStamp, temperature, int(humidity), sensor_id))
+            if time.monotonic() - self._unrolled_started >= self.max_batch_age:
+                self._fold_rollups()
+            return
+
+        if self._buffer_started is None:
+            self._buffer_started = time.monotonic()
+        self._buffer_ts.append(timeStamp)
+        self._buffer_temp.append(temperature)
+        self._buffer_humidity.append(int(humidity))
+        self._buffer_sensor_id.append(sensor_id)
+
+        if (len(self._buffer_ts) >= self.batch_size
+                or time.monotonic() - self._buffer_started >= self.max_batch_age):
+            self.flush()
+
+    def add_reading(self, temperature, humidity, sensor_id: Optional[str] = None) -> None:
+        # write a sensor reading stamped with the current time
+        self.write_packet(time.time(), temperature, humidity, sensor_id)
+
+    def write_packets(self, timestamps, temperatures, humidities, sensor_ids=None, rollups: bool = True) -> int:
+        # write many sensor readings with one bulk insert, returns the row count
+        # sensor_ids may be a single id for the whole batch or one per reading.
+        # rollups=False skips the rollup tables, for bulk loads that call rebuild_rollups() once at the end
+        count = len(timestamps)
+        if count == 0:
+            return 0
+        batch = {
+            'timestamp': np.asarray(timestamps, dtype=np.float64),
+            'temperature': np.asarray(temperatures, dtype=np.float64),
+            'humidity': np.asarray(humidities, dtype=np.int32),
+        }
+        if sensor_ids is not None and not isinstance(sensor_ids, str):
+            distinct_ids = set(sensor_ids)
+            if len(distinct_ids) == 1:
+                sensor_ids = distinct_ids.pop()
+            else:
+                batch['sensor_id'] = np.asarray(sensor_ids, dtype=object)
+
+        # a batch-wide id (or NULL) is bound as a parameter rather than materialized per row
+        sensor_column = 'sensor_id' if 'sensor_id' in batch else 'CAST(? AS VARCHAR)'
+        params = [] if 'sensor_id' in batch else [sensor_ids]
+        self.conn.register('pending_readings', batch)
+        try:
+            self.conn.begin()
+            self.conn.execute(f'INSERT INTO sensor_readings (timestamp, temperature, humidity, sensor_id) SELECT timestamp, temperature, humidity, {sensor_column} FROM pending_readings;', params)
+            if rollups:
+                self._update_rollups(f'(SELECT timestamp, temperature, humidity, {sensor_column} AS sensor_id FROM pending_readings)', params)
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.unregister('pending_readings')
+        return count
+
+    def _fold_rollups(self) -> None:
+        # update the rollups for the readings written one by one, in one transaction
+        if not self._unrolled:
+            return
+        timestamps, temperatures, humidities, sensor_ids = zip(*self._unrolled)
+        self.conn.register('unrolled_readings', {
+            'timestamp': np.asarray(timestamps, dtype=np.float64),
+            'temperature': np.asarray(temperatures, dtype=np.float64),
+            'humidity': np.asarray(humidities, dtype=np.int32),
+            'sensor_id': np.asarray(sensor_ids, dtype=object),
+        })
+        try:
+            self.conn.begin()
+            self._update_rollups('(SELECT timestamp, temperature, humidity, CAST(sensor_id AS VARCHAR) AS sensor_id FROM unrolled_readings)', [])
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+        finally:
+            self.conn.unregister('unrolled_readings')
+        self._unrolled = []
+        self._unrolled_started = None
+
+    def _update_rollups(self, source: str, params: list, rollups: Optional[dict] = None) -> None:
+        # fold the readings selected by source into every rollup table (or those in rollups)
+        for table, width in (rollups or ROLLUPS).items():
+            self.conn.execute(f'''
+                INSERT INTO {table}
+                SELECT floor(timestamp / {width}) * {width} AS bucket, coalesce(sensor_id, '') AS sensor_id, count(*),
+                       sum(temperature), min(temperature), max(temperature),
+                       sum(humidity), min(humidity), max(humidity)
+                FROM {source} AS readings
+                GROUP BY ALL
+                ON CONFLICT (bucket, sensor_id) DO UPDATE SET
+                    count = count + excluded.count,
+                    temperature_sum = temperature_sum + excluded.temperature_sum,
+                    temperature_min = least(temperature_min, excluded.temperature_min),
+                    temperature_max = greatest(temperature_max, excluded.temperature_max),
+                    humidity_sum = humidity_sum + excluded.humidity_sum,
+                    humidity_min = least(humidity_min, excluded.humidity_min),
+                    humidity_max = greatest(humidity_max, excluded.humidity_max);''', params)
 
-    def write_action(self, actionTimeStamp, action_name, target_temp) -> None:
+    def rebuild_rollups(self, since: Optional[float] = None, until: Optional[float] = None) -> None:
+        # recompute the rollup buckets overlapping since..until (epoch seconds, both
+        # inclusive; everything by default) from the raw readings. Buckets outside the
+        # range keep their aggregates, including those of readings archived since; the
+        # buckets at either edge are recomputed whole, from the readings still stored.
+        self.conn.begin()
+        try:
+            for table, width in ROLLUPS.items():
+                conditions, params = [], []
+                if since is not None:
+                    conditions.append('{column} >= ?')
+                    params.append(float(np.floor(since / width) * width))
+                if until is not None:
+                    conditions.append('{column} < ?')
+                    params.append(float((np.floor(until / width) + 1) * width))
+                where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+                self.conn.execute(f"DELETE FROM {table} {where.format(column='bucket')};", params)
+                self._update_rollups(f"(SELECT * FROM sensor_readings {where.format(column='timestamp')})",
+                                     params, {table: width})
+            self.conn.commit()
+        except Exception:
+            self.conn.rollback()
+            raise
+
+    def query_rollup(self, since: float, until: float, resolution: Optional[float] = None,
+                     sensor_id: Optional[str] = None, max_points: int = 1000, format: str = 'tuples'):
+        # aggregated readings per sensor between since and until (epoch seconds).
+        # resolution is the wanted bucket width in seconds; by default the range is
+        # split into about max_points buckets. Reads the coarsest rollup no wider than
+        # the requested resolution (raw readings if none is) and re-buckets it with
+        # floor(bucket / resolution); returns
+        # (bucket, sensor_id, count, temperature mean/min/max, humidity mean/min/max).
+        # Edge buckets are approximate when resolution is not a multiple of the rollup
+        # width: a rollup bucket straddling a boundary counts wholly towards the bucket
+        # its start falls in, and since/until select whole rollup buckets by their start,
+        # so the first and last buckets can be off by up to one rollup width of readings.
+        if resolution is None:
+            resolution = max((until - since) / max_points, 1.0)
+        self.flush()
+
+        source = 'sensor_readings'
+        coarsest = 0.0
+        for table, width in ROLLUPS.items():
+            if coarsest < width <= resolution:
+                source, coarsest = table, width
+        if source == 'sensor_readings':
+            rows = '''SELECT timestamp AS bucket, coalesce(sensor_id, '') AS sensor_id, 1 AS count,
+                             temperature AS temperature_sum, temperature AS temperature_min, temperature AS temperature_max,
+                             humidity AS humidity_sum, humidity AS humidity_min, humidity AS humidity_max
+                      FROM sensor_readings'''
+        else:
+            rows = f'SELECT * FROM {source}'
+
+        params = [resolution, resolution, since, until]
+        sensor_filter = ''
+        if sensor_id is not None:
+            sensor_filter = 'AND sensor_id = ?'
+            params.append(sensor_id)
+        cur = self.conn.execute(f'''
+            SELECT floor(bucket / ?) * ? AS time_bucket, sensor_id, sum(count) AS count,
+                   sum(temperature_sum) / sum(count) AS temperature_mean, min(temperature_min), max(temperature_max),
+                   sum(humidity_sum) / sum(count) AS humidity_mean, min(humidity_min), max(humidity_max)
+            FROM ({rows}) AS source
+            WHERE bucket >= ? AND bucket < ? {sensor_filter}
+            GROUP BY ALL
+            ORDER BY time_bucket, sensor_id;''', params)
+        return self._fetch(cur, format)
+
+    def query_stats(self, since: float, until: float, period: Optional[float] = None,
+                    target_temp: Optional[float] = None, deadband: float = 0.5,
+                    sensor_id: Optional[str] = None, timezone: str = 'UTC', format: str = 'tuples'):
+        # summary statistics between since and until, aggregated from the 1-minute rollup
+        # so the cost depends on the window length, not on how many raw readings it holds.
+        # period=None gives one row for the whole window; otherwise rows per period seconds
+        # (3600 hourly, 86400 daily), aligned to the wall clock of the IANA timezone, so
+        # days stay midnight to midnight across daylight saving changes (23 or 25 hours).
+        # Returns (period_start, count, temperature mean/min/max, humidity mean/min/max,
+        # minutes, deadband_minutes): minutes counts sensor-minutes with data and
+        # deadband_minutes those whose mean temperature is within target_temp +/- deadband
+        # (0 when target_temp is None)
+        self.flush()
+        if period is None:
+            period_start, group_by, params = '? AS period_start', '', [since]
+            quarter = 'NULL'
+        else:
+            # bucket -> local wall clock seconds, floored to the period, -> back to epoch seconds
+            local = 'epoch(timezone(?, to_timestamp(bucket)))'
+            period_start = (f'epoch(timezone(?, make_timestamp(CAST(floor({local} / ?) * ? * 1000000 AS BIGINT)))) '
+                            'AS period_start')
+            group_by, params = 'GROUP BY ALL', [timezone, timezone, period, period]
+            quarter = 'floor(bucket / 900) * 900'
+        params += [target_temp, deadband, since, until]
+        sensor_filter = ''
+        if sensor_id is not None:
+            sensor_filter = 'AND sensor_id = ?'
+            params.append(sensor_id)
+        # per-minute rows are first reduced to quarter hours, which every time zone offset
+        # keeps whole, so only those need converting to local time
+        cur = self.conn.execute(f'''
+            SELECT {period_start}, sum(count) AS count,
+                   sum(temperature_sum) / sum(count) AS temperature_mean, min(temperature_min), max(temperature_max),
+                   sum(humidity_sum) / sum(count) AS humidity_mean, min(humidity_min), max(humidity_max),
+                   coalesce(sum(minutes), 0) AS minutes, coalesce(sum(deadband_minutes), 0) AS deadband_minutes
+            FROM (
+                SELECT {quarter} AS bucket, sum(count) AS count,
+                       sum(temperature_sum) AS temperature_sum, min(temperature_min) AS temperature_min,
+                       max(temperature_max) AS temperature_max, sum(humidity_sum) AS humidity_sum,
+                       min(humidity_min) AS humidity_min, max(humidity_max) AS humidity_max,
+                       count(*) AS minutes,
+                       count(*) FILTER (WHERE abs(temperature_sum / count - ?) <= ?) AS deadband_minutes
+                FROM sensor_rollup_1m
+                WHERE bucket >= ? AND bucket < ? {sensor_filter}
+                GROUP BY 1
+            ) AS quarters
+            {group_by}
+            ORDER BY period_start;''', params)
+        return self._fetch(cur, format)
+
+    def flush(self) -> int:
+        # write all buffered readings in a single bulk insert, returns the row count
+        self._fold_rollups()
+        if not self._buffer_ts:
+            return 0
+
+        # numpy views over the array buffers, no per-row conversion
+        count = self.write_packets(
+            np.frombuffer(self._buffer_ts, dtype=np.float64),
+            np.frombuffer(self._buffer_temp, dtype=np.float64),
+            np.frombuffer(self._buffer_humidity, dtype=np.int32),
+            self._buffer_sensor_id,
+        )
+
+        self._buffer_ts = array('d')
+        self._buffer_temp = array('d')
+        self._buffer_humidity = array('i')
+        self._buffer_sensor_id = []
+        self._buffer_started = None
+        return count
+
+    def close(self) -> None:
+        # flush anything still buffered and release the database
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self) -> 'DataStore':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+    def write_action(self, actionTimeStamp, action_name, target_temp, zone: Optional[str] = None) -> None:
         # write action data
-        self.conn.execute('INSERT INTO actions (timestamp, action_name, target_temp) VALUES (?, ?, ?);', (actionTimeStamp, action_name, target_temp))
+        self.conn.execute('INSERT INTO actions (timestamp, action_name, target_temp, zone) VALUES (?, ?, ?, ?);', (actionTimeStamp, action_name, target_temp, zone))
+
+    def write_actions(self, timestamps, action_names, target_temps, zones=None) -> int:
+        # write many actions with one bulk insert, returns the row count
+        count = len(timestamps)
+        if count == 0:
+            return 0
+        batch = {
+            'timestamp': np.asarray(timestamps, dtype=np.float64),
+            'action_name': np.asarray(action_names, dtype=object),
+            'target_temp': np.broadcast_to(np.asarray(target_temps, dtype=np.float64), (count,)).copy(),
+        }
+        # a batch-wide zone (or NULL) is bound as a parameter, as in write_packets
+        if zones is not None and not isinstance(zones, str):
+            batch['zone'] = np.asarray(zones, dtype=object)
+        zone_column = 'zone' if 'zone' in batch else 'CAST(? AS VARCHAR)'
+        params = [] if 'zone' in batch else [zones]
+        self.conn.register('pending_actions', batch)
+        try:
+            self.conn.execute(f'INSERT INTO actions (timestamp, action_name, target_temp, zone) SELECT timestamp, action_name, target_temp, {zone_column} FROM pending_actions;', params)
+        finally:
+            self.conn.unregister('pending_actions')
+        return count
+
+    def _fetch(self, cur, format: str):
+        # materialize a result in the requested shape:
+        # 'tuples' (list of rows), 'numpy' (dict of column arrays), 'arrow' or 'pandas'
+        if format == 'tuples':
+            return cur.fetchall()
+        if format == 'numpy':
+            return cur.fetchnumpy()
+        if format == 'arrow':
+            return cur.to_arrow_table() if hasattr(cur, 'to_arrow_table') else cur.fetch_arrow_table()
+        if format == 'pandas':
+            return cur.df()
+        raise ValueError(f"Unknown result format '{format}', expected one of {RESULT_FORMATS}")
+
+    def read_packets(self, limit: int = 100, format: str = 'tuples'):
+        # return the most recent `limit` sensor readings, oldest first
+        return self.read_latest(limit, format=format)
+
+    def read_latest(self, n: int, sensor_id: Optional[str] = None, format: str = 'tuples'):
+        # return the newest n readings (optionally for one sensor), oldest first
+        self.flush()
+        sensor_filter, params = ("WHERE coalesce(sensor_id, '') = ?", [sensor_id]) if sensor_id is not None else ('', [])
+        cur = self.conn.execute(f'''
+            SELECT * FROM (
+                SELECT timestamp, temperature, humidity, sensor_id FROM sensor_readings {sensor_filter}
+                ORDER BY timestamp DESC LIMIT ?
+            ) ORDER BY timestamp;''', params + [n])
+        return self._fetch(cur, format)
+
+    def read_range(self, since: Optional[float] = None, until: Optional[float] = None,
+                   sensor_id: Optional[str] = None, limit: Optional[int] = None,
+                   after: Optional[Tuple[float, Optional[str], int]] = None, with_rowid: bool = False,
+                   format: str = 'numpy'):
+        # return readings with since <= timestamp < until, ordered by (timestamp, sensor_id, rowid).
+        # for keyset pagination request with_rowid=True, which adds a rowid column, and pass
+        # the (timestamp, sensor_id, rowid) of the last row of the previous page as `after`;
+        # see iter_range. rowid breaks ties between readings sharing a timestamp and sensor,
+        # which (timestamp, sensor_id) alone would skip or repeat across a page boundary.
+        # Time filters are served by DuckDB's per-row-group min/max statistics, which suit
+        # append-mostly time series.
+        self.flush()
+        conditions, params = [], []
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('timestamp < ?')
+            params.append(until)
+        if sensor_id is not None:
+            conditions.append("coalesce(sensor_id, '') = ?")
+            params.append(sensor_id)
+        if after is not None:
+            conditions.append("(timestamp, coalesce(sensor_id, ''), rowid) > (?, ?, ?)")
+            params.extend([after[0], after[1] or '', after[2]])
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        limit_clause = ''
+        if limit is not None:
+            limit_clause = 'LIMIT ?'
+            params.append(limit)
+        rowid_column = ', rowid' if with_rowid else ''
+        cur = self.conn.execute(f'''
+            SELECT timestamp, temperature, humidity, sensor_id{rowid_column} FROM sensor_readings {where}
+            ORDER BY timestamp, coalesce(sensor_id, ''), rowid {limit_clause};''', params)
+        return self._fetch(cur, format)
+
+    def iter_range(self, since: Optional[float] = None, until: Optional[float] = None,
+                   sensor_id: Optional[str] = None, page_size: int = 100_000) -> Iterator[dict]:
+        # yield readings as pages of NumPy columns using keyset pagination, so each
+        # page costs the same however deep into the table it is
+        after = None
+        while True:
+            page = self.read_range(since, until, sensor_id, limit=page_size, after=after, with_rowid=True,
+                                   format='numpy')
+            rowids = page.pop('rowid')
+            count = len(page['timestamp'])
+            if count == 0:
+                return
+            yield page
+            if count < page_size:
+                return
+            after = (float(page['timestamp'][-1]), page['sensor_id'][-1], int(rowids[-1]))
 
-    def read_packets(self):
-        # return up to 100 sensor readings
-        cur = self.conn.execute('SELECT * FROM sensor_readings ORDER BY timestamp LIMIT 100;')
-        return cur.fetchall()
+    def read_actions(self, since: Optional[float] = None, limit: Optional[int] = None,
+                     after: Optional[float] = None, action_name: Optional[str] = None, format: str = 'tuples'):
+        # return actions at or after since (all by default), keeping only the latest `limit`, oldest first.
+        # after selects only actions strictly newer than that timestamp, for polling changes;
+        # action_name only actions of that kind
+        conditions, params = [], []
+        if action_name is not None:
+            conditions.append('action_name = ?')
+            params.append(action_name)
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if after is not None:
+            conditions.append('timestamp > ?')
+            params.append(after)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        if limit is None:
+            cur = self.conn.execute(f'SELECT * FROM actions {where} ORDER BY timestamp;', params)
+        else:
+            cur = self.conn.execute(f'SELECT * FROM (SELECT * FROM actions {where} ORDER BY timestamp DESC LIMIT ?) ORDER BY timestamp;', params + [limit])
+        return self._fetch(cur, format)
 
-    def read_actions(self):
-        # return all actions
-        cur = self.conn.execute('SELECT * FROM actions ORDER BY timestamp;')
-        return cur.fetchall()
+    def list_sensors(self) -> List[str]:
+        # sensor ids with rollup data, '' standing for untagged readings
+        self.flush()
+        rows = self.conn.execute('SELECT DISTINCT sensor_id FROM sensor_rollup_1h ORDER BY sensor_id;').fetchall()
+        return [row[0] for row in rows]
 
     def write_dummy_data(self, sensor_count: int = 10, action_count: int = 5) -> None:
         # write some dummy data for testing
@@ -44,7 +479,7 @@ def main():
     ds = DataStore()
     print('Writing dummy data...')
     ds.write_dummy_data()
-    print('\nSensor readings (up to 100):')
+    print('\nLatest sensor readings (up to 100):')
     packets = ds.read_packets()
     for row in packets:
         print(row)
@@ -56,4 +491,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
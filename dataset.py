@@ -1,23 +1,412 @@
+"""
+Windowed training data for temperature forecasting.
+
+Readings are exported from DuckDB once into a directory of NumPy files:
+
+    features.npy   float32 (rows, features), one row per time step per sensor
+    present.npy    bool (rows,), False where a step had no readings (value carried forward)
+    meta.json      columns, feature pipeline, resolution, per-sensor row ranges,
+                   normalization stats, and the state of the source database
+
+The feature columns are computed by features.FeaturePipeline from the
+step means and the actions table, the same way the live control loop
+computes them.
+
+The export walks the database a chunk of time at a time, so neither it nor
+training ever holds the full history in RAM. HvacDataset memory-maps the
+files and serves (history window, future temperature) pairs as
+torch.from_numpy views of the mapped rows; only the DataLoader's batch
+collation copies data. Windows never cross a sensor boundary or a gap.
+
+    python dataset.py --db HVAC_Data.duckdb --out features/ --resolution 60 --lags 1 5 15 --windows 15 60
+"""
+
+import argparse
+import json
+import os
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import duckdb
+import numpy as np
 import torch
 from torch.utils.data import Dataset
-import numpy as np
 
-class HvacDataset(Dataset) :
-    def __init__(self, timestamp, temp, humidity):
-        #create all tensors based on the packet
-        self.timestamp = np.array(timestamp, dtype=np.float32)
-        self.temp = np.array(temp, dtype=np.float32)
-        self.humidity = np.array(humidity, dtype=np.float32)
+from data_store import DataStore
+from features import FeaturePipeline, action_states
+
+SCHEMA_VERSION = 2
+# step means read from the rollups, the first of features.RAW_COLUMNS
+READING_COLUMNS = ('temperature', 'humidity')
+
+# rows per block when scanning the memory-mapped files
+_BLOCK_ROWS = 1 << 20
+
+
+class DatabaseLocked(Exception):
+    """Raised when another process (usually the collector) has the database open."""
+    pass
+
+
+def _open_store(db_path: str) -> DataStore:
+    # DuckDB lets one process at a time open the file, even read-only while
+    # another writes to it, so this fails while the collector runs. An older
+    # database without the rollup tables is opened for writing once so
+    # DataStore can migrate it.
+    if not os.path.exists(db_path):
+        # a read-only open of a missing file fails just like a locked one
+        raise FileNotFoundError(f"No database at {db_path}; pass --db (or set DB_PATH) to the collector's "
+                                f"database, e.g. --db hvac_data.duckdb for the bundled sample")
+    try:
+        store = DataStore(db_path, read_only=True)
+        try:
+            store.conn.execute('SELECT 1 FROM sensor_rollup_1m LIMIT 0;')
+            store.conn.execute('SELECT sensor_id FROM sensor_readings LIMIT 0;')
+            return store
+        except duckdb.CatalogException:
+            store.close()
+            return DataStore(db_path)
+    except duckdb.IOException as e:
+        raise DatabaseLocked(
+            f"Cannot open {db_path}, most likely because the collector is running: {e}\n"
+            f"Stop the collector, or export from a copy of the database taken while it is stopped "
+            f"(e.g. cp {db_path} export.duckdb, then --db export.duckdb)."
+        ) from e
+
+
+def _source_state(store: DataStore, db_path: str) -> Dict:
+    # enough to tell whether the database has changed since an export
+    rows, newest = store.conn.execute('SELECT count(*), max(timestamp) FROM sensor_readings;').fetchone()
+    actions, newest_action = store.conn.execute('SELECT count(*), max(timestamp) FROM actions;').fetchone()
+    return {'db_path': os.path.realpath(db_path), 'rows': rows, 'max_timestamp': newest,
+            'actions': actions, 'max_action_timestamp': newest_action}
+
+
+def source_state(db_path: str) -> Dict:
+    """The database file, its reading and action counts and newest timestamps, as recorded in meta.json."""
+    store = _open_store(db_path)
+    try:
+        return _source_state(store, db_path)
+    finally:
+        store.close()
+
+
+def _merge_stats(stats: Tuple[int, np.ndarray, np.ndarray], block: np.ndarray) -> Tuple[int, np.ndarray, np.ndarray]:
+    # fold a block into running (count, mean, M2) per column (Chan et al.), one pass over the data
+    count, mean, m2 = stats
+    block_count = len(block)
+    if block_count == 0:
+        return stats
+    block_mean = block.mean(axis=0, dtype=np.float64)
+    block_m2 = ((block - block_mean) ** 2).sum(axis=0, dtype=np.float64)
+    total = count + block_count
+    delta = block_mean - mean
+    return (total, mean + delta * block_count / total,
+            m2 + block_m2 + delta ** 2 * count * block_count / total)
+
+
+def export_features(db_path: str, path: str, resolution: float = 60,
+                    sensor_ids: Optional[Sequence[str]] = None,
+                    since: Optional[float] = None, until: Optional[float] = None,
+                    chunk_seconds: float = 30 * 86400,
+                    pipeline: Optional[FeaturePipeline] = None) -> Dict:
+    """Export features on a regular time grid into memory-mappable files.
+
+    Each sensor's readings are averaged into resolution-second steps from
+    its first to its last reading (through the rollup tables where the
+    resolution allows) and written a chunk of time at a time. Steps without
+    readings carry the previous value forward and are marked not present.
+    The feature pipeline continues from one chunk to the next, and the
+    per-column mean and standard deviation over present steps are
+    accumulated in the same pass.
+
+    Args:
+        db_path: DuckDB database file
+        path: Output directory
+        resolution: Seconds per step
+        sensor_ids: Sensors to export ('' for untagged readings), all by default
+        since, until: Optional epoch-second bounds
+        chunk_seconds: Span of time read from DuckDB per query
+        pipeline: Feature columns to compute, FeaturePipeline(resolution) by default
+
+    Returns:
+        The metadata written to meta.json
+    """
+    pipeline = pipeline or FeaturePipeline(resolution)
+    if pipeline.resolution != resolution:
+        raise ValueError(f"Pipeline resolution {pipeline.resolution:g}s does not match the export's {resolution:g}s")
+    columns = pipeline.columns
+    os.makedirs(path, exist_ok=True)
+    store = _open_store(db_path)
+    try:
+        source = _source_state(store, db_path)
+        conditions, params = [], []
+        if since is not None:
+            conditions.append('timestamp >= ?')
+            params.append(since)
+        if until is not None:
+            conditions.append('timestamp < ?')
+            params.append(until)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        spans = store.conn.execute(f'''
+            SELECT coalesce(sensor_id, '') AS sensor, min(timestamp), max(timestamp)
+            FROM sensor_readings {where} GROUP BY ALL ORDER BY sensor;''', params).fetchall()
+        if sensor_ids is not None:
+            spans = [span for span in spans if span[0] in set(sensor_ids)]
+
+        # every sensor's grid starts on a multiple of the resolution, like the rollup buckets
+        sensors, total_rows = [], 0
+        for sensor, first, last in spans:
+            first_step = np.floor(first / resolution) * resolution
+            rows = int(round(np.floor(last / resolution) - np.floor(first / resolution))) + 1
+            sensors.append({'sensor_id': sensor, 'first_timestamp': float(first_step),
+                            'start_row': total_rows, 'rows': rows})
+            total_rows += rows
+
+        actions = store.read_actions(format='numpy')
+        features = np.lib.format.open_memmap(os.path.join(path, 'features.npy'), mode='w+',
+                                             dtype=np.float32, shape=(total_rows, len(columns)))
+        present = np.lib.format.open_memmap(os.path.join(path, 'present.npy'), mode='w+',
+                                            dtype=np.bool_, shape=(total_rows,))
+        stats = (0, np.zeros(len(columns)), np.zeros(len(columns)))
+
+        for sensor in sensors:
+            start_row, rows, first_step = sensor['start_row'], sensor['rows'], sensor['first_timestamp']
+            end = first_step + rows * resolution
+            carried = np.full(len(READING_COLUMNS), np.nan, dtype=np.float32)
+            previous = None
+            chunk_start = first_step
+            while chunk_start < end:
+                chunk_end = min(chunk_start + max(chunk_seconds // resolution, 1) * resolution, end)
+                rollup = store.query_rollup(chunk_start, chunk_end, resolution, sensor['sensor_id'], format='numpy')
+                row0 = start_row + int(round((chunk_start - first_step) / resolution))
+                count = int(round((chunk_end - chunk_start) / resolution))
+
+                block = np.full((count, len(READING_COLUMNS)), np.nan, dtype=np.float32)
+                offsets = np.rint((rollup['time_bucket'] - chunk_start) / resolution).astype(np.int64)
+                block[offsets, 0] = rollup['temperature_mean']
+                block[offsets, 1] = rollup['humidity_mean']
+                mask = np.zeros(count, dtype=np.bool_)
+                mask[offsets] = True
 
-        self.inputs = np.column_stack(self.timestamp, self.temp, self.humidity)
+                # carry the last known values forward over gaps, continuing from the previous chunk
+                block = np.vstack([carried[None, :], block])
+                filled = np.where(~np.isnan(block[:, 0]), np.arange(len(block)), 0)
+                block = block[np.maximum.accumulate(filled)][1:]
+                carried = block[-1]
+
+                # the actions state is the one in force when each step ends
+                step_starts = chunk_start + resolution * np.arange(count)
+                raw = np.hstack([block, action_states(actions, sensor['sensor_id'] or None, step_starts + resolution)])
+                block_features = pipeline.transform(step_starts, raw, previous)
+                joined = raw if previous is None else np.concatenate([previous, raw])
+                previous = joined[max(len(joined) - pipeline.context, 0):]
+                stats = _merge_stats(stats, block_features[mask])
+
+                features[row0:row0 + count] = block_features
+                present[row0:row0 + count] = mask
+                chunk_start = chunk_end
+
+        features.flush()
+        present.flush()
+        count, mean, m2 = stats
+        std = np.sqrt(m2 / max(count, 1))
+        meta = {
+            'schema_version': SCHEMA_VERSION,
+            'columns': columns,
+            'pipeline': pipeline.config(),
+            'resolution': resolution,
+            'rows': total_rows,
+            'sensors': sensors,
+            'stats': {'count': int(count), 'mean': mean.tolist(), 'std': np.where(std > 0, std, 1.0).tolist()},
+            'source': source,
+        }
+        with open(os.path.join(path, 'meta.json'), 'w') as f:
+            json.dump(meta, f, indent=2)
+        return meta
+    finally:
+        store.close()
+
+
+def median_interval(db_path: str, sample: int = 10000) -> float:
+    """Median seconds between consecutive readings of a sensor, over the latest `sample` readings."""
+    store = _open_store(db_path)
+    try:
+        interval = store.conn.execute('''
+            SELECT median(timestamp - previous) FROM (
+                SELECT timestamp, lag(timestamp) OVER (PARTITION BY sensor_id ORDER BY timestamp) AS previous
+                FROM (SELECT * FROM sensor_readings ORDER BY timestamp DESC LIMIT ?)
+            ) WHERE timestamp > previous;''', [sample]).fetchone()[0]
+    finally:
+        store.close()
+    return float(interval) if interval is not None else 0.0
+
+
+def load_meta(path: str) -> Dict:
+    """Read and check the metadata of an exported feature directory."""
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    if meta.get('schema_version') != SCHEMA_VERSION:
+        raise ValueError(f"{path} has feature schema {meta.get('schema_version')}, expected {SCHEMA_VERSION}; re-export it")
+    return meta
+
+
+def window_starts(path: str, length: int, max_missing: int = 0) -> np.ndarray:
+    """First rows of every window of length rows that stays inside one sensor
+    and has at most max_missing carried-forward (not present) steps.
+
+    Computed block by block from present.npy and cached next to it, so
+    later runs (and every DataLoader worker) just memory-map the result.
+    """
+    cache = os.path.join(path, f'windows_{length}_{max_missing}.npy')
+    if os.path.exists(cache) and os.path.getmtime(cache) >= os.path.getmtime(os.path.join(path, 'meta.json')):
+        return np.load(cache, mmap_mode='r')
+
+    meta = load_meta(path)
+    present = np.load(os.path.join(path, 'present.npy'), mmap_mode='r')
+    starts: List[np.ndarray] = []
+    for sensor in meta['sensors']:
+        first, rows = sensor['start_row'], sensor['rows']
+        for block_start in range(0, rows - length + 1, _BLOCK_ROWS):
+            block_end = min(block_start + _BLOCK_ROWS + length - 1, rows)
+            missing = np.concatenate([[0], np.cumsum(~present[first + block_start:first + block_end])])
+            complete = missing[length:] - missing[:-length] <= max_missing
+            starts.append(np.flatnonzero(complete) + first + block_start)
+    starts = np.concatenate(starts) if starts else np.empty(0, dtype=np.int64)
+    np.save(cache, starts.astype(np.int64))
+    return np.load(cache, mmap_mode='r')
+
+
+class HvacDataset(Dataset):
+    """
+    Sliding windows over an exported feature directory.
+
+    Item i is (x, y): x holds `history` consecutive steps of every feature
+    column, y the temperature `horizon` steps after the last of them. Both
+    are torch.from_numpy views of the memory-mapped file. The map is opened
+    lazily in each process, so the dataset can be used with a multi-worker
+    DataLoader without copying the data into the workers. With
+    collate_fn=collate_windows the loader fetches whole batches through
+    __getitems__, a single gather from the map per batch.
+
+    By default only windows without gaps are used; max_missing allows that
+    many carried-forward steps per window, for sparse or irregular data.
+    """
+
+    def __init__(self, path: str, history: int = 60, horizon: int = 15,
+                 target: str = 'temperature', max_missing: int = 0):
+        self.path = path
+        self.meta = load_meta(path)
+        self.history = history
+        self.horizon = horizon
+        self.max_missing = max_missing
+        self.target_column = self.meta['columns'].index(target)
+        self._length = len(window_starts(path, history + horizon, max_missing))
+        self._starts: Optional[np.ndarray] = None
+        self._features: Optional[np.ndarray] = None
+
+    @property
+    def columns(self) -> List[str]:
+        return self.meta['columns']
+
+    @property
+    def mean(self) -> np.ndarray:
+        """Per-column mean over all present steps; see statistics() for a subset."""
+        return np.asarray(self.meta['stats']['mean'], dtype=np.float32)
+
+    @property
+    def std(self) -> np.ndarray:
+        """Per-column standard deviation over all present steps."""
+        return np.asarray(self.meta['stats']['std'], dtype=np.float32)
+
+    def statistics(self, indices) -> Tuple[np.ndarray, np.ndarray]:
+        """Per-column mean and standard deviation over the present steps of
+        the windows at indices only, e.g. a fold's training windows, so
+        that normalization does not see the steps it is validated on."""
+        length = self.history + self.horizon
+        covered = np.zeros(len(self.features) + 1, dtype=np.int32)
+        starts = np.asarray(self.starts)[np.asarray(indices, dtype=np.int64)]
+        np.add.at(covered, starts, 1)
+        np.add.at(covered, starts + length, -1)
+        present = np.load(os.path.join(self.path, 'present.npy'), mmap_mode='r')
+        stats = (0, np.zeros(len(self.columns)), np.zeros(len(self.columns)))
+        depth = 0
+        for block_start in range(0, len(self.features), _BLOCK_ROWS):
+            block_end = min(block_start + _BLOCK_ROWS, len(self.features))
+            inside = np.cumsum(covered[block_start:block_end]) + depth
+            depth = inside[-1]
+            rows = np.flatnonzero((inside > 0) & present[block_start:block_end]) + block_start
+            stats = _merge_stats(stats, self.features[rows])
+        count, mean, m2 = stats
+        std = np.sqrt(m2 / max(count, 1))
+        return mean.astype(np.float32), np.where(std > 0, std, 1.0).astype(np.float32)
+
+    @property
+    def features(self) -> np.ndarray:
+        # copy-on-write map: writable as torch.from_numpy requires, never written back
+        if self._features is None:
+            self._features = np.load(os.path.join(self.path, 'features.npy'), mmap_mode='c')
+        return self._features
+
+    @property
+    def starts(self) -> np.ndarray:
+        if self._starts is None:
+            self._starts = window_starts(self.path, self.history + self.horizon, self.max_missing)
+        return self._starts
+
+    def __getstate__(self):
+        # workers reopen the maps themselves instead of receiving pickled copies
+        state = self.__dict__.copy()
+        state['_features'] = None
+        state['_starts'] = None
+        return state
 
     def __len__(self):
-        return len(self.inputs)
-        
+        return self._length
+
+    def __getitems__(self, indices):
+        # batched fetch used by DataLoader: one gather per batch instead of one view per window
+        starts = self.starts[np.asarray(indices)]
+        rows = starts[:, None] + np.arange(self.history)
+        targets = starts + self.history - 1 + self.horizon
+        x = torch.from_numpy(self.features[rows])
+        y = torch.from_numpy(self.features[targets, self.target_column:self.target_column + 1])
+        return x, y
 
     def __getitem__(self, idx):
-        x = torch.tensor(self.inputs[idx], dtype=torch.float32)
-        return x
+        start = int(self.starts[idx])
+        end = start + self.history
+        target = end - 1 + self.horizon
+        x = torch.from_numpy(self.features[start:end])
+        y = torch.from_numpy(self.features[target, self.target_column:self.target_column + 1])
+        return x, y
+
+
+def collate_windows(batch):
+    """DataLoader collate_fn for HvacDataset: batches arrive already stacked from __getitems__."""
+    return batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export HVAC readings for training")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'HVAC_Data.duckdb'), help="DuckDB database file")
+    parser.add_argument('--out', default='features', help="output directory")
+    parser.add_argument('--resolution', type=float, default=60, help="seconds per step")
+    parser.add_argument('--sensor', action='append', default=None, help="sensor id to export (repeatable)")
+    parser.add_argument('--lags', type=int, nargs='*', default=[1, 5, 15], help="lagged temperature steps")
+    parser.add_argument('--windows', type=int, nargs='*', default=[15, 60], help="rolling mean/slope steps")
+    args = parser.parse_args()
+
+    pipeline = FeaturePipeline(args.resolution, args.lags, args.windows)
+    try:
+        meta = export_features(args.db, args.out, args.resolution, args.sensor, pipeline=pipeline)
+    except (DatabaseLocked, FileNotFoundError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    print(f"📦 Exported {meta['rows']:,} steps × {len(meta['columns'])} features "
+          f"from {len(meta['sensors'])} sensor(s) to {args.out}")
+    for column, mean, std in zip(meta['columns'], meta['stats']['mean'], meta['stats']['std']):
+        print(f"   {column}: mean {mean:.3f}, std {std:.3f}")
 
-        
 
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,153 @@
 #!/usr/bin/env python3
 """
-Demo script to show sample usage of the HVAC system with Streamlit display.
+Synthetic sensor data for demos and load tests.
 
-This script creates sample data to demonstrate the Streamlit dashboard
-without needing actual Bluetooth hardware.
+Generates realistic readings for any number of sensors over any span of
+time and bulk-loads them into the DuckDB schema used by DataStore, so the
+dashboard, training and benchmarks can run without Bluetooth hardware.
+
+Each sensor's temperature follows a daily cycle (warmest in the
+afternoon) around its own base temperature, plus slow "weather" drift
+shared by all sensors in the building, a slow per-sensor drift and
+measurement noise, reported at 0.01 °C like the LYWSD03MMC. Humidity
+falls as the room warms, drifts on its own and is reported in whole
+percent. Readings arrive every `interval` seconds with a little jitter.
+
+Everything is computed with NumPy a block of readings at a time and each
+block is written with one DataStore.write_packets call; the rollups of the
+generated time range are rebuilt once at the end.
+
+The data goes to its own database, HVAC_Demo.duckdb by default, never the
+collector's unless asked: a database that already holds readings is only
+written with --force.
+
+    python demo.py                                   # 3 sensors, last 7 days, every 10 s
+    python demo.py --db load.duckdb --sensors 50 --days 365 --interval 1
+    DB_PATH=HVAC_Demo.duckdb streamlit run streamlit_app.py
 """
 
-import random
+import argparse
 import time
-from datetime import datetime, timedelta
-
-def generate_sample_data(num_readings=100):
-    """Generate sample sensor readings for demo purposes."""
-    print("🔧 Generating sample HVAC sensor data...")
-    
-    # Generate readings over the past 2 hours
-    base_time = datetime.now()
-    base_temp = 22.0
-    base_humidity = 45
-    
-    print(f"Creating {num_readings} readings spanning 2 hours...")
-    
-    for i in range(num_readings):
-        # Calculate time offset (spread over 2 hours)
-        minutes_ago = int((num_readings - i) * (120 / num_readings))
-        
-        # Simulate realistic temperature variations
-        # Temperature fluctuates around base with some trend
-        temp_variation = random.uniform(-2.0, 2.0)
-        temp = base_temp + temp_variation + (i / num_readings * 0.5)  # Slight warming trend
-        
-        # Humidity variations
-        humidity_variation = random.randint(-8, 8)
-        humidity = max(20, min(80, base_humidity + humidity_variation))
-        
-        # Add the reading with backdated timestamp
-        import json
-        with open('sensor_data.json', 'r') as f:
-            data = json.load(f)
-        
-        timestamp = (base_time - timedelta(minutes=minutes_ago)).isoformat()
-        
-        data['readings'].append({
-            'timestamp': timestamp,
-            'temperature': round(temp, 2),
-            'humidity': humidity
-        })
-        
-        with open('sensor_data.json', 'w') as f:
-            json.dump(data, f, indent=2)
-        
-        if (i + 1) % 20 == 0:
-            print(f"  Generated {i + 1}/{num_readings} readings...")
-    
-    print("\n📊 You can now run: streamlit run streamlit_app.py")
+from typing import Optional
+
+import numpy as np
+
+from data_store import DataStore
+
+DEMO_DB_PATH = 'HVAC_Demo.duckdb'
+
+# readings generated and written per block
+_BLOCK_READINGS = 1 << 22
+
+# spacing of the random knots the slow drifts are interpolated between
+_DRIFT_KNOT_SECONDS = 3 * 3600
+
+
+def _drift(rng: np.random.Generator, start: float, end: float, scale: float, persistence: float = 0.8):
+    # knots of an AR(1) series, interpolated linearly: smooth, bounded wandering
+    knots = np.empty(int((end - start) // _DRIFT_KNOT_SECONDS) + 2)
+    innovations = rng.normal(0.0, scale * np.sqrt(1 - persistence ** 2), len(knots))
+    knots[0] = rng.normal(0.0, scale)
+    # short recurrence over the knots only (one per few hours), not over the readings
+    for i in range(1, len(knots)):
+        knots[i] = persistence * knots[i - 1] + innovations[i]
+    return start + _DRIFT_KNOT_SECONDS * np.arange(len(knots)), knots
+
+
+def generate_sample_data(db_path: str = DEMO_DB_PATH, sensors: int = 3, days: float = 7,
+                         interval: float = 10.0, end: Optional[float] = None, seed: int = 0,
+                         utc_offset: Optional[float] = None, force: bool = False) -> int:
+    """Generate synthetic readings and bulk-load them into a DuckDB database.
+
+    Args:
+        db_path: Database to write (created if missing)
+        sensors: Number of sensors, named sensor-01, sensor-02, ...
+        days: Span of time to cover
+        interval: Seconds between a sensor's readings
+        end: Epoch seconds of the last reading, now by default
+        seed: Random seed; the same arguments always produce the same data
+        utc_offset: Seconds from UTC of the local time the daily cycle follows,
+            this machine's by default
+        force: Also write into a database that already holds readings
+
+    Returns:
+        Number of readings written
+
+    Raises:
+        ValueError: If the database already holds readings and force is not set
+    """
+    end = time.time() if end is None else end
+    start = end - days * 86400
+    if utc_offset is None:
+        utc_offset = time.localtime().tm_gmtoff
+    per_sensor = int(days * 86400 // interval)
+    seeds = np.random.SeedSequence(seed).spawn(sensors + 1)
+    weather_times, weather = _drift(np.random.default_rng(seeds[0]), start, end, scale=1.5)
+
+    written = 0
+    with DataStore(db_path) as store:
+        existing = store.conn.execute('SELECT count(*) FROM sensor_readings;').fetchone()[0]
+        if existing and not force:
+            raise ValueError(f"{db_path} already holds {existing:,} readings; "
+                             "pick another --db, or pass --force to add the demo data to them")
+        for sensor in range(sensors):
+            rng = np.random.default_rng(seeds[sensor + 1])
+            sensor_id = f"sensor-{sensor + 1:02d}"
+            base_temp = rng.uniform(19.0, 24.0)
+            amplitude = rng.uniform(0.5, 2.0)
+            peak_hour = rng.uniform(14.0, 18.0)
+            base_humidity = rng.uniform(35.0, 55.0)
+            offset = rng.uniform(0.0, interval)
+            drift_times, drift = _drift(rng, start, end, scale=0.5)
+            humidity_times, humidity_drift = _drift(rng, start, end, scale=4.0)
+
+            for first in range(0, per_sensor, _BLOCK_READINGS):
+                index = np.arange(first, min(first + _BLOCK_READINGS, per_sensor), dtype=np.float64)
+                timestamps = start + offset + index * interval + rng.uniform(-0.1, 0.1, len(index)) * interval
+                hours = np.mod(timestamps + utc_offset, 86400) / 3600
+                daily = amplitude * np.cos(2 * np.pi * (hours - peak_hour) / 24)
+                temperatures = (base_temp + daily
+                                + np.interp(timestamps, weather_times, weather)
+                                + np.interp(timestamps, drift_times, drift)
+                                + rng.normal(0.0, 0.05, len(index)))
+                humidities = (base_humidity - 2.0 * (temperatures - base_temp)
+                              + np.interp(timestamps, humidity_times, humidity_drift)
+                              + rng.normal(0.0, 0.7, len(index)))
+                written += store.write_packets(
+                    timestamps,
+                    np.round(temperatures, 2),
+                    np.clip(np.rint(humidities), 0, 100).astype(np.int32),
+                    sensor_id,
+                    rollups=False
+                )
+        # one aggregation over the generated range (jitter included) beats maintaining the rollups block by block
+        store.rebuild_rollups(start - interval, end + interval)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic HVAC sensor data")
+    parser.add_argument('--db', default=DEMO_DB_PATH, help="DuckDB database file, kept apart from the collector's")
+    parser.add_argument('--sensors', type=int, default=3)
+    parser.add_argument('--days', type=float, default=7, help="days of history ending now")
+    parser.add_argument('--interval', type=float, default=10, help="seconds between readings of a sensor")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--force', action='store_true', help="write into a database that already holds readings")
+    args = parser.parse_args()
+
+    print(f"🔧 Generating {args.days:g} days of readings every {args.interval:g}s for {args.sensors} sensor(s)...")
+    started = time.perf_counter()
+    try:
+        written = generate_sample_data(args.db, args.sensors, args.days, args.interval, seed=args.seed,
+                                       force=args.force)
+    except ValueError as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    elapsed = time.perf_counter() - started
+    print(f"💾 Wrote {written:,} readings to {args.db} in {elapsed:.2f}s ({written / elapsed:,.0f} readings/s)")
+    print(f"\n📊 You can now run: DB_PATH={args.db} streamlit run streamlit_app.py")
     print("   to view the dashboard at http://localhost:8501")
 
+
 if __name__ == "__main__":
-    generate_sample_data(100)
+    main()
@@ -0,0 +1,116 @@
+"""
+Fake Bluetooth client for running the collector without hardware.
+
+FakeBleakClient implements the parts of bleak.BleakClient the collector
+uses, returning LYWSD03MMC-style 5-byte payloads (little-endian signed
+temperature in hundredths of a degree, humidity byte, battery millivolts).
+Both polling (read_gatt_char) and GATT notifications (start_notify /
+stop_notify, one payload every notify_interval) are supported.
+"""
+
+import asyncio
+import inspect
+import random
+from typing import Any, Callable, Dict, Optional
+
+
+def encode_sensor_data(temperature: float, humidity: int, battery_mv: int = 3000) -> bytes:
+    """Encode a raw reading the way the LYWSD03MMC reports it.
+
+    Args:
+        temperature: Raw (uncorrected) temperature in Celsius
+        humidity: Humidity percentage
+        battery_mv: Battery voltage in millivolts
+
+    Returns:
+        5-byte payload
+    """
+    return (
+        int(round(temperature * 100)).to_bytes(2, byteorder='little', signed=True)
+        + int(humidity).to_bytes(1, byteorder='little')
+        + int(battery_mv).to_bytes(2, byteorder='little')
+    )
+
+
+class FakeBleakClient:
+    """Stand-in for bleak.BleakClient that produces synthetic readings."""
+
+    def __init__(
+        self,
+        address: str,
+        base_temperature: float = 24.7,
+        base_humidity: int = 45,
+        read_latency: float = 0.0,
+        notify_interval: float = 1.0,
+        seed: Optional[int] = None
+    ):
+        self.address = address
+        self.base_temperature = base_temperature
+        self.base_humidity = base_humidity
+        self.read_latency = read_latency
+        self.notify_interval = notify_interval
+        self.reads = 0
+        self.notifications = 0
+        self._connected = False
+        self._notify_tasks: Dict[Any, asyncio.Task] = {}
+        self._random = random.Random(seed if seed is not None else address)
+
+    @property
+    def is_connected(self) -> bool:
+        return self._connected
+
+    async def connect(self) -> bool:
+        self._connected = True
+        return True
+
+    async def disconnect(self) -> bool:
+        for char_specifier in list(self._notify_tasks):
+            await self.stop_notify(char_specifier)
+        self._connected = False
+        return True
+
+    async def __aenter__(self) -> 'FakeBleakClient':
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.disconnect()
+
+    def next_payload(self) -> bytes:
+        """Produce the next synthetic payload."""
+        temperature = self.base_temperature + self._random.uniform(-0.5, 0.5)
+        humidity = self.base_humidity + self._random.randint(-3, 3)
+        return encode_sensor_data(temperature, humidity)
+
+    async def read_gatt_char(self, char_specifier) -> bytearray:
+        if not self._connected:
+            raise ConnectionError(f"{self.address} is not connected")
+        if self.read_latency:
+            await asyncio.sleep(self.read_latency)
+        self.reads += 1
+        return bytearray(self.next_payload())
+
+    async def start_notify(self, char_specifier, callback: Callable[[Any, bytearray], Any]) -> None:
+        if not self._connected:
+            raise ConnectionError(f"{self.address} is not connected")
+        self._notify_tasks[char_specifier] = asyncio.create_task(
+            self._emit_notifications(char_specifier, callback)
+        )
+
+    async def stop_notify(self, char_specifier) -> None:
+        task = self._notify_tasks.pop(char_specifier, None)
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _emit_notifications(self, char_specifier, callback) -> None:
+        # Push a payload every notify_interval, like the sensor does once subscribed
+        while self._connected:
+            await asyncio.sleep(self.notify_interval)
+            self.notifications += 1
+            result = callback(char_specifier, bytearray(self.next_payload()))
+            if inspect.isawaitable(result):
+                await result
@@ -0,0 +1,316 @@
+"""
+Feature engineering for temperature forecasting.
+
+FeaturePipeline turns a sensor's regular grid of steps (as built by
+dataset.export_features) into model inputs:
+
+- the step's temperature and humidity, and its dew point
+- lagged temperatures
+- rolling temperature means and least-squares slopes (°C per hour)
+- time-of-day and day-of-week encodings, in a named time zone so they
+  follow daylight saving time
+- the setpoint and heating/cooling state in force (from the actions table)
+
+transform() computes whole blocks of steps with cumulative sums and
+slicing, no per-row Python. The rows it needs from before a block are
+passed in as `history`, which is how the export continues from one chunk
+to the next and how OnlineFeatures computes a single new step for the
+live control loop: both go through the same code, so a feature row is the
+same in training and at runtime (up to float32 rounding).
+"""
+
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+import pandas as pd
+
+from controller import COOL_ON, HEAT_ON, MODE_NAMES
+from setpoint import DEFAULT_SETPOINT, SETPOINT_ACTION
+
+# per-step inputs of the pipeline, in this order
+RAW_COLUMNS = ('temperature', 'humidity', 'setpoint', 'heating', 'cooling')
+
+# Magnus formula coefficients over water
+_MAGNUS_B = 17.62
+_MAGNUS_C = 243.12
+
+# steps per pass inside transform(); keeps the running sums small, so a row's
+# value does not depend on where its pass started beyond float32 rounding
+_PASS_ROWS = 1 << 16
+
+_SECONDS_PER_DAY = 86400
+# 1970-01-01 was a Thursday; shifts day numbers so Monday is 0
+_EPOCH_WEEKDAY = 3
+
+
+def dew_point(temperature, humidity) -> np.ndarray:
+    """Dew point in °C from temperature (°C) and relative humidity (%)."""
+    temperature = np.asarray(temperature, dtype=np.float64)
+    humidity = np.clip(np.asarray(humidity, dtype=np.float64), 1.0, 100.0)
+    gamma = np.log(humidity / 100.0) + _MAGNUS_B * temperature / (_MAGNUS_C + temperature)
+    return _MAGNUS_C * gamma / (_MAGNUS_B - gamma)
+
+
+def _valid_timezone(name: str) -> bool:
+    try:
+        ZoneInfo(name)
+        return True
+    except (ValueError, ZoneInfoNotFoundError):
+        return False
+
+
+def local_timezone() -> str:
+    """This machine's IANA time zone name, e.g. 'Europe/Berlin'.
+
+    Read from TZ or the /etc/localtime link. Where neither names a zone,
+    the current whole-hour offset is used as a fixed 'Etc/GMT' zone, which
+    does not follow daylight saving time; pass the name explicitly then.
+    """
+    name = os.environ.get('TZ', '').lstrip(':')
+    if not name:
+        path = os.path.realpath('/etc/localtime')
+        name = path.split('/zoneinfo/', 1)[1] if '/zoneinfo/' in path else ''
+    if name and _valid_timezone(name):
+        return name
+    offset = time.localtime().tm_gmtoff
+    # Etc/GMT zones count the other way round: Etc/GMT-2 is UTC+2
+    return f'Etc/GMT{-offset // 3600:+d}' if offset % 3600 == 0 else 'UTC'
+
+
+def action_states(actions: Dict[str, np.ndarray], sensor_id: Optional[str], times) -> np.ndarray:
+    """Setpoint and heating/cooling state in force just before each time.
+
+    Args:
+        actions: DataStore.read_actions(format='numpy') result, oldest first
+        sensor_id: Zone whose mode is wanted; actions without a zone apply to every zone
+        times: Epoch seconds to look up
+
+    Returns:
+        float64 array (len(times), 3): setpoint, heating (0/1), cooling (0/1)
+    """
+    times = np.asarray(times, dtype=np.float64)
+    states = np.zeros((len(times), 3))
+    timestamps = np.asarray(actions['timestamp'], dtype=np.float64)
+    targets = np.asarray(actions['target_temp'], dtype=np.float64)
+    names = np.ma.getdata(actions['action_name'])
+    zones = actions.get('zone', np.ma.masked_all(len(timestamps), dtype=object))
+
+    # only setpoint changes define the setpoint (see setpoint.py)
+    is_setpoint = names == SETPOINT_ACTION
+    setpoint_times, setpoint_targets = timestamps[is_setpoint], targets[is_setpoint]
+    latest = np.searchsorted(setpoint_times, times, side='left') - 1
+    states[:, 0] = np.where(latest >= 0, setpoint_targets[np.maximum(latest, 0)] if len(setpoint_targets) else 0.0,
+                            DEFAULT_SETPOINT)
+
+    is_mode = np.isin(names, MODE_NAMES)
+    is_zone = np.ma.getmaskarray(zones) | (np.ma.getdata(zones) == sensor_id)
+    mode_times = timestamps[is_mode & is_zone]
+    mode_names = names[is_mode & is_zone]
+    latest = np.searchsorted(mode_times, times, side='left') - 1
+    current = np.where(latest >= 0, mode_names[np.maximum(latest, 0)] if len(mode_names) else '', '')
+    states[:, 1] = current == MODE_NAMES[HEAT_ON]
+    states[:, 2] = current == MODE_NAMES[COOL_ON]
+    return states
+
+
+class FeaturePipeline:
+    """
+    Model input columns computed from RAW_COLUMNS steps.
+
+    All windows are in steps of `resolution` seconds. A pipeline built
+    with no lags or windows and calendar, dew_point and actions off yields
+    just temperature and humidity, the columns of the first feature export.
+    """
+
+    def __init__(self, resolution: float = 60, lags: Sequence[int] = (1, 5, 15),
+                 windows: Sequence[int] = (15, 60), calendar: bool = True,
+                 dew_point: bool = True, actions: bool = True,
+                 timezone: Optional[str] = None, utc_offset: Optional[float] = None):
+        """
+        Args:
+            resolution: Seconds per step
+            lags: Steps back for each lagged temperature column
+            windows: Steps per rolling mean/slope column pair (at least 2)
+            calendar: Add sin/cos encodings of the time of day and day of week
+            dew_point: Add the dew point
+            actions: Add the setpoint and heating/cooling state
+            timezone: IANA time zone of the calendar columns, this machine's by default
+            utc_offset: A fixed offset in seconds instead of a time zone, as
+                stored by pipelines exported before time zones were used
+        """
+        if any(lag < 1 for lag in lags):
+            raise ValueError("lags must be at least 1 step")
+        if any(window < 2 for window in windows):
+            raise ValueError("rolling windows must be at least 2 steps")
+        self.resolution = float(resolution)
+        self.lags = [int(lag) for lag in lags]
+        self.windows = [int(window) for window in windows]
+        self.calendar = calendar
+        self.dew_point = dew_point
+        self.actions = actions
+        if utc_offset is not None and timezone is None:
+            self.timezone, self.utc_offset = None, float(utc_offset)
+        else:
+            self.timezone, self.utc_offset = timezone or local_timezone(), None
+            if not _valid_timezone(self.timezone):
+                raise ValueError(f"Unknown time zone '{self.timezone}'")
+
+    @classmethod
+    def from_config(cls, config: Optional[Dict], resolution: float = 60) -> 'FeaturePipeline':
+        """Rebuild a pipeline from config(); None gives the bare temperature/humidity pipeline."""
+        if config is None:
+            return cls(resolution, lags=(), windows=(), calendar=False, dew_point=False, actions=False,
+                       timezone='UTC')
+        return cls(**config)
+
+    def config(self) -> Dict:
+        """Everything needed to rebuild this pipeline, JSON-serializable."""
+        return {
+            'resolution': self.resolution,
+            'lags': self.lags,
+            'windows': self.windows,
+            'calendar': self.calendar,
+            'dew_point': self.dew_point,
+            'actions': self.actions,
+            'timezone': self.timezone,
+            'utc_offset': self.utc_offset,
+        }
+
+    @property
+    def columns(self) -> List[str]:
+        columns = ['temperature', 'humidity']
+        if self.dew_point:
+            columns.append('dew_point')
+        columns += [f'temperature_lag_{lag}' for lag in self.lags]
+        for window in self.windows:
+            columns += [f'temperature_mean_{window}', f'temperature_slope_{window}']
+        if self.calendar:
+            columns += ['time_of_day_sin', 'time_of_day_cos', 'day_of_week_sin', 'day_of_week_cos']
+        if self.actions:
+            columns += ['setpoint', 'heating', 'cooling']
+        return columns
+
+    @property
+    def context(self) -> int:
+        """Steps before a row that its features depend on."""
+        return max(self.lags + [window - 1 for window in self.windows], default=0)
+
+    def transform(self, timestamps, raw, history=None) -> np.ndarray:
+        """Feature rows for consecutive steps of one sensor.
+
+        Args:
+            timestamps: Start time of each step, epoch seconds
+            raw: Array (steps, len(RAW_COLUMNS)) of step values
+            history: The raw rows immediately before these steps (the last
+                `context` are used); at the start of a sensor's history
+                missing rows are filled with its first row
+
+        Returns:
+            float32 array (steps, len(columns))
+        """
+        timestamps = np.asarray(timestamps, dtype=np.float64)
+        raw = np.asarray(raw, dtype=np.float64)
+        context = self.context
+        history = np.empty((0, len(RAW_COLUMNS))) if history is None or context == 0 \
+            else np.asarray(history, dtype=np.float64)[-context:]
+        first = history[0] if len(history) else raw[0]
+        lead = np.concatenate([np.repeat(first[None, :], context - len(history), axis=0), history])
+
+        out = np.empty((len(raw), len(self.columns)), dtype=np.float32)
+        # computed column by column into a contiguous buffer, transposed once per pass
+        buffer = np.empty((len(self.columns), min(len(raw), _PASS_ROWS)), dtype=np.float32)
+        for start in range(0, len(raw), _PASS_ROWS):
+            stop = min(start + _PASS_ROWS, len(raw))
+            before = raw[start - context:start] if start >= context else np.concatenate([lead[start:], raw[:start]])
+            columns = buffer[:, :stop - start]
+            self._fill(timestamps[start:stop], np.concatenate([before, raw[start:stop]]), columns)
+            out[start:stop] = columns.T
+        return out
+
+    def _fill(self, timestamps: np.ndarray, padded: np.ndarray, columns: np.ndarray) -> None:
+        # padded holds `context` rows followed by one row per output column entry
+        context = self.context
+        rows = columns.shape[1]
+        temperature = np.ascontiguousarray(padded[:, 0])
+        humidity = padded[context:, 1]
+        columns[0] = temperature[context:]
+        columns[1] = humidity
+        column = 2
+        if self.dew_point:
+            columns[column] = dew_point(temperature[context:], humidity)
+            column += 1
+        for lag in self.lags:
+            columns[column] = temperature[context - lag:context - lag + rows]
+            column += 1
+
+        if self.windows:
+            # running sums relative to the first value, with the step index
+            # weights needed for slopes; sums[i] covers padded rows before i
+            offset = temperature[0]
+            deviation = temperature - offset
+            index = np.arange(len(padded), dtype=np.float64)
+            sums = np.concatenate([[0.0], np.cumsum(deviation)])
+            weighted = np.concatenate([[0.0], np.cumsum(index * deviation)])
+            end = context + 1
+            for window in self.windows:
+                start = end - window
+                total = sums[end:end + rows] - sums[start:start + rows]
+                columns[column] = total / window + offset
+                # sum of (index - window centre) * value, over the sum of squared index offsets
+                centre = index[end - 1:end - 1 + rows] - (window - 1) / 2
+                covariance = weighted[end:end + rows] - weighted[start:start + rows] - centre * total
+                columns[column + 1] = covariance * (12 * 3600 / (window * (window ** 2 - 1) * self.resolution))
+                column += 2
+
+        if self.calendar:
+            # angles in float64, trigonometry in float32 like the output
+            local = self._local_seconds(timestamps)
+            day_angle = (2 * np.pi / _SECONDS_PER_DAY * np.mod(local, _SECONDS_PER_DAY)).astype(np.float32)
+            week_angle = (2 * np.pi / 7 * np.mod(np.floor(local / _SECONDS_PER_DAY) + _EPOCH_WEEKDAY, 7)).astype(np.float32)
+            np.sin(day_angle, out=columns[column])
+            np.cos(day_angle, out=columns[column + 1])
+            np.sin(week_angle, out=columns[column + 2])
+            np.cos(week_angle, out=columns[column + 3])
+            column += 4
+        if self.actions:
+            columns[column:column + 3] = padded[context:, 2:5].T
+
+    def _local_seconds(self, timestamps: np.ndarray) -> np.ndarray:
+        # epoch seconds shifted by the time zone's offset in force at each of them
+        if self.timezone is None:
+            return timestamps + self.utc_offset
+        utc = pd.to_datetime(timestamps, unit='s', utc=True)
+        # the offset is exact whole seconds, whatever the rounding of the timestamps
+        offsets = (utc.tz_convert(self.timezone).tz_localize(None) - utc.tz_localize(None)) / pd.Timedelta(seconds=1)
+        return timestamps + np.asarray(offsets, dtype=np.float64)
+
+    def online(self) -> 'OnlineFeatures':
+        """Incremental feature computation for one live sensor."""
+        return OnlineFeatures(self)
+
+
+class OnlineFeatures:
+    """
+    One sensor's features computed step by step.
+
+    Keeps the last `context` raw rows and runs each new step through
+    FeaturePipeline.transform with them as history, so live rows match the
+    exported training rows.
+    """
+
+    def __init__(self, pipeline: FeaturePipeline):
+        self.pipeline = pipeline
+        self._history = np.empty((0, len(RAW_COLUMNS)))
+
+    def update(self, timestamp: float, raw: Sequence[float]) -> np.ndarray:
+        """Feature row for the next step, given its start time and RAW_COLUMNS values."""
+        raw = np.asarray(raw, dtype=np.float64)[None, :]
+        row = self.pipeline.transform(np.array([timestamp]), raw, self._history)[0]
+        context = self.pipeline.context
+        if context:
+            self._history = np.concatenate([self._history[-(context - 1):] if context > 1 else self._history[:0],
+                                            raw])
+        return row
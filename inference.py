@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+"""
+Temperature predictions for live HVAC decisions.
+
+A trained Temp_Predictor checkpoint is exported once to a small .npz
+artifact (weights, normalization statistics, window sizes, the feature
+pipeline and a schema version). NumpyPredictor runs the linear model
+from that artifact with a single matrix product, so the collector never
+imports torch; TorchPredictor runs the checkpoint itself under
+torch.inference_mode for models that cannot be exported.
+
+BatchingPredictor collects prediction requests arriving on the event loop
+and runs them as one batch once max_batch requests are waiting or the
+oldest has waited max_delay seconds. ControlLoop feeds it from the
+collector: it averages each sensor's readings into model-resolution
+steps, turns each completed step into a feature row with the model's
+features.FeaturePipeline, asks for a prediction and passes the
+result to controller.HvacController, whose transitions are logged to the
+actions table through the persistence queue.
+
+    python inference.py checkpoints/temp_predictor.pt --out models/temp_predictor.npz
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from contants import ConfigurationError
+from controller import COOL_ON, HEAT_ON, HvacController
+from features import FeaturePipeline
+from persistence_queue import PersistenceQueue
+from protocols import Predictor
+from setpoint import DEFAULT_SETPOINT, SetpointService
+
+logger = logging.getLogger(__name__)
+
+ARTIFACT_VERSION = 1
+
+# latency percentiles are taken over this many most recent predictions
+LATENCY_WINDOW = 10000
+
+
+def export_artifact(checkpoint_path: str, out_path: str) -> Dict:
+    """Export a train.py checkpoint to a NumPy artifact for NumpyPredictor.
+
+    Args:
+        checkpoint_path: Checkpoint written by train.py
+        out_path: Destination .npz file
+
+    Returns:
+        The artifact's config (window sizes, columns, resolution, schema version)
+    """
+    import torch
+
+    checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=True)
+    state, config = checkpoint['model_state'], checkpoint['config']
+    if config.get('hidden'):
+        raise ValueError("Only the linear model can be exported; load the checkpoint itself with TorchPredictor")
+    artifact_config = {
+        'schema_version': ARTIFACT_VERSION,
+        'history': config['history'],
+        'horizon': config['horizon'],
+        'target_index': config['target_index'],
+        'columns': list(config['columns']),
+        'resolution': config['resolution'],
+        'pipeline': config.get('pipeline'),
+        'epoch': checkpoint['epoch'],
+        'val_loss': checkpoint['val_loss'],
+    }
+    os.makedirs(os.path.dirname(out_path) or '.', exist_ok=True)
+    np.savez(
+        out_path,
+        weight=state['linear.weight'].numpy().reshape(config['history'], config['in_features']),
+        bias=state['linear.bias'].numpy(),
+        mean=state['mean'].numpy(),
+        std=state['std'].numpy(),
+        config=np.array(json.dumps(artifact_config)),
+    )
+    return artifact_config
+
+
+class NumpyPredictor:
+    """
+    Temp_Predictor's forward pass in NumPy.
+
+    Input normalization and the mapping back to °C are folded into the
+    weights when the artifact is loaded, so a prediction is one
+    (batch, history * features) @ (history * features,) product.
+    """
+
+    def __init__(self, weight: np.ndarray, bias: np.ndarray, mean: np.ndarray, std: np.ndarray,
+                 config: Dict):
+        if config.get('schema_version') != ARTIFACT_VERSION:
+            raise ValueError(f"Artifact schema version {config.get('schema_version')} is not supported "
+                             f"(expected {ARTIFACT_VERSION}); export the checkpoint again")
+        self.config = config
+        self.history = int(config['history'])
+        self.horizon = int(config['horizon'])
+        self.columns = list(config['columns'])
+        self.resolution = float(config['resolution'])
+        self.pipeline = FeaturePipeline.from_config(config.get('pipeline'), self.resolution)
+
+        weight = np.asarray(weight, dtype=np.float64).reshape(self.history, len(self.columns))
+        mean = np.asarray(mean, dtype=np.float64)
+        std = np.asarray(std, dtype=np.float64)
+        target = int(config['target_index'])
+        # forward: ((x - mean) / std) . weight + bias, scaled by std[target] and shifted by mean[target]
+        self._weight = (weight / std * std[target]).ravel()
+        self._bias = float((np.asarray(bias, dtype=np.float64)[0] - (mean / std * weight).sum()) * std[target]
+                           + mean[target])
+
+    @classmethod
+    def load(cls, path: str) -> 'NumpyPredictor':
+        """Load an artifact written by export_artifact."""
+        with np.load(path) as artifact:
+            return cls(artifact['weight'], artifact['bias'], artifact['mean'], artifact['std'],
+                       json.loads(str(artifact['config'])))
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+        """Predicted temperatures (°C) for a (batch, history, features) array of windows."""
+        return windows.reshape(len(windows), -1) @ self._weight + self._bias
+
+
+class TorchPredictor:
+    """
+    A train.py checkpoint run with torch, for models NumpyPredictor cannot run.
+
+    The model is built once and always called under torch.inference_mode.
+    Intra-op threads default to one: the batches here are small and thread
+    hand-off would cost more than the arithmetic.
+    """
+
+    def __init__(self, checkpoint_path: str, threads: int = 1):
+        import torch
+        from model import Temp_Predictor
+
+        self._torch = torch
+        if threads:
+            torch.set_num_threads(threads)
+        checkpoint = torch.load(checkpoint_path, map_location='cpu', weights_only=True)
+        config = checkpoint['config']
+        self.config = config
+        self.history = int(config['history'])
+        self.horizon = int(config['horizon'])
+        self.columns = list(config['columns'])
+        self.resolution = float(config['resolution'])
+        self.pipeline = FeaturePipeline.from_config(config.get('pipeline'), self.resolution)
+        self.model = Temp_Predictor(config['in_features'], config['history'], config['target_index'],
+                                    config.get('hidden', 0))
+        self.model.load_state_dict(checkpoint['model_state'])
+        self.model.eval()
+
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+        """Predicted temperatures (°C) for a (batch, history, features) array of windows."""
+        with self._torch.inference_mode():
+            x = self._torch.from_numpy(np.ascontiguousarray(windows, dtype=np.float32))
+            return self.model(x).numpy()[:, 0]
+
+
+def load_predictor(path: str) -> Predictor:
+    """NumpyPredictor for an exported .npz artifact, TorchPredictor for a checkpoint."""
+    if path.endswith('.npz'):
+        return NumpyPredictor.load(path)
+    return TorchPredictor(path)
+
+
+class BatchingPredictor:
+    """
+    Micro-batches prediction requests made on the event loop.
+
+    submit() copies the window straight into a preallocated batch array and
+    returns a future; the batch runs when max_batch windows are waiting or
+    max_delay seconds after the first of them arrived. The model runs on
+    the event loop thread, which suits models that take microseconds to
+    milliseconds per batch.
+    """
+
+    def __init__(self, predictor: Predictor, max_batch: int = 64, max_delay: float = 0.005):
+        if max_batch < 1:
+            raise ConfigurationError(f"max_batch must be at least 1, got {max_batch}")
+        self.predictor = predictor
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        self._windows = np.empty((max_batch, predictor.history, len(predictor.columns)), dtype=np.float32)
+        self._futures: List[asyncio.Future] = []
+        self._submitted: List[float] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+
+        self.requests = 0
+        self.batches = 0
+        self.max_batch_seen = 0
+        self.model_seconds = 0.0
+        self.batch_seconds = 0.0
+        # ring buffer of recent latencies, filled a batch at a time
+        self._latencies = np.zeros(LATENCY_WINDOW)
+
+    def submit(self, window: np.ndarray) -> asyncio.Future:
+        """Queue one (history, features) window; the future resolves to its prediction."""
+        loop = asyncio.get_running_loop()
+        self._windows[len(self._futures)] = window
+        future = loop.create_future()
+        self._futures.append(future)
+        self._submitted.append(time.perf_counter())
+        if len(self._futures) == self.max_batch:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self.flush)
+        return future
+
+    async def predict(self, window: np.ndarray) -> float:
+        """Prediction for one (history, features) window."""
+        return await self.submit(window)
+
+    def flush(self) -> None:
+        """Run everything waiting as one batch now."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        futures, submitted = self._futures, self._submitted
+        if not futures:
+            return
+        self._futures, self._submitted = [], []
+
+        started = time.perf_counter()
+        try:
+            predictions = self.predictor.predict(self._windows[:len(futures)]).tolist()
+        except Exception as e:
+            for future in futures:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        finished = time.perf_counter()
+
+        for future, prediction in zip(futures, predictions):
+            if not future.done():
+                future.set_result(prediction)
+        slots = (self.requests + np.arange(len(futures))) % LATENCY_WINDOW
+        self._latencies[slots] = finished - np.array(submitted)
+        self.requests += len(futures)
+        self.batches += 1
+        self.max_batch_seen = max(self.max_batch_seen, len(futures))
+        self.model_seconds += finished - started
+        self.batch_seconds += time.perf_counter() - started
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get batching and latency statistics.
+
+        Returns:
+            Dict[str, float]: Dictionary containing:
+                - requests: Predictions made
+                - batches: Model calls made
+                - mean_batch_size: Average predictions per model call
+                - max_batch_size: Largest batch run
+                - p50_latency_ms: Median time from submit() to result (recent predictions)
+                - p99_latency_ms: 99th percentile time from submit() to result (recent predictions)
+                - model_ms_per_batch: Average time spent in the model per batch
+                - model_share: Fraction of batch processing time spent in the model
+        """
+        latencies = self._latencies[:min(self.requests, LATENCY_WINDOW)]
+        p50, p99 = np.percentile(latencies, [50, 99]) * 1000 if len(latencies) else (0.0, 0.0)
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.requests / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_seen,
+            "p50_latency_ms": float(p50),
+            "p99_latency_ms": float(p99),
+            "model_ms_per_batch": self.model_seconds / self.batches * 1000 if self.batches else 0.0,
+            "model_share": self.model_seconds / self.batch_seconds if self.batch_seconds else 0.0,
+        }
+
+
+class _StepWindow:
+    # The last `history` feature rows of one sensor, built the way dataset.export_features
+    # builds training rows: readings averaged per resolution-second step, gaps carried
+    # forward, and each completed step run through the model's FeaturePipeline
+
+    def __init__(self, history: int, pipeline: FeaturePipeline):
+        self.resolution = pipeline.resolution
+        self.features = pipeline.online()
+        self.values = np.zeros((history, len(pipeline.columns)), dtype=np.float32)
+        self.filled = 0
+        self.step: Optional[int] = None
+        # a gap longer than this is equivalent to one of this length
+        self._max_gap = history + pipeline.context
+        self._sums = np.zeros(2)
+        self._count = 0
+
+    def add(self, timestamp: float, temperature: float, humidity: float,
+            state: Sequence[float]) -> Optional[float]:
+        """Add a reading; returns the decision time when it completed a full window.
+
+        state is (setpoint, heating, cooling) as currently in force.
+        """
+        step = int(timestamp // self.resolution)
+        completed = None
+        if self.step is None:
+            self.step = step
+        elif step > self.step:
+            history = len(self.values)
+            raw = np.concatenate([self._sums / self._count, state])
+            gap = step - self.step
+            for missed in range(max(gap - self._max_gap, 0), gap):
+                self.values[:-1] = self.values[1:]
+                self.values[-1] = self.features.update((self.step + missed) * self.resolution, raw)
+            self.filled = min(self.filled + gap, history)
+            self._sums[:] = 0.0
+            self._count = 0
+            self.step = step
+            if self.filled == history:
+                completed = step * self.resolution
+        # a late reading from an earlier step counts towards the current one
+        self._sums[0] += temperature
+        self._sums[1] += humidity
+        self._count += 1
+        return completed
+
+
+class ControlLoop:
+    """
+    Predictions and HVAC decisions for the sensors of a running collector.
+
+    Register it on the collector's PersistenceQueue with start(); every
+    reading then updates its sensor's window, and each completed step
+    triggers a batched prediction and one HvacController step for that
+    zone. Transitions are logged, and the setpoint re-read, on the
+    persistence writer thread every sync_interval seconds.
+    """
+
+    def __init__(self, zones: Sequence[str], batcher: BatchingPredictor,
+                 controller: Optional[HvacController] = None,
+                 default_setpoint: float = DEFAULT_SETPOINT):
+        model = batcher.predictor
+        if model.pipeline.columns != model.columns:
+            raise ConfigurationError(f"The model's columns {model.columns} do not match its feature pipeline "
+                                     f"{model.pipeline.columns}")
+        self.zones = list(zones)
+        self.batcher = batcher
+        self.controller = controller or HvacController(self.zones)
+        self.setpoint = default_setpoint
+        self.setpoints: Optional[SetpointService] = None
+
+        self._zone_index = {zone: i for i, zone in enumerate(self.zones)}
+        self._windows = [_StepWindow(model.history, model.pipeline) for _ in self.zones]
+        # NaN temperatures leave a zone's mode untouched in HvacController.step
+        self._temps = np.full(len(self.zones), np.nan)
+        self._persistence: Optional[PersistenceQueue] = None
+        self._sync_task: Optional[asyncio.Task] = None
+        self._stopping: Optional[asyncio.Event] = None
+
+        self.decisions = 0
+        self.errors = 0
+        self.logged = 0
+
+    async def start(self, persistence: PersistenceQueue, sync_interval: float = 10.0) -> None:
+        """Load the current setpoint and start receiving the queue's readings."""
+        self._persistence = persistence
+        self.setpoints = await persistence.run_with_store(SetpointService)
+        self.setpoint = self.setpoints.setpoint
+        persistence.add_listener(self.observe)
+        self._stopping = asyncio.Event()
+        self._sync_task = asyncio.create_task(self._sync_every(sync_interval))
+
+    def observe(self, timestamp: float, temperature: float, humidity: int, sensor_id: Optional[str]) -> None:
+        """PersistenceQueue listener: fold a reading into its sensor's window."""
+        zone = self._zone_index.get(sensor_id)
+        if zone is None:
+            return
+        window = self._windows[zone]
+        mode = self.controller.modes[zone]
+        decided_at = window.add(timestamp, temperature, humidity,
+                                (self.setpoint, mode == HEAT_ON, mode == COOL_ON))
+        if decided_at is not None:
+            future = self.batcher.submit(window.values)
+            future.add_done_callback(functools.partial(self._decide, zone, decided_at))
+
+    def _decide(self, zone: int, timestamp: float, future: asyncio.Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            self.errors += 1
+            return
+        self._temps[zone] = future.result()
+        self.controller.step(timestamp, self._temps, self.setpoint)
+        self._temps[zone] = np.nan
+        self.decisions += 1
+
+    async def sync(self) -> None:
+        """Log buffered transitions and pick up setpoint changes."""
+        pending = self.controller.take_pending()
+
+        def write(store) -> int:
+            # Runs on the writer thread
+            self.setpoints.refresh()
+            # transitions keep the setpoint they were decided under; they do not define it
+            return store.write_actions(*pending) if pending is not None else 0
+
+        try:
+            self.logged += await self._persistence.run_with_store(write)
+        except Exception:
+            # keep the transitions for the next sync
+            if pending is not None:
+                self.controller.restore_pending(pending)
+            raise
+        self.setpoint = self.setpoints.setpoint
+
+    async def _sync_every(self, interval: float) -> None:
+        # stopped through _stopping rather than cancelled, so a write already
+        # running on the writer thread is never abandoned half way
+        while True:
+            try:
+                await asyncio.wait_for(self._stopping.wait(), interval)
+                return
+            except asyncio.TimeoutError:
+                pass
+            try:
+                await self.sync()
+            except Exception:
+                logger.exception("Sync failed, %d transitions kept for the next one",
+                                 self.controller.pending_count)
+
+    async def close(self) -> None:
+        """Finish outstanding predictions and log the remaining transitions."""
+        if self._sync_task is not None:
+            self._stopping.set()
+            try:
+                await self._sync_task
+            except Exception:
+                logger.exception("Sync task stopped unexpectedly")
+            self._sync_task = None
+        self.batcher.flush()
+        # let the prediction callbacks run before the last sync
+        await asyncio.sleep(0)
+        if self._persistence is not None:
+            try:
+                await self.sync()
+            except Exception:
+                # shutdown goes on; the store and persistence queue still need closing
+                logger.exception("Final sync failed, %d transitions were not logged",
+                                 self.controller.pending_count)
+
+    def get_stats(self) -> Dict[str, float]:
+        """Decision counts together with the batcher's statistics."""
+        return {
+            "decisions": self.decisions,
+            "errors": self.errors,
+            "transitions_logged": self.logged,
+            **self.batcher.get_stats(),
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a trained Temp_Predictor to a NumPy artifact")
+    parser.add_argument('checkpoint', nargs='?', default='checkpoints/temp_predictor.pt',
+                        help="checkpoint written by train.py")
+    parser.add_argument('--out', default='models/temp_predictor.npz', help="artifact to write")
+    args = parser.parse_args()
+
+    config = export_artifact(args.checkpoint, args.out)
+    print(f"💾 Exported {args.checkpoint} to {args.out} "
+          f"(history {config['history']}, horizon {config['horizon']}, columns {', '.join(config['columns'])})")
+
+    # the exported model must agree with the checkpoint
+    rng = np.random.default_rng(0)
+    reference = TorchPredictor(args.checkpoint)
+    exported = NumpyPredictor.load(args.out)
+    windows = rng.normal(25, 10, (256, exported.history, len(exported.columns))).astype(np.float32)
+    difference = np.abs(reference.predict(windows) - exported.predict(windows)).max()
+    print(f"✅ Largest difference from the torch model on random windows: {difference:.2e} °C")
+
+
+if __name__ == "__main__":
+    main()
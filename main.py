@@ -1,22 +1,85 @@
 import asyncio
+import functools
+import logging
+from bleak import BleakClient
+
+from capture import CaptureWriter, capturing_factory
 from contants import Config, ConfigurationError
-from connection_handler import connect_and_read_sensor
-from packet_timer import PacketTimer
+from connection_handler import collect_from_sensors, connect_and_read_sensor
+from data_store import DataStore
+from inference import BatchingPredictor, ControlLoop, load_predictor
+from metrics import MetricsServer, dump_metrics
+from packet_timer import StreamingPacketTimer
+from persistence_queue import PersistenceQueue
+from store_server import StoreServer
 
 
 async def main():
     """Main entry point for the HVAC monitoring application."""
+    persistence = None
+    capture = None
+    control = None
+    metrics_server = None
+    metrics_dump = None
+    store_server = None
     try:
         # Initialize configuration
         config = Config()
+        logging.basicConfig(level=config.log_level, format='%(message)s')
+        # LOG_LEVEL=DEBUG is for the collector's own per-packet output, not the libraries'
+        for library in ('asyncio', 'bleak'):
+            logging.getLogger(library).setLevel(max(logging.getLevelName(config.log_level), logging.INFO))
         
         print("LYWSD03MMC Temperature/Humidity Reader with Packet Interval Analysis")
         print("=" * 70)
         print(f"Running on: {config.current_os}")
-        print(f"Using device address: {config.device_address}")
+        print(f"Using device address(es): {', '.join(config.device_addresses)}")
+        
+        # Create packet timer instance (constant memory for long runs)
+        packet_timer = StreamingPacketTimer()
+        
+        # Readings are written to DuckDB by a background writer thread
+        persistence = PersistenceQueue(
+            store_factory=functools.partial(DataStore, config.db_path),
+            capacity=config.queue_capacity,
+            policy=config.queue_policy,
+            spill_path=config.queue_spill_path
+        )
+        await persistence.start()
         
-        # Create packet timer instance
-        packet_timer = PacketTimer()
+        # The collector now holds the database; serve the dashboard's queries through it
+        if config.store_port is not None:
+            try:
+                store_server = StoreServer(persistence, config.db_path, config.store_port).start()
+                print(f"🗄️  Dashboard queries served at http://127.0.0.1:{store_server.port}")
+            except OSError as e:
+                print(f"⚠️  Cannot serve dashboard queries on port {config.store_port}: {e}")
+        
+        # Optionally export the collector's metrics
+        if config.metrics_port is not None:
+            metrics_server = MetricsServer(config.metrics_port).start()
+            print(f"📈 Metrics at http://127.0.0.1:{metrics_server.port}/metrics")
+        if config.metrics_path:
+            metrics_dump = asyncio.create_task(dump_metrics(config.metrics_path, config.metrics_interval))
+            print(f"📈 Metrics written to {config.metrics_path} every {config.metrics_interval:g}s")
+        
+        # Optionally predict and decide on every sensor's readings as they arrive
+        if config.model_path:
+            predictor = load_predictor(config.model_path)
+            control = ControlLoop(
+                config.device_addresses,
+                BatchingPredictor(predictor, config.inference_max_batch, config.inference_max_delay)
+            )
+            await control.start(persistence)
+            print(f"Controlling with {config.model_path} "
+                  f"({predictor.history} steps of {predictor.resolution:g}s history)")
+        
+        # Optionally record every raw payload for later replay
+        client_factory = BleakClient
+        if config.capture_path:
+            capture = CaptureWriter(config.capture_path)
+            client_factory = capturing_factory(BleakClient, capture)
+            print(f"Capturing raw packets to {config.capture_path}")
         
         # You can adjust the monitoring duration here (in minutes)
         monitoring_duration = 5  # Monitor for 5 minutes by default
@@ -24,11 +87,28 @@ async def main():
         print(f"Starting packet interval analysis for {monitoring_duration} minutes...")
         print("Press Ctrl+C to stop early and see results")
         
-        await connect_and_read_sensor(
-            config=config,
-            packet_timer=packet_timer,
-            duration_minutes=monitoring_duration
-        )
+        if len(config.device_addresses) > 1:
+            # One task per sensor, all sharing the same persistence queue
+            timers = await collect_from_sensors(
+                config=config,
+                duration_minutes=monitoring_duration,
+                persistence=persistence,
+                client_factory=client_factory
+            )
+            for address, timer in timers.items():
+                print(f"\n📡 {address}")
+                timer.print_detailed_stats()
+        else:
+            await connect_and_read_sensor(
+                config=config,
+                packet_timer=packet_timer,
+                duration_minutes=monitoring_duration,
+                persistence=persistence,
+                client_factory=client_factory
+            )
+            print("\n" + "🏁 FINAL PACKET INTERVAL ANALYSIS ".center(80, "="))
+            packet_timer.print_detailed_stats()
+            print("="*80)
         
     except ConfigurationError as e:
         print(f"❌ Configuration Error: {e}")
@@ -37,7 +117,7 @@ async def main():
     except KeyboardInterrupt:
         print("\n\n⚠️  Monitoring stopped by user")
         # Still show stats if we have any data
-        if 'packet_timer' in locals() and packet_timer.packet_times:
+        if 'packet_timer' in locals() and packet_timer.packet_count:
             stats = packet_timer.get_stats()
             print("\n" + "📊 PARTIAL RESULTS ".center(60, "="))
             print(f"📦 Packets received: {stats['total_packets']}")
@@ -46,6 +126,30 @@ async def main():
             print("="*60)
     except Exception as e:
         print(f"❌ Unexpected error: {e}")
+    finally:
+        if capture is not None:
+            capture.close()
+        if control is not None:
+            await control.close()
+            stats = control.get_stats()
+            print(f"🧠 Decisions: {stats['decisions']} in {stats['batches']} batches "
+                  f"(mean batch {stats['mean_batch_size']:.1f}, p50 {stats['p50_latency_ms']:.2f} ms, "
+                  f"p99 {stats['p99_latency_ms']:.2f} ms), transitions logged: {stats['transitions_logged']}")
+        if store_server is not None:
+            store_server.close()
+        if persistence is not None:
+            await persistence.close()
+            stats = persistence.get_stats()
+            print(f"💾 Readings written: {stats['written']} (dropped: {stats['dropped']}, spilled: {stats['spilled']})")
+        if metrics_dump is not None:
+            # the dump task writes a final snapshot as it is cancelled
+            metrics_dump.cancel()
+            try:
+                await metrics_dump
+            except asyncio.CancelledError:
+                pass
+        if metrics_server is not None:
+            metrics_server.close()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Retention and compaction for the HVAC database.
+
+Raw sensor readings older than the retention window are archived to
+compressed Parquet files partitioned by (UTC) day and then deleted. Their
+aggregates stay available in the rollup tables, which DataStore maintains
+on every write. Old actions are archived the same way, always keeping the
+latest setpoint change so the current setpoint survives. Finally the database is
+checkpointed and, optionally, rewritten into a fresh file so the space
+freed by the deletes is returned to the filesystem.
+
+    python maintenance.py --raw-days 30 --archive-dir archive/ --compact
+"""
+
+import argparse
+import os
+import time
+import uuid
+from typing import Dict, Optional
+
+import duckdb
+
+from data_store import DataStore
+from setpoint import SETPOINT_ACTION
+
+# UTC calendar day of an epoch-seconds column, independent of the session time zone
+_UTC_DAY = "strftime(make_timestamp(CAST(timestamp * 1000000 AS BIGINT)), '%Y-%m-%d')"
+
+
+def _quote(value: str) -> str:
+    # a SQL string literal, for paths that cannot be bound as parameters
+    return "'" + value.replace("'", "''") + "'"
+
+
+def _archive(conn: duckdb.DuckDBPyConnection, table: str, where: str, params: list, directory: str,
+             run_id: str) -> None:
+    # Append-safe: every run writes new uniquely named files into the day partitions,
+    # tagged with run_id so a failed run can remove its own
+    conn.execute(f'''
+        COPY (SELECT *, {_UTC_DAY} AS day FROM {table} WHERE {where})
+        TO {_quote(os.path.join(directory, table))}
+        (FORMAT PARQUET, COMPRESSION ZSTD, PARTITION_BY (day),
+         FILENAME_PATTERN '{table}_{run_id}_{{uuid}}', OVERWRITE_OR_IGNORE true);''', params)
+
+
+def _remove_archived(directory: str, run_id: str) -> None:
+    # Undo a run's archive files, when the deletes they belong to were rolled back
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if f'_{run_id}_' in name:
+                os.remove(os.path.join(root, name))
+
+
+def compact_database(db_path: str) -> None:
+    """Rewrite the database into a new file and swap it in, dropping free blocks.
+
+    The database must not be open elsewhere while this runs.
+    """
+    compacted_path = db_path + ".compact"
+    if os.path.exists(compacted_path):
+        os.remove(compacted_path)
+
+    conn = duckdb.connect(db_path)
+    try:
+        source = conn.execute('SELECT current_database();').fetchone()[0]
+        conn.execute(f"ATTACH {_quote(compacted_path)} AS compacted;")
+        source = source.replace('"', '""')
+        conn.execute(f'COPY FROM DATABASE "{source}" TO compacted;')
+        conn.execute('DETACH compacted;')
+    finally:
+        conn.close()
+    os.replace(compacted_path, db_path)
+
+
+def run_maintenance(
+    db_path: str,
+    raw_retention_days: float = 30,
+    action_retention_days: Optional[float] = 365,
+    archive_dir: Optional[str] = "archive",
+    compact: bool = False,
+    now: Optional[float] = None
+) -> Dict[str, float]:
+    """Archive and delete old raw data, then checkpoint (and optionally compact).
+
+    Args:
+        db_path: DuckDB database file
+        raw_retention_days: Keep raw sensor readings this many days
+        action_retention_days: Keep actions this many days, None to keep all
+        archive_dir: Directory for the Parquet archive, None to delete without archiving
+        compact: Rewrite the database file afterwards to shrink it on disk
+        now: Reference time in epoch seconds, defaults to the current time
+
+    Returns:
+        Dictionary with rows archived/deleted and database size before and after
+    """
+    now = time.time() if now is None else now
+    raw_cutoff = now - raw_retention_days * 86400
+    size_before = os.path.getsize(db_path) if os.path.exists(db_path) else 0
+
+    # Opening through DataStore guarantees the schema and a populated rollup set
+    store = DataStore(db_path)
+    conn = store.conn
+    report = {"readings_deleted": 0, "actions_deleted": 0}
+    run_id = uuid.uuid4().hex
+    try:
+        if archive_dir is not None:
+            os.makedirs(archive_dir, exist_ok=True)
+        # Archived and deleted in one transaction, so both see the same rows; if anything
+        # fails the deletes are rolled back and this run's archive files removed, and a
+        # re-run does not archive the rows twice
+        conn.begin()
+        try:
+            if archive_dir is not None:
+                _archive(conn, 'sensor_readings', 'timestamp < ?', [raw_cutoff], archive_dir, run_id)
+            report["readings_deleted"] = conn.execute(
+                'DELETE FROM sensor_readings WHERE timestamp < ?;', [raw_cutoff]
+            ).fetchone()[0]
+
+            if action_retention_days is not None:
+                # The newest setpoint change always survives: it holds the current setpoint
+                action_cutoff = now - action_retention_days * 86400
+                where = ('timestamp < ? AND NOT (action_name = ? AND timestamp = '
+                         '(SELECT max(timestamp) FROM actions WHERE action_name = ?))')
+                params = [action_cutoff, SETPOINT_ACTION, SETPOINT_ACTION]
+                if archive_dir is not None:
+                    _archive(conn, 'actions', where, params, archive_dir, run_id)
+                report["actions_deleted"] = conn.execute(
+                    f'DELETE FROM actions WHERE {where};', params
+                ).fetchone()[0]
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            if archive_dir is not None:
+                _remove_archived(archive_dir, run_id)
+            raise
+        conn.execute('CHECKPOINT;')
+    finally:
+        store.close()
+
+    if compact:
+        compact_database(db_path)
+
+    size_after = os.path.getsize(db_path)
+    report.update({
+        "bytes_before": size_before,
+        "bytes_after": size_after,
+        "bytes_reclaimed": size_before - size_after,
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive, prune and compact the HVAC database")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'HVAC_Data.duckdb'), help="DuckDB database file")
+    parser.add_argument('--raw-days', type=float, default=30, help="days of raw sensor readings to keep")
+    parser.add_argument('--action-days', type=float, default=365, help="days of actions to keep")
+    parser.add_argument('--archive-dir', default='archive', help="Parquet archive directory")
+    parser.add_argument('--no-archive', action='store_true', help="delete old rows without archiving them")
+    parser.add_argument('--compact', action='store_true', help="rewrite the database file to reclaim disk space")
+    args = parser.parse_args()
+
+    print(f"🧹 Running maintenance on {args.db}")
+    report = run_maintenance(
+        args.db,
+        raw_retention_days=args.raw_days,
+        action_retention_days=args.action_days,
+        archive_dir=None if args.no_archive else args.archive_dir,
+        compact=args.compact
+    )
+    print(f"🗑️  Raw readings removed: {report['readings_deleted']}")
+    print(f"🗑️  Actions removed: {report['actions_deleted']}")
+    print(f"💾 Database size: {report['bytes_before']:,} → {report['bytes_after']:,} bytes "
+          f"({report['bytes_reclaimed']:,} reclaimed)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+"""
+In-process metrics for the collector, exported in the Prometheus text format.
+
+A MetricsRegistry holds counters, gauges and histograms, each optionally
+split into one series per combination of label values (e.g. per device).
+Updating a series is a few attribute operations without locking, cheap
+enough for the per-packet path; each series is expected to be updated
+from a single thread (the event loop or the DuckDB writer thread). A lock
+is only taken when a new series first appears and while rendering.
+
+The collector publishes REGISTRY on a local HTTP endpoint for Prometheus
+to scrape (MetricsServer) and/or by rewriting a file every few seconds
+(dump_metrics), e.g. for node_exporter's textfile collector.
+"""
+
+import asyncio
+import bisect
+import math
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# seconds, from sub-millisecond parsing to multi-second BLE reads
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+Sample = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+def _format_value(value: float) -> str:
+    if isinstance(value, int):
+        return str(value)
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    if math.isnan(value):
+        return 'NaN'
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+class CounterSeries:
+    """One counter series; only ever goes up."""
+
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+
+class GaugeSeries:
+    """One gauge series, either set directly or read from a function when rendered."""
+
+    __slots__ = ('_value', '_function')
+
+    def __init__(self):
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    @property
+    def value(self) -> float:
+        return float(self._function()) if self._function is not None else self._value
+
+    def set(self, value: float) -> None:
+        self._value = value
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._value -= amount
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        """Report function() instead of the set value; costs nothing until rendered."""
+        self._function = function
+
+
+class HistogramSeries:
+    """One histogram series: per-bucket counts, their sum and the number of observations."""
+
+    __slots__ = ('bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, bounds: Sequence[float]):
+        self.bounds = bounds
+        # one slot per bound plus the +Inf bucket, not cumulative until rendered
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metric:
+    """
+    A named metric and its series, one per combination of label values.
+
+    Metrics without labels can be updated directly (metric.inc(),
+    metric.observe(...)); labelled ones through labels(*values), which
+    callers on a hot path may keep rather than look up every time.
+    """
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        if not self.label_names:
+            # reported (as zero) from the start, like any unlabelled Prometheus metric
+            self._series[()] = self._new_series()
+
+    def _new_series(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The series for these label values (strings), created on first use."""
+        series = self._series.get(values)
+        if series is None:
+            if len(values) != len(self.label_names):
+                raise ValueError(f"{self.name} takes labels {self.label_names}, got {values}")
+            with self._lock:
+                series = self._series.setdefault(values, self._new_series())
+        return series
+
+    def series(self) -> List[Tuple[Tuple[Tuple[str, str], ...], object]]:
+        """(labels, series) for every series so far."""
+        with self._lock:
+            items = list(self._series.items())
+        return [(tuple(zip(self.label_names, map(str, values))), series) for values, series in items]
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, labels, series.value) for labels, series in self.series()]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def _new_series(self) -> CounterSeries:
+        return CounterSeries()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def _new_series(self) -> GaugeSeries:
+        return GaugeSeries()
+
+    def set(self, value: float) -> None:
+        self.labels().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        self.labels().set_function(function)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labels)
+
+    def _new_series(self) -> HistogramSeries:
+        return HistogramSeries(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def samples(self) -> List[Sample]:
+        samples = []
+        for labels, series in self.series():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), list(series.counts)):
+                cumulative += count
+                samples.append((f'{self.name}_bucket', labels + (('le', _format_value(bound)),), cumulative))
+            samples.append((f'{self.name}_sum', labels, series.sum))
+            samples.append((f'{self.name}_count', labels, series.count))
+        return samples
+
+
+class MetricsRegistry:
+    """A set of uniquely named metrics, rendered together in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is None:
+                self._metrics[metric.name] = metric
+                return metric
+        # the same definition twice (e.g. a re-imported module) shares the metric
+        if type(existing) is not type(metric) or existing.label_names != metric.label_names:
+            raise ValueError(f"Metric '{metric.name}' is already registered as a different {existing.kind}")
+        return existing
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labels))
+
+    def gauge(self, name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help, labels, buckets))
+
+    def get(self, name: str) -> Optional[Metric]:
+        return self._metrics.get(name)
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# the process-wide registry the collector's modules record into
+REGISTRY = MetricsRegistry()
+
+
+class MetricsServer:
+    """
+    Serves a registry at http://host:port/metrics from a daemon thread.
+
+    Scrapes are answered off the event loop, so they still get through
+    when the collector is saturated. Binds to localhost by default.
+    """
+
+    def __init__(self, port: int, host: str = '127.0.0.1', registry: MetricsRegistry = REGISTRY):
+        self.registry = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split('?', 1)[0] not in ('/metrics', '/'):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode()
+                self.send_response(200)
+                self.send_header('Content-Type', CONTENT_TYPE)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                # one line per scrape would drown the collector's own output
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        """The bound port (useful with port 0)."""
+        return self._server.server_address[1]
+
+    def start(self) -> 'MetricsServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='metrics-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
+
+
+def write_metrics(path: str, registry: MetricsRegistry = REGISTRY) -> None:
+    """Write the rendered registry to path, atomically replacing the previous dump."""
+    partial = f'{path}.{os.getpid()}.tmp'
+    with open(partial, 'w') as f:
+        f.write(registry.render())
+    os.replace(partial, path)
+
+
+async def dump_metrics(path: str, interval: float = 15.0, registry: MetricsRegistry = REGISTRY) -> None:
+    """Rewrite the metrics file every interval seconds until cancelled, and once more on the way out."""
+    try:
+        while True:
+            await asyncio.sleep(interval)
+            await asyncio.to_thread(write_metrics, path, registry)
+    finally:
+        write_metrics(path, registry)
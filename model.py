@@ -1,15 +1,49 @@
 import torch
 import torch.nn as nn
 
+
 class Temp_Predictor(nn.Module) :
-    def __init__(self):
+    """
+    Temperature forecaster over a window of past steps.
+
+    Inputs are (batch, history, in_features) windows as served by
+    dataset.HvacDataset (a single step may also be given as
+    (batch, in_features) when history is 1). Inputs are normalized with the
+    dataset statistics held in buffers, so they travel with the state dict,
+    and the prediction is returned in °C.
+
+    With hidden=0 the model is linear; hidden > 0 adds one ReLU layer of
+    that width in front of the output layer.
+    """
+
+    def __init__(self, in_features=3, history=1, target_index=0, hidden=0):
         super(Temp_Predictor, self).__init__()
-        self.linear = nn.Linear(in_features=3, out_features=1)
-        pass
+        self.in_features = in_features
+        self.history = history
+        self.target_index = target_index
+        self.register_buffer('mean', torch.zeros(in_features))
+        self.register_buffer('std', torch.ones(in_features))
+        if hidden:
+            self.hidden = nn.Sequential(nn.Linear(in_features * history, hidden), nn.ReLU())
+        else:
+            self.hidden = nn.Identity()
+        self.linear = nn.Linear(in_features=hidden or in_features * history, out_features=1)
+
+    def set_normalization(self, mean, std):
+        # per-feature statistics of the training data (see HvacDataset.mean/std)
+        self.mean.copy_(torch.as_tensor(mean, dtype=torch.float32))
+        self.std.copy_(torch.as_tensor(std, dtype=torch.float32))
 
     def forward(self, x):
-        return self.linear(x)
-    
-model = Temp_Predictor()
-optimizer = torch.optim.Adam(model.parameters, lr=0.01)
-loss = nn.MSELoss
\ No newline at end of file
+        x = (x - self.mean) / self.std
+        # predict in normalized target units, then map back to °C
+        out = self.linear(self.hidden(x.reshape(x.shape[0], -1)))
+        return out * self.std[self.target_index] + self.mean[self.target_index]
+
+
+def make_optimizer(model, lr=0.01):
+    return torch.optim.Adam(model.parameters(), lr=lr)
+
+
+def make_loss():
+    return nn.MSELoss()
@@ -1,10 +1,27 @@
+import asyncio
 import datetime
-from typing import Optional, Tuple
+import logging
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple, Union
+
+import numpy as np
 from bleak import BleakClient
 
 from contants import Config, PacketParsingError
-from packet_timer import PacketTimer
-from data_store import SensorDataStore
+from protocols import TimerInterface
+from data_store import DataStore
+from metrics import REGISTRY
+from persistence_queue import PersistenceQueue
+
+logger = logging.getLogger(__name__)
+
+PACKETS = REGISTRY.counter('hvac_packets_total', "Payloads received", ('device',))
+PARSE_ERRORS = REGISTRY.counter('hvac_parse_errors_total', "Payloads that failed to parse", ('device',))
+READ_ERRORS = REGISTRY.counter('hvac_read_errors_total', "Characteristic reads that failed", ('device',))
+READ_LATENCY = REGISTRY.histogram('hvac_read_latency_seconds', "Duration of one characteristic read", ('device',))
+HANDLE_SECONDS = REGISTRY.histogram(
+    'hvac_packet_handle_seconds', "Time to time, parse and queue one payload, including backpressure", ('device',))
+PACKET_INTERVAL = REGISTRY.histogram('hvac_packet_interval_seconds', "Time between a device's payloads", ('device',))
 
 
 def _parse_sensor_data(data: bytes, temp_correction: float) -> Tuple[float, int]:
@@ -35,19 +52,139 @@ def _parse_sensor_data(data: bytes, temp_correction: float) -> Tuple[float, int]
         raise PacketParsingError(f"Failed to parse sensor data: {e}")
 
 
+# Layout of one LYWSD03MMC payload: signed temperature in hundredths of a
+# degree, humidity percentage, battery millivolts (all little-endian)
+SENSOR_FRAME_SIZE = 5
+
+
+def sensor_frame_dtype(frame_size: int = SENSOR_FRAME_SIZE) -> np.dtype:
+    """Structured dtype for one sensor payload of frame_size bytes."""
+    if frame_size < SENSOR_FRAME_SIZE:
+        raise PacketParsingError(f"Frame size {frame_size} is too short, expected at least {SENSOR_FRAME_SIZE}")
+    return np.dtype({
+        'names': ['temperature', 'humidity', 'battery'],
+        'formats': ['<i2', 'u1', '<u2'],
+        'offsets': [0, 2, 3],
+        'itemsize': frame_size,
+    })
+
+
+def decode_sensor_frames(
+    frames: Union[bytes, bytearray, memoryview, np.ndarray],
+    temp_correction: float,
+    frame_size: int = SENSOR_FRAME_SIZE
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Decode many back-to-back sensor payloads at once.
+    
+    Vectorized counterpart of _parse_sensor_data for replays and backfills.
+    The buffer is viewed in place through a structured dtype, so the only
+    allocation is the corrected temperature array; humidity is returned as
+    a view into the input.
+    
+    Args:
+        frames: Contiguous payloads as bytes, a memoryview or a NumPy array
+            (N x frame_size uint8, flat uint8, or already of sensor_frame_dtype)
+        temp_correction: Temperature correction offset
+        frame_size: Bytes per payload, at least 5
+        
+    Returns:
+        Tuple of (temperature array in Celsius, humidity percentage array)
+        
+    Raises:
+        PacketParsingError: If the buffer is not a whole number of frames
+    """
+    dtype = sensor_frame_dtype(frame_size)
+    if isinstance(frames, np.ndarray):
+        if frames.dtype.names is None:
+            if frames.dtype != np.uint8:
+                raise PacketParsingError(f"Expected uint8 frames, got {frames.dtype}")
+            frames = np.ascontiguousarray(frames).reshape(-1)
+        elif frames.dtype.itemsize != frame_size:
+            raise PacketParsingError(f"Expected {frame_size}-byte frames, got {frames.dtype.itemsize}")
+    
+    nbytes = frames.nbytes if isinstance(frames, (np.ndarray, memoryview)) else len(frames)
+    if nbytes % frame_size:
+        raise PacketParsingError(f"Received {nbytes} bytes, which is not a whole number of {frame_size}-byte frames")
+    
+    records = np.frombuffer(frames, dtype=dtype)
+    temperature = records['temperature'] / 100.0 - temp_correction  # Temperature in Celsius
+    humidity = records['humidity']  # Humidity as percentage
+    return temperature, humidity
+
+
+async def _handle_payload(
+    data: bytes,
+    config: Config,
+    packet_timer: TimerInterface,
+    data_store: Optional[DataStore] = None,
+    persistence: Optional[PersistenceQueue] = None,
+    sensor_id: Optional[str] = None,
+    received_at: Optional[float] = None
+) -> Tuple[float, int]:
+    """Time, parse, persist and record metrics for one raw payload, however it was received.
+    
+    received_at defaults to now; replays pass the originally captured time.
+    Per-packet output is logged at DEBUG level only.
+    """
+    start = time.perf_counter()
+    device = sensor_id or ''
+    PACKETS.labels(device).inc()
+    
+    # Record packet timing
+    interval = packet_timer.record_packet()
+    if interval is not None:
+        PACKET_INTERVAL.labels(device).observe(interval)
+    if received_at is None:
+        received_at = time.time()
+    
+    # Parse the sensor data
+    try:
+        temperature, humidity = _parse_sensor_data(data, config.temp_correction)
+    except PacketParsingError:
+        PARSE_ERRORS.labels(device).inc()
+        raise
+    
+    # Hand off to the writer thread, or save to data store if provided
+    if persistence is not None:
+        await persistence.put(received_at, temperature, humidity, sensor_id)
+    elif data_store is not None:
+        data_store.write_packet(received_at, temperature, humidity, sensor_id)
+    HANDLE_SECONDS.labels(device).observe(time.perf_counter() - start)
+    
+    # Display the results; formatting them is a real cost at high packet rates
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("🌡️  Temperature: %.1f°C (%.1f°F)", temperature, temperature * 9/5 + 32)
+        logger.debug("💧 Humidity: %s%%", humidity)
+        logger.debug("📅 Time: %s", datetime.datetime.now().strftime('%H:%M:%S.%f')[:-3])
+        
+        if interval is not None:
+            logger.debug("⏱️  Interval since last packet: %.3f seconds", interval)
+            logger.debug("📊 Average interval: %.3f seconds", packet_timer.get_average_interval())
+        
+        # Show detailed stats every 10 packets
+        if packet_timer.packet_count % 10 == 0 and packet_timer.packet_count > 0:
+            logger.debug("%s", packet_timer.format_stats())
+    
+    return temperature, humidity
+
+
 async def parse_packet(
     client: BleakClient,
     config: Config,
-    packet_timer: PacketTimer,
-    data_store: Optional[SensorDataStore] = None
+    packet_timer: TimerInterface,
+    data_store: Optional[DataStore] = None,
+    persistence: Optional[PersistenceQueue] = None,
+    sensor_id: Optional[str] = None
 ) -> Optional[Tuple[float, int]]:
     """Read and parse a packet from the HVAC sensor.
     
     Args:
         client: Connected Bluetooth client
         config: Configuration object containing device settings
-        packet_timer: PacketTimer instance for tracking intervals
-        data_store: Optional data store for persisting readings
+        packet_timer: TimerInterface instance for tracking intervals
+        data_store: Optional data store for persisting readings synchronously
+        persistence: Optional queue for persisting readings off the event loop
+        sensor_id: Identifier stored alongside the reading (usually the device address)
         
     Returns:
         Tuple of (temperature, humidity) if successful, None otherwise
@@ -57,37 +194,85 @@ async def parse_packet(
     """
     try:
         # Read from the temperature/humidity characteristic
+        start = time.perf_counter()
         data = await client.read_gatt_char(config.temperature_humidity_uuid)
-        
-        # Record packet timing
-        interval = packet_timer.record_packet()
-
-        
-        
-        # Parse the sensor data
-        temperature, humidity = _parse_sensor_data(data, config.temp_correction)
-        
-        # Save to data store if provided
-        if data_store is not None:
-            data_store.add_reading(temperature, humidity)
-        
-        # Display the results
-        print(f"🌡️  Temperature: {temperature:.1f}°C ({temperature * 9/5 + 32:.1f}°F)")
-        print(f"💧 Humidity: {humidity}%")
-        print(f"📅 Time: {datetime.datetime.now().strftime('%H:%M:%S.%f')[:-3]}")
-        
-        if interval is not None:
-            print(f"⏱️  Interval since last packet: {interval:.3f} seconds")
-            print(f"📊 Average interval: {packet_timer.get_average_interval():.3f} seconds")
-        
-        # Show detailed stats every 10 packets
-        if len(packet_timer.packet_times) % 10 == 0 and len(packet_timer.packet_times) > 0:
-            packet_timer.print_detailed_stats()
-        
-        return temperature, humidity
+        READ_LATENCY.labels(sensor_id or '').observe(time.perf_counter() - start)
+        return await _handle_payload(data, config, packet_timer, data_store, persistence, sensor_id)
         
     except PacketParsingError:
         # Re-raise parsing errors as-is
         raise
     except Exception as e:
-        raise PacketParsingError(f"Error reading temperature/humidity: {e}")
\ No newline at end of file
+        READ_ERRORS.labels(sensor_id or '').inc()
+        raise PacketParsingError(f"Error reading temperature/humidity: {e}")
+
+
+def make_notification_handler(
+    config: Config,
+    packet_timer: TimerInterface,
+    data_store: Optional[DataStore] = None,
+    persistence: Optional[PersistenceQueue] = None,
+    sensor_id: Optional[str] = None
+) -> Callable[[Any, bytearray], Awaitable[None]]:
+    """Build a start_notify callback that parses and enqueues each pushed payload.
+    
+    Parsing errors are reported and counted on the returned handler's
+    ``errors`` attribute rather than raised into bleak's dispatcher.
+    
+    Args:
+        config: Configuration object containing device settings
+        packet_timer: TimerInterface instance for tracking intervals
+        data_store: Optional data store for persisting readings synchronously
+        persistence: Optional queue for persisting readings off the event loop
+        sensor_id: Identifier stored alongside the reading (usually the device address)
+        
+    Returns:
+        Async callback suitable for BleakClient.start_notify
+    """
+    async def handle_notification(sender: Any, data: bytearray) -> None:
+        try:
+            await _handle_payload(data, config, packet_timer, data_store, persistence, sensor_id)
+        except PacketParsingError as e:
+            handle_notification.errors += 1
+            logger.warning("❌ %s: %s", sensor_id or sender, e)
+    
+    handle_notification.errors = 0
+    return handle_notification
+
+
+async def subscribe_packets(
+    client: BleakClient,
+    config: Config,
+    packet_timer: TimerInterface,
+    end_time: datetime.datetime,
+    data_store: Optional[DataStore] = None,
+    persistence: Optional[PersistenceQueue] = None,
+    sensor_id: Optional[str] = None
+) -> int:
+    """Receive pushed packets via GATT notifications until end_time or disconnect.
+    
+    Args:
+        client: Connected Bluetooth client
+        config: Configuration object containing device settings
+        packet_timer: TimerInterface instance for tracking intervals
+        end_time: When to unsubscribe
+        data_store: Optional data store for persisting readings synchronously
+        persistence: Optional queue for persisting readings off the event loop
+        sensor_id: Identifier stored alongside the reading (usually the device address)
+        
+    Returns:
+        Number of payloads that failed to parse
+    """
+    handler = make_notification_handler(config, packet_timer, data_store, persistence, sensor_id)
+    await client.start_notify(config.temperature_humidity_uuid, handler)
+    try:
+        while client.is_connected:
+            remaining = (end_time - datetime.datetime.now()).total_seconds()
+            if remaining <= 0:
+                break
+            # Wake up periodically to notice disconnects
+            await asyncio.sleep(min(remaining, 1.0))
+    finally:
+        if client.is_connected:
+            await client.stop_notify(config.temperature_humidity_uuid)
+    return handler.errors
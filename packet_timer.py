@@ -1,8 +1,79 @@
 import datetime
-from typing import List, Dict, Union
+import math
+from collections import deque
+from typing import Deque, List, Dict, Optional, Union
 
 
-class PacketTimer:
+class _TimerReport:
+    """
+    Rates and the formatted report shared by the packet timers.
+    
+    Subclasses provide get_average_interval and get_stats; the std and
+    percentile lines are included when get_stats reports them.
+    """
+    
+    def get_average_interval(self) -> float:
+        raise NotImplementedError
+    
+    def get_stats(self) -> Dict[str, float]:
+        raise NotImplementedError
+    
+    def get_packets_per_minute(self) -> float:
+        """
+        Calculate estimated packets per minute based on average interval.
+        
+        Returns:
+            float: Estimated packets per minute, or 0.0 if no data
+        """
+        avg_interval = self.get_average_interval()
+        if avg_interval > 0:
+            return 60.0 / avg_interval
+        return 0.0
+    
+    def get_packets_per_hour(self) -> float:
+        """
+        Calculate estimated packets per hour based on average interval.
+        
+        Returns:
+            float: Estimated packets per hour, or 0.0 if no data
+        """
+        avg_interval = self.get_average_interval()
+        if avg_interval > 0:
+            return 3600.0 / avg_interval
+        return 0.0
+    
+    def format_stats(self) -> str:
+        """Detailed statistics as a formatted multi-line string."""
+        stats = self.get_stats()
+        
+        average = f"⏱️  Average interval: {stats['average_interval']:.3f} seconds"
+        if 'std_interval' in stats:
+            average += f" (σ {stats['std_interval']:.3f})"
+        lines = [
+            "📊 PACKET TIMING STATISTICS ".center(60, "="),
+            f"📦 Total packets received: {stats['total_packets']}",
+            average,
+            f"⚡ Minimum interval: {stats['min_interval']:.3f} seconds",
+            f"🐌 Maximum interval: {stats['max_interval']:.3f} seconds",
+        ]
+        if 'p50_interval' in stats:
+            lines.append(f"📐 p50 / p95 / p99: {stats['p50_interval']:.3f} / {stats['p95_interval']:.3f} / "
+                         f"{stats['p99_interval']:.3f} seconds")
+        lines.append(f"🕐 Total monitoring time: {stats['total_runtime']:.1f} seconds")
+        
+        if stats['average_interval'] > 0:
+            lines.append(f"📊 Packets per minute: {self.get_packets_per_minute():.1f}")
+            lines.append(f"📊 Packets per hour: {self.get_packets_per_hour():.1f}")
+        
+        lines.append("="*60)
+        return "\n".join(lines)
+    
+    def print_detailed_stats(self) -> None:
+        """Print detailed statistics in a formatted way."""
+        print("\n" + self.format_stats())
+
+
+class PacketTimer(_TimerReport):
     """
     A class to track and analyze packet timing intervals for Bluetooth devices.
     
@@ -15,6 +86,11 @@ class PacketTimer:
         self.packet_times: List[datetime.datetime] = []
         self.intervals: List[float] = []
     
+    @property
+    def packet_count(self) -> int:
+        """Number of packets recorded so far."""
+        return len(self.packet_times)
+    
     def record_packet(self) -> Union[float, None]:
         """
         Record the time a packet was received and calculate interval from previous packet.
@@ -78,44 +154,197 @@ class PacketTimer:
         """Reset all recorded data to start fresh."""
         self.packet_times.clear()
         self.intervals.clear()
+
+
+class P2Quantile:
+    """
+    Streaming quantile estimate using the P² algorithm (Jain & Chlamtac, 1985).
     
-    def get_packets_per_minute(self) -> float:
+    Keeps five markers instead of the observations themselves, so both memory
+    and the cost of each update are constant regardless of how many values
+    have been seen.
+    """
+    
+    def __init__(self, quantile: float):
+        if not 0.0 < quantile < 1.0:
+            raise ValueError(f"quantile must be between 0 and 1, got {quantile}")
+        self.quantile = quantile
+        self.reset()
+    
+    def reset(self) -> None:
+        """Forget all observations."""
+        q = self.quantile
+        self._heights: List[float] = []
+        self._positions = [1, 2, 3, 4, 5]
+        self._desired = [1.0, 1.0 + 2 * q, 1.0 + 4 * q, 3.0 + 2 * q, 5.0]
+        self._increments = [0.0, q / 2, q, (1.0 + q) / 2, 1.0]
+    
+    def add(self, value: float) -> None:
+        """Add an observation."""
+        heights = self._heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+        
+        # Find the cell the value falls in, stretching the extremes if needed
+        if value < heights[0]:
+            heights[0] = value
+            k = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            k = 3
+        else:
+            k = 0
+            while value >= heights[k + 1]:
+                k += 1
+        
+        positions = self._positions
+        for i in range(k + 1, 5):
+            positions[i] += 1
+        for i in range(5):
+            self._desired[i] += self._increments[i]
+        
+        # Nudge the three middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self._desired[i] - positions[i]
+            if (d >= 1 and positions[i + 1] - positions[i] > 1) or (d <= -1 and positions[i - 1] - positions[i] < -1):
+                step = 1 if d > 0 else -1
+                candidate = self._parabolic(i, step)
+                if not heights[i - 1] < candidate < heights[i + 1]:
+                    candidate = heights[i] + step * (heights[i + step] - heights[i]) / (positions[i + step] - positions[i])
+                heights[i] = candidate
+                positions[i] += step
+    
+    def _parabolic(self, i: int, step: int) -> float:
+        h, n = self._heights, self._positions
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+    
+    def value(self) -> float:
+        """Current estimate, exact while fewer than five values have been seen."""
+        heights = self._heights
+        if not heights:
+            return 0.0
+        if len(heights) < 5:
+            index = min(len(heights) - 1, int(round(self.quantile * (len(heights) - 1))))
+            return heights[index]
+        return heights[2]
+
+
+class StreamingPacketTimer(_TimerReport):
+    """
+    Constant-memory alternative to PacketTimer for long-running collectors.
+    
+    Instead of keeping every timestamp and interval, it maintains a running
+    count, Welford mean/variance, min/max, the first and last packet times,
+    P² estimates of the p50/p95/p99 interval and, optionally, a fixed-size
+    window of the most recent intervals. Every record_packet is O(1).
+    """
+    
+    PERCENTILES = (0.50, 0.95, 0.99)
+    
+    def __init__(self, window_size: int = 0):
         """
-        Calculate estimated packets per minute based on average interval.
+        Args:
+            window_size: How many recent intervals to keep, 0 to keep none
+        """
+        self.window_size = window_size
+        self.reset()
+    
+    def reset(self) -> None:
+        """Reset all recorded data to start fresh."""
+        self.packet_count = 0
+        self.first_packet_time: Optional[datetime.datetime] = None
+        self.last_packet_time: Optional[datetime.datetime] = None
+        self._interval_count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._min = 0.0
+        self._max = 0.0
+        self._quantiles = [P2Quantile(q) for q in self.PERCENTILES]
+        self.recent_intervals: Deque[float] = deque(maxlen=self.window_size)
+    
+    def record_packet(self) -> Union[float, None]:
+        """
+        Record the time a packet was received and calculate interval from previous packet.
         
         Returns:
-            float: Estimated packets per minute, or 0.0 if no data
+            Union[float, None]: The interval in seconds since the last packet, or None if this is the first packet
         """
-        avg_interval = self.get_average_interval()
-        if avg_interval > 0:
-            return 60.0 / avg_interval
-        return 0.0
+        current_time = datetime.datetime.now()
+        previous_time = self.last_packet_time
+        self.last_packet_time = current_time
+        self.packet_count += 1
+        
+        if previous_time is None:
+            self.first_packet_time = current_time
+            return None
+        
+        interval = (current_time - previous_time).total_seconds()
+        self._add_interval(interval)
+        return interval
     
-    def get_packets_per_hour(self) -> float:
+    def _add_interval(self, interval: float) -> None:
+        self._interval_count += 1
+        if self._interval_count == 1:
+            self._min = self._max = interval
+        else:
+            self._min = min(self._min, interval)
+            self._max = max(self._max, interval)
+        
+        # Welford's online mean and variance
+        delta = interval - self._mean
+        self._mean += delta / self._interval_count
+        self._m2 += delta * (interval - self._mean)
+        
+        for estimator in self._quantiles:
+            estimator.add(interval)
+        self.recent_intervals.append(interval)
+    
+    def get_average_interval(self) -> float:
         """
-        Calculate estimated packets per hour based on average interval.
+        Get the average time between packets in seconds.
         
         Returns:
-            float: Estimated packets per hour, or 0.0 if no data
+            float: Average interval in seconds, or 0.0 if no intervals recorded
         """
-        avg_interval = self.get_average_interval()
-        if avg_interval > 0:
-            return 3600.0 / avg_interval
-        return 0.0
+        return self._mean if self._interval_count else 0.0
     
-    def print_detailed_stats(self) -> None:
-        """Print detailed statistics in a formatted way."""
-        stats = self.get_stats()
+    def get_interval_std(self) -> float:
+        """
+        Get the sample standard deviation of the intervals in seconds.
         
-        print("\n" + "📊 PACKET TIMING STATISTICS ".center(60, "="))
-        print(f"📦 Total packets received: {stats['total_packets']}")
-        print(f"⏱️  Average interval: {stats['average_interval']:.3f} seconds")
-        print(f"⚡ Minimum interval: {stats['min_interval']:.3f} seconds")
-        print(f"🐌 Maximum interval: {stats['max_interval']:.3f} seconds")
-        print(f"🕐 Total monitoring time: {stats['total_runtime']:.1f} seconds")
+        Returns:
+            float: Standard deviation, or 0.0 with fewer than two intervals
+        """
+        if self._interval_count < 2:
+            return 0.0
+        return math.sqrt(self._m2 / (self._interval_count - 1))
+    
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get comprehensive timing statistics.
         
-        if stats['average_interval'] > 0:
-            print(f"📊 Packets per minute: {self.get_packets_per_minute():.1f}")
-            print(f"📊 Packets per hour: {self.get_packets_per_hour():.1f}")
+        Returns:
+            Dict[str, float]: The PacketTimer statistics plus:
+                - std_interval: Sample standard deviation of intervals (seconds)
+                - p50_interval, p95_interval, p99_interval: Estimated interval percentiles (seconds)
+        """
+        total_runtime = 0.0
+        if self.first_packet_time is not None and self._interval_count:
+            total_runtime = (self.last_packet_time - self.first_packet_time).total_seconds()
         
-        print("="*60)
\ No newline at end of file
+        stats = {
+            "total_packets": self.packet_count,
+            "average_interval": self.get_average_interval(),
+            "min_interval": self._min,
+            "max_interval": self._max,
+            "total_runtime": total_runtime,
+            "std_interval": self.get_interval_std(),
+        }
+        for estimator in self._quantiles:
+            stats[f"p{int(estimator.quantile * 100)}_interval"] = estimator.value()
+        return stats
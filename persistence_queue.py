@@ -0,0 +1,345 @@
+"""
+Non-blocking persistence between the BLE read loop and DuckDB.
+
+The read loop puts readings on a bounded asyncio.Queue and returns
+immediately. A drain task collects whatever is queued into batches and
+hands them to a single writer thread, which owns the DataStore (and so the
+DuckDB connection) for its whole lifetime.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, TypeVar
+
+from contants import ConfigurationError
+from data_store import DataStore
+from metrics import REGISTRY, SIZE_BUCKETS
+
+Reading = Tuple[float, float, int, Optional[str]]
+ReadingListener = Callable[[float, float, int, Optional[str]], None]
+T = TypeVar("T")
+
+BACKPRESSURE_POLICIES = ("block", "drop-oldest", "spill")
+
+QUEUE_DEPTH = REGISTRY.gauge("hvac_queue_depth", "Readings waiting for the DuckDB writer")
+WRITE_BATCH_SIZE = REGISTRY.histogram("hvac_write_batch_size", "Readings per bulk write", buckets=SIZE_BUCKETS)
+WRITE_SECONDS = REGISTRY.histogram("hvac_write_seconds", "Duration of one bulk write")
+WRITTEN = REGISTRY.counter("hvac_readings_written_total", "Readings written to DuckDB")
+DROPPED = REGISTRY.counter("hvac_readings_dropped_total", "Readings discarded by the drop-oldest policy")
+SPILLED = REGISTRY.counter("hvac_readings_spilled_total", "Readings diverted to the spill file")
+WRITE_ERRORS = REGISTRY.counter("hvac_write_errors_total", "Failed bulk write attempts")
+LOST = REGISTRY.counter("hvac_readings_lost_total", "Readings discarded after every write attempt failed")
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceQueue:
+    """
+    Bounded queue of sensor readings drained into DuckDB by a writer thread.
+
+    When the queue is full the backpressure policy decides what happens:
+        - block: the producer waits until the writer frees a slot
+        - drop-oldest: the oldest queued reading is discarded
+        - spill: the reading is appended to a CSV spill file which the
+          writer loads in bulk once it has caught up
+
+    A failed bulk write is retried write_attempts times; if it still fails
+    the batch goes to the spill file (when there is one) or is discarded
+    and counted as lost, and draining carries on with the next batch.
+    """
+
+    def __init__(
+        self,
+        store_factory: Callable[[], DataStore] = DataStore,
+        capacity: int = 10000,
+        policy: str = "block",
+        max_batch: int = 1000,
+        spill_path: Optional[str] = None,
+        write_attempts: int = 3,
+        retry_delay: float = 0.5
+    ):
+        if policy not in BACKPRESSURE_POLICIES:
+            raise ConfigurationError(
+                f"Unknown backpressure policy '{policy}', expected one of {BACKPRESSURE_POLICIES}"
+            )
+        if policy == "spill" and spill_path is None:
+            raise ConfigurationError("The 'spill' backpressure policy requires a spill_path")
+
+        self.capacity = capacity
+        self.policy = policy
+        self.max_batch = max_batch
+        self.spill_path = spill_path
+        self.write_attempts = max(1, write_attempts)
+        self.retry_delay = retry_delay
+
+        self._store_factory = store_factory
+        self._store: Optional[DataStore] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._drain_task: Optional[asyncio.Task] = None
+        self._spill_lock = threading.Lock()
+        self._listeners: List[ReadingListener] = []
+
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.spilled = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.lost = 0
+        self.max_depth = 0
+        self.last_write_seconds = 0.0
+
+    async def start(self) -> None:
+        """Open the DataStore on the writer thread and start draining."""
+        loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue(maxsize=self.capacity)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="duckdb-writer")
+        self._store = await loop.run_in_executor(self._executor, self._store_factory)
+        self._drain_task = asyncio.create_task(self._drain())
+        # read when metrics are rendered, so the hot path pays nothing for it
+        QUEUE_DEPTH.set_function(lambda: self.depth)
+
+    async def put(
+        self,
+        timestamp: float,
+        temperature: float,
+        humidity: int,
+        sensor_id: Optional[str] = None
+    ) -> None:
+        """Queue a reading for persistence, applying the backpressure policy if full."""
+        if self._queue is None:
+            raise RuntimeError("PersistenceQueue.start() must be awaited before put()")
+
+        for listener in self._listeners:
+            listener(timestamp, temperature, humidity, sensor_id)
+
+        reading = (timestamp, temperature, humidity, sensor_id)
+        if self._queue.full():
+            if self._drain_task.done():
+                # nothing will ever free a slot; fail loudly rather than block forever
+                raise RuntimeError("The persistence writer has stopped") from self._drain_exception()
+            if self.policy == "drop-oldest":
+                self._queue.get_nowait()
+                self._queue.task_done()
+                self.dropped += 1
+                DROPPED.inc()
+            elif self.policy == "spill":
+                self._spill([reading])
+                return
+
+        await self._queue.put(reading)
+        self.enqueued += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+
+    def add_listener(self, listener: ReadingListener) -> None:
+        """Call listener(timestamp, temperature, humidity, sensor_id) on the event loop for every reading put.
+
+        Listeners see readings before backpressure is applied and must not block.
+        """
+        self._listeners.append(listener)
+
+    async def run_with_store(self, fn: Callable[[DataStore], T]) -> T:
+        """Run fn(store) on the writer thread, between bulk writes, and return its result.
+
+        This is how other components of the collector use the database without
+        opening a second connection.
+        """
+        return await asyncio.wrap_future(self.submit_with_store(fn))
+
+    def submit_with_store(self, fn: Callable[[DataStore], T]) -> Future[T]:
+        """Schedule fn(store) on the writer thread from any thread and return its Future.
+
+        For callers outside the event loop, such as the StoreServer's
+        request threads.
+        """
+        if self._executor is None:
+            raise RuntimeError("PersistenceQueue.start() must be awaited before submit_with_store()")
+        return self._executor.submit(fn, self._store)
+
+    @property
+    def depth(self) -> int:
+        """Number of readings currently waiting in the queue."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def get_stats(self) -> Dict[str, float]:
+        """
+        Get queue and writer statistics.
+
+        Returns:
+            Dict[str, float]: Dictionary containing:
+                - depth: Readings currently queued
+                - max_depth: Highest queue depth observed
+                - capacity: Queue capacity
+                - enqueued: Readings accepted onto the queue
+                - written: Readings written to DuckDB
+                - dropped: Readings discarded by the drop-oldest policy
+                - spilled: Readings diverted to the spill file
+                - batches: Bulk writes performed
+                - write_errors: Failed bulk write attempts
+                - lost: Readings discarded after every write attempt failed
+                - last_write_seconds: Duration of the most recent bulk write
+        """
+        return {
+            "depth": self.depth,
+            "max_depth": self.max_depth,
+            "capacity": self.capacity,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "dropped": self.dropped,
+            "spilled": self.spilled,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "lost": self.lost,
+            "last_write_seconds": self.last_write_seconds,
+        }
+
+    async def join(self) -> None:
+        """Wait until every queued reading has been written."""
+        if self._queue is not None:
+            await self._queue.join()
+
+    async def close(self) -> None:
+        """Write everything still queued or spilled, then close the DataStore."""
+        if self._queue is None:
+            return
+        if self._drain_task.done():
+            # the drain task died, so join() would never return: write the rest here
+            logger.error("Persistence writer stopped unexpectedly", exc_info=self._drain_exception())
+            batch = []
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                self._queue.task_done()
+            if batch:
+                await self._write_or_spill(batch)
+        else:
+            await self._queue.join()
+            self._drain_task.cancel()
+            try:
+                await self._drain_task
+            except asyncio.CancelledError:
+                pass
+
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(self._executor, self._close_store)
+        finally:
+            self._executor.shutdown(wait=True)
+            self._queue = None
+
+    def _drain_exception(self) -> Optional[BaseException]:
+        if self._drain_task.cancelled():
+            return None
+        return self._drain_task.exception()
+
+    async def _drain(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch: List[Reading] = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            try:
+                written = await self._write_or_spill(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+            if written and self.spill_path is not None and self._queue.empty():
+                try:
+                    await loop.run_in_executor(self._executor, self._load_spill)
+                except Exception:
+                    # the file stays in place and is retried after the next write
+                    self.write_errors += 1
+                    WRITE_ERRORS.inc()
+                    logger.exception("Failed to load the spill file %s", self.spill_path)
+
+    async def _write_or_spill(self, batch: List[Reading]) -> bool:
+        """Write batch, retrying on failure; spill or discard it if every attempt fails."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(1, self.write_attempts + 1):
+            try:
+                await loop.run_in_executor(self._executor, self._write_batch, batch)
+                return True
+            except Exception:
+                self.write_errors += 1
+                WRITE_ERRORS.inc()
+                logger.warning("Bulk write of %d readings failed (attempt %d of %d)",
+                               len(batch), attempt, self.write_attempts, exc_info=True)
+            if attempt < self.write_attempts:
+                await asyncio.sleep(self.retry_delay * attempt)
+
+        if self.spill_path is not None:
+            try:
+                self._spill(batch)
+                logger.error("Spilled %d readings to %s after repeated write failures", len(batch), self.spill_path)
+                return False
+            except OSError:
+                logger.exception("Failed to spill %d readings to %s", len(batch), self.spill_path)
+        self.lost += len(batch)
+        LOST.inc(len(batch))
+        logger.error("Discarded %d readings after repeated write failures", len(batch))
+        return False
+
+    def _write_batch(self, batch: List[Reading]) -> None:
+        # Runs on the writer thread
+        start = time.perf_counter()
+        timestamps, temperatures, humidities, sensor_ids = zip(*batch)
+        written = self._store.write_packets(timestamps, temperatures, humidities, sensor_ids)
+        self.written += written
+        self.batches += 1
+        self.last_write_seconds = time.perf_counter() - start
+        WRITTEN.inc(written)
+        WRITE_BATCH_SIZE.observe(len(batch))
+        WRITE_SECONDS.observe(self.last_write_seconds)
+
+    def _spill(self, readings: List[Reading]) -> None:
+        with self._spill_lock:
+            with open(self.spill_path, "a") as f:
+                f.writelines(
+                    f"{reading[0]!r},{reading[1]!r},{reading[2]},{reading[3] or ''}\n" for reading in readings
+                )
+        self.spilled += len(readings)
+        SPILLED.inc(len(readings))
+
+    def _load_spill(self) -> None:
+        # Runs on the writer thread. The spill file is renamed under the lock so
+        # the read loop can keep spilling while the old file is loaded.
+        loading_path = self.spill_path + ".loading"
+        with self._spill_lock:
+            if os.path.exists(self.spill_path):
+                if os.path.exists(loading_path):
+                    # left over from a load that failed: append rather than overwrite it
+                    with open(self.spill_path) as src, open(loading_path, "a") as dst:
+                        dst.write(src.read())
+                    os.remove(self.spill_path)
+                else:
+                    os.replace(self.spill_path, loading_path)
+            elif not os.path.exists(loading_path):
+                return
+
+        # Loaded through write_packets so the rollup tables stay in step
+        columns = self._store.conn.execute(
+            "SELECT * FROM read_csv(?, header = false, "
+            "columns = {'timestamp': 'DOUBLE', 'temperature': 'DOUBLE', 'humidity': 'INTEGER', 'sensor_id': 'VARCHAR'});",
+            [loading_path]
+        ).fetchnumpy()
+        written = self._store.write_packets(
+            columns['timestamp'], columns['temperature'], columns['humidity'],
+            [None if sensor_id is None else str(sensor_id) for sensor_id in columns['sensor_id']]
+        )
+        self.written += written
+        WRITTEN.inc(written)
+        os.remove(loading_path)
+
+    def _close_store(self) -> None:
+        # Runs on the writer thread
+        try:
+            if self.spill_path is not None:
+                self._load_spill()
+        finally:
+            self._store.close()
@@ -5,10 +5,12 @@ This module defines the contracts that different components should follow,
 improving testability and maintainability through clear interface definitions.
 """
 
-from typing import Protocol, Optional, Tuple, Dict
+from typing import Protocol, Optional, Tuple, Dict, List
+import numpy as np
 from bleak import BleakClient
 from packet_timer import PacketTimer
 from contants import Config
+from features import FeaturePipeline
 
 
 class PacketParser(Protocol):
@@ -40,14 +42,52 @@ class ConnectionHandler(Protocol):
 class TimerInterface(Protocol):
     """Protocol for packet timing functionality."""
     
+    @property
+    def packet_count(self) -> int:
+        """Number of packets recorded so far."""
+        ...
+    
     def record_packet(self) -> Optional[float]:
         """Record packet timestamp and return interval since last packet."""
         ...
     
+    def get_average_interval(self) -> float:
+        """Get the average time between packets in seconds."""
+        ...
+    
     def get_stats(self) -> Dict[str, float]:
         """Get comprehensive timing statistics."""
         ...
     
+    def format_stats(self) -> str:
+        """Detailed statistics as a formatted multi-line string."""
+        ...
+    
+    def print_detailed_stats(self) -> None:
+        """Print detailed statistics in a formatted way."""
+        ...
+    
     def reset(self) -> None:
         """Reset all recorded data."""
-        ...
\ No newline at end of file
+        ...
+
+
+class ControlPolicy(Protocol):
+    """Protocol for HVAC control policies (see controller.HvacController)."""
+    
+    def step(self, timestamp: float, temps: np.ndarray, setpoints) -> np.ndarray:
+        """Decide the Mode code for every lane (zone or configuration) at timestamp."""
+        ...
+
+
+class Predictor(Protocol):
+    """Protocol for temperature predictors (see inference.NumpyPredictor and inference.TorchPredictor)."""
+    
+    history: int
+    columns: List[str]
+    resolution: float
+    pipeline: FeaturePipeline
+    
+    def predict(self, windows: np.ndarray) -> np.ndarray:
+        """Predict the target for a (batch, history, features) array of windows."""
+        ...
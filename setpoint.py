@@ -0,0 +1,114 @@
+"""
+Target temperature shared between the dashboard and the controller.
+
+The actions table is the source of truth: the current setpoint is the
+target_temp of the newest SETPOINT_ACTION row. Other actions, such as the
+controller's heating/cooling transitions, record the target they were
+decided under but never change it. SetpointService caches the setpoint in
+memory and uses the newest setpoint row's timestamp as a version number.
+Timestamps are forced to increase strictly, so "anything newer than
+version X" is a cheap indexed-by-zonemap range query rather than a
+re-read of the whole table.
+"""
+
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from data_store import DataStore
+
+DEFAULT_SETPOINT = 22.0
+SETPOINT_ACTION = "SET_TARGET"
+
+# Smallest step between consecutive action timestamps (keeps versions unique)
+_VERSION_STEP = 1e-6
+
+
+class SetpointService:
+    """
+    Cached current setpoint with atomic updates, backed by the actions table.
+
+    A single instance is meant to be shared by everything in a process that
+    uses the same DataStore connection (dashboard sessions, the controller
+    loop). Pass the lock that already guards the connection, if there is one.
+    """
+
+    def __init__(self, store: DataStore, default: float = DEFAULT_SETPOINT,
+                 min_temp: float = 10.0, max_temp: float = 32.0,
+                 lock: Optional[threading.Lock] = None):
+        self.store = store
+        self.default = default
+        self.min_temp = min_temp
+        self.max_temp = max_temp
+        self._lock = lock or threading.Lock()
+
+        with self._lock:
+            latest = self.store.read_actions(limit=1, action_name=SETPOINT_ACTION)
+        if latest:
+            self._version, self._setpoint = latest[0][0], latest[0][2]
+        else:
+            self._version, self._setpoint = 0.0, default
+
+    @property
+    def setpoint(self) -> float:
+        """The cached current target temperature."""
+        return self._setpoint
+
+    @property
+    def version(self) -> float:
+        """Timestamp of the newest setpoint change seen, 0.0 if there are none."""
+        return self._version
+
+    def get(self) -> Tuple[float, float]:
+        """Return (setpoint, version) as one consistent pair."""
+        with self._lock:
+            return self._setpoint, self._version
+
+    def set(self, target_temp: float) -> float:
+        """Persist a new absolute setpoint and return its version."""
+        return self._write(SETPOINT_ACTION, target=target_temp)
+
+    def adjust(self, delta: float) -> float:
+        """Move the setpoint by delta relative to the newest stored one, return the new version.
+
+        The read-modify-write happens in a single INSERT ... SELECT, so two
+        dashboards pressing "+" at the same time end up 2 steps higher, not 1.
+        """
+        return self._write(SETPOINT_ACTION, delta=delta)
+
+    def record(self, action_name: str) -> float:
+        """Log another kind of action (e.g. a controller transition) under the current setpoint."""
+        return self._write(action_name, delta=0.0)
+
+    def _write(self, action_name: str, target: Optional[float] = None, delta: float = 0.0) -> float:
+        if self.store.read_only:
+            raise PermissionError("Cannot change the setpoint through a read-only DataStore")
+        with self._lock:
+            version, setpoint = self.store.conn.execute('''
+                INSERT INTO actions (timestamp, action_name, target_temp)
+                SELECT greatest(?, coalesce(max(timestamp) + ?, 0)), ?,
+                       least(greatest(coalesce(?, arg_max(target_temp, timestamp) FILTER (WHERE action_name = ?), ?)
+                                      + ?, ?), ?)
+                FROM actions
+                RETURNING timestamp, target_temp;''',
+                [time.time(), _VERSION_STEP, action_name, target, SETPOINT_ACTION, self.default, delta,
+                 self.min_temp, self.max_temp]).fetchone()
+            if action_name == SETPOINT_ACTION:
+                self._version, self._setpoint = version, setpoint
+            return version
+
+    def changes_since(self, version: float) -> List[tuple]:
+        """Setpoint changes (timestamp, action_name, target_temp, zone) written after version, oldest first."""
+        with self._lock:
+            return self.store.read_actions(after=version, action_name=SETPOINT_ACTION)
+
+    def refresh(self) -> bool:
+        """Pick up setpoint changes written through other connections; True if the setpoint changed."""
+        changes = self.changes_since(self._version)
+        if not changes:
+            return False
+        with self._lock:
+            previous = self._setpoint
+            if changes[-1][0] > self._version:
+                self._version, self._setpoint = changes[-1][0], changes[-1][2]
+            return self._setpoint != previous
@@ -0,0 +1,265 @@
+"""
+Database access for other processes, served by the collector.
+
+DuckDB lets only one process at a time open a database file, even
+read-only while another process writes to it, so the dashboard cannot
+read HVAC_Data.duckdb while the collector runs. Instead the collector
+answers its queries: StoreServer listens on a local HTTP port and runs
+each request on the PersistenceQueue's writer thread, between bulk
+writes, against the connection that thread already owns. call_store() is
+the client side.
+
+A request is a POST to /call with the JSON body
+{"method": name, "kwargs": {...}, "db_path": path}. Only the methods in
+STORE_METHODS and SETPOINT_METHODS are served, with the keyword arguments
+in METHOD_KWARGS, and only for the database file the collector has open.
+The body must be sent as application/json and the Host header must name
+the address the server listens on: a web page cannot send either, so a
+browser on this machine cannot be made to change the setpoint. Column results travel as lists and are
+turned back into NumPy arrays by call_store, so callers see the same
+shapes as from run_method against a local DataStore.
+"""
+
+import inspect
+import json
+import os
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, FrozenSet, Optional, Tuple
+
+import numpy as np
+
+from data_store import DataStore
+from persistence_queue import PersistenceQueue
+from setpoint import SetpointService
+
+DEFAULT_STORE_PORT = 8766
+
+
+def _read_range(store: DataStore, **kwargs) -> dict:
+    return store.read_range(format='numpy', **kwargs)
+
+
+def _query_rollup(store: DataStore, **kwargs) -> dict:
+    return store.query_rollup(format='numpy', **kwargs)
+
+
+def _query_stats(store: DataStore, **kwargs) -> dict:
+    return store.query_stats(format='numpy', **kwargs)
+
+
+def _get_setpoint(setpoints: SetpointService) -> Tuple[float, float]:
+    setpoints.refresh()
+    return setpoints.get()
+
+
+def _adjust_setpoint(setpoints: SetpointService, delta: float) -> Tuple[float, float]:
+    setpoints.adjust(delta)
+    return setpoints.get()
+
+
+# method name -> fn(store, **kwargs)
+STORE_METHODS = {
+    'read_range': _read_range,
+    'query_rollup': _query_rollup,
+    'query_stats': _query_stats,
+    'list_sensors': DataStore.list_sensors,
+}
+# method name -> fn(setpoints, **kwargs); returns (setpoint, version)
+SETPOINT_METHODS = {
+    'get_setpoint': _get_setpoint,
+    'adjust_setpoint': _adjust_setpoint,
+}
+# methods that need the database open for writing
+WRITE_METHODS = frozenset({'adjust_setpoint'})
+
+
+def _keywords(fn: Callable) -> FrozenSet[str]:
+    # fn's parameters after the store (or setpoints); format is always set by the server
+    return frozenset(list(inspect.signature(fn).parameters)[1:]) - {'format'}
+
+
+# method name -> the keyword arguments a request may pass
+METHOD_KWARGS = {
+    'read_range': _keywords(DataStore.read_range),
+    'query_rollup': _keywords(DataStore.query_rollup),
+    'query_stats': _keywords(DataStore.query_stats),
+    'list_sensors': _keywords(DataStore.list_sensors),
+    'get_setpoint': _keywords(_get_setpoint),
+    'adjust_setpoint': _keywords(_adjust_setpoint),
+}
+# Host header names accepted besides the address the server is bound to
+LOCAL_HOSTS = frozenset({'127.0.0.1', 'localhost', '::1'})
+
+
+class StoreRequestError(Exception):
+    """Raised by call_store when the collector could not answer a request."""
+    pass
+
+
+class StoreNotServed(StoreRequestError):
+    """Raised by call_store when the endpoint does not serve the requested database file."""
+    pass
+
+
+def run_method(store: DataStore, method: str, kwargs: Dict[str, Any],
+               setpoints: Optional[SetpointService] = None) -> Any:
+    """Run a served method against store; setpoint methods use setpoints, or a new SetpointService."""
+    if method in STORE_METHODS:
+        return STORE_METHODS[method](store, **kwargs)
+    if method in SETPOINT_METHODS:
+        return SETPOINT_METHODS[method](setpoints or SetpointService(store), **kwargs)
+    raise ValueError(f"Unknown store method '{method}'")
+
+
+def _encode(result: Any) -> dict:
+    if isinstance(result, dict):
+        # masked (NULL) entries become None
+        return {'columns': {name: {'dtype': str(values.dtype), 'values': values.tolist()}
+                            for name, values in result.items()}}
+    if isinstance(result, tuple):
+        return {'tuple': list(result)}
+    return {'value': result}
+
+
+def _decode_column(column: dict) -> np.ndarray:
+    values = column['values']
+    if column['dtype'] != 'object' and any(value is None for value in values):
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return np.array(values, dtype=column['dtype'])
+
+
+def _decode(body: dict) -> Any:
+    if 'columns' in body:
+        return {name: _decode_column(column) for name, column in body['columns'].items()}
+    if 'tuple' in body:
+        return tuple(body['tuple'])
+    return body['value']
+
+
+def call_store(url: str, method: str, kwargs: Dict[str, Any], db_path: str, timeout: float = 30.0) -> Any:
+    """Run method on the collector at url and return its result.
+
+    Raises:
+        OSError: If nothing is listening at url (no collector running)
+        StoreNotServed: If the endpoint is not a collector serving db_path
+        StoreRequestError: If the collector failed the request
+    """
+    request = urllib.request.Request(
+        f"{url.rstrip('/')}/call",
+        data=json.dumps({'method': method, 'kwargs': kwargs, 'db_path': os.path.realpath(db_path)}).encode(),
+        headers={'Content-Type': 'application/json'},
+        method='POST'
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return _decode(json.load(response))
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.load(e).get('error', e.reason)
+        except ValueError:
+            message = e.reason
+        if e.code in (404, 409):
+            raise StoreNotServed(message)
+        raise StoreRequestError(f"{method} failed in the collector: {message}")
+
+
+class StoreServer:
+    """
+    Serves STORE_METHODS and SETPOINT_METHODS for the collector's database at http://host:port/call.
+
+    Requests are handled on daemon threads and run on the persistence
+    queue's writer thread, so they wait for at most one bulk write and
+    never need a second connection. Binds to localhost by default: the
+    endpoint can change the setpoint and has no authentication.
+    """
+
+    def __init__(self, persistence: PersistenceQueue, db_path: str, port: int = DEFAULT_STORE_PORT,
+                 host: str = '127.0.0.1', timeout: float = 30.0):
+        self.persistence = persistence
+        self.db_path = os.path.realpath(db_path)
+        self.timeout = timeout
+        self.hosts = LOCAL_HOSTS | {host}
+        # created on the writer thread by the first setpoint request
+        self._setpoints: Optional[SetpointService] = None
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.path.split('?', 1)[0] != '/call':
+                    self._reply(404, {'error': f'No such endpoint {self.path}'})
+                    return
+                # a page in a browser can neither send a JSON body without a CORS preflight
+                # (which is never answered) nor, after DNS rebinding, our Host name
+                if urllib.parse.urlsplit(f"//{self.headers.get('Host', '')}").hostname not in server.hosts:
+                    self._reply(403, {'error': 'Unexpected Host header'})
+                    return
+                if self.headers.get_content_type() != 'application/json':
+                    self._reply(415, {'error': 'Requests must be sent as application/json'})
+                    return
+                try:
+                    request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                    method, kwargs = request['method'], request.get('kwargs') or {}
+                except (ValueError, KeyError, TypeError) as e:
+                    self._reply(400, {'error': f'Malformed request: {e}'})
+                    return
+                if method not in METHOD_KWARGS:
+                    self._reply(400, {'error': f"Unknown store method '{method}'"})
+                    return
+                if not isinstance(kwargs, dict) or not kwargs.keys() <= METHOD_KWARGS[method]:
+                    self._reply(400, {'error': f"{method} takes the keyword arguments "
+                                               f"{sorted(METHOD_KWARGS[method])}"})
+                    return
+                if request.get('db_path') != server.db_path:
+                    self._reply(409, {'error': f'The collector serves {server.db_path}'})
+                    return
+                try:
+                    result = server.persistence.submit_with_store(
+                        lambda store: run_method(store, method, kwargs, server._get_setpoints(store))
+                    ).result(server.timeout)
+                except Exception as e:
+                    self._reply(500, {'error': str(e) or type(e).__name__})
+                    return
+                self._reply(200, _encode(result))
+
+            def _reply(self, status: int, body: dict) -> None:
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                # every dashboard refresh is a request; don't log each one
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    def _get_setpoints(self, store: DataStore) -> SetpointService:
+        # Runs on the writer thread
+        if self._setpoints is None:
+            self._setpoints = SetpointService(store)
+        return self._setpoints
+
+    @property
+    def port(self) -> int:
+        """The bound port (useful with port 0)."""
+        return self._server.server_address[1]
+
+    def start(self) -> 'StoreServer':
+        self._thread = threading.Thread(target=self._server.serve_forever, name='store-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        if self._thread is not None:
+            self._server.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._server.server_close()
@@ -4,16 +4,29 @@ Streamlit HVAC Smart Home Display
 A dark-themed smart home interface for monitoring and controlling HVAC settings.
 Shows real-time temperature and humidity data with interactive controls.
 
-NOTE: This app currently requires a database backend to function.
-The old JSON-based data_store has been removed.
+Readings come from the DuckDB database written by the collector, through
+the cached data layer in dashboard_data.py.
 """
 
 import streamlit as st
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
 import pandas as pd
+import time
 from datetime import datetime
 
+from dashboard_charts import history_figure as build_history_figure
+from dashboard_data import DatabaseUnavailable, get_live_readings, get_setpoints, list_sensors, load_history, load_stats
+from setpoint import DEFAULT_SETPOINT
+
+# Chart time ranges and the most points sent to the browser per series
+HISTORY_RANGES = {"1 h": 3600, "6 h": 6 * 3600, "24 h": 86400, "7 d": 7 * 86400, "30 d": 30 * 86400}
+CHART_POINT_BUDGET = 1500
+
+# Only the live section refreshes on a timer; the rest reruns on interaction
+LIVE_REFRESH_SECONDS = 5
+LIVE_CHART_MINUTES = 15
+# Half-width of the comfort band around the target used for time-in-deadband
+DEADBAND = 0.5
+
 # Page configuration
 st.set_page_config(
     page_title="Smart HVAC Control",
@@ -89,72 +102,124 @@ st.markdown("<p style='text-align: center; color: #a0a0c0; font-size: 1.1rem;'>M
 
 st.markdown("---")
 
-# TODO: Replace with database connection
-st.warning("⚠️ This app requires a database backend. The old JSON-based data_store has been removed. Please configure a database connection.")
-
-# Placeholder for current readings
-readings = []
-target_temp = 22.0  # Default target temperature
+# Current setpoint, shared with every other session and the controller through the actions table
+try:
+    setpoints = get_setpoints()
+    setpoints.refresh()
+    target_temp = setpoints.setpoint
+except DatabaseUnavailable:
+    setpoints = None
+    target_temp = DEFAULT_SETPOINT
 
 # Current Status Section
 st.markdown("<h2>📊 Current Status</h2>", unsafe_allow_html=True)
 
-if readings:
-    latest = readings[-1]
-    current_temp = latest['temperature']
-    current_humidity = latest['humidity']
-    timestamp = datetime.fromisoformat(latest['timestamp'])
+
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def current_status():
+    """Latest readings and a short live chart.
+
+    Runs as a fragment: it re-executes on its own every LIVE_REFRESH_SECONDS
+    without rerunning the rest of the page, so the CSS, the controls and the
+    historical figure are not rebuilt or re-sent on every refresh.
+    """
+    # Recent readings from the shared, incrementally refreshed frame
+    try:
+        df = get_live_readings().refresh()
+        live_setpoints = get_setpoints()
+    except DatabaseUnavailable as e:
+        st.warning(f"⚠️ {e}")
+        return
+    # Pick up setpoint changes made by other sessions or the controller
+    live_setpoints.refresh()
+    target_temp = live_setpoints.setpoint
+
+    if len(df) > 0:
+        latest = df.iloc[-1]
+        current_temp = latest['temperature']
+        current_humidity = latest['humidity']
+        timestamp = latest['timestamp']
     
-    col1, col2, col3, col4 = st.columns(4)
+        col1, col2, col3, col4 = st.columns(4)
     
-    with col1:
-        st.metric(
-            label="🌡️ Current Temperature",
-            value=f"{current_temp:.1f}°C",
-            delta=f"{current_temp * 9/5 + 32:.1f}°F"
-        )
+        with col1:
+            st.metric(
+                label="🌡️ Current Temperature",
+                value=f"{current_temp:.1f}°C",
+                delta=f"{current_temp * 9/5 + 32:.1f}°F"
+            )
     
-    with col2:
-        st.metric(
-            label="💧 Current Humidity",
-            value=f"{current_humidity}%",
-            delta=None
-        )
+        with col2:
+            st.metric(
+                label="💧 Current Humidity",
+                value=f"{current_humidity}%",
+                delta=None
+            )
     
-    with col3:
-        st.metric(
-            label="🎯 Target Temperature",
-            value=f"{target_temp:.1f}°C",
-            delta=f"{(current_temp - target_temp):.1f}°C"
-        )
+        with col3:
+            st.metric(
+                label="🎯 Target Temperature",
+                value=f"{target_temp:.1f}°C",
+                delta=f"{(current_temp - target_temp):.1f}°C"
+            )
     
-    with col4:
-        st.metric(
-            label="🕐 Last Update",
-            value=timestamp.strftime("%H:%M:%S"),
-            delta=None
+        with col4:
+            st.metric(
+                label="🕐 Last Update",
+                value=timestamp.strftime("%H:%M:%S"),
+                delta=None
+            )
+
+        # Live chart of the last few minutes; new points appear on each fragment run
+        recent = df[df['timestamp'] >= timestamp - pd.Timedelta(minutes=LIVE_CHART_MINUTES)]
+        st.line_chart(
+            recent,
+            x='timestamp',
+            y='temperature',
+            color='sensor_id' if recent['sensor_id'].nunique() > 1 else None,
+            height=220
         )
-else:
-    st.info("📡 Waiting for sensor data... Make sure the HVAC sensor is running.")
+    else:
+        st.info("📡 Waiting for sensor data... Make sure the HVAC sensor is running.")
+
+    st.markdown(
+        "<p style='text-align: right; color: #606070; font-size: 0.8rem;'>"
+        f"Live • refreshed {datetime.now().strftime('%H:%M:%S')}</p>",
+        unsafe_allow_html=True
+    )
+
+
+current_status()
 
 st.markdown("---")
 
 # Temperature Control Section
 st.markdown("<h2>🎛️ Temperature Control</h2>", unsafe_allow_html=True)
 
+
+
+def change_setpoint(delta):
+    """Store the adjusted setpoint and rerun so every section shows it."""
+    if setpoints is None:
+        st.warning("⚠️ Database unavailable, the target temperature cannot be changed")
+        return
+    try:
+        setpoints.adjust(delta)
+    except DatabaseUnavailable as e:
+        st.warning(f"⚠️ The target temperature cannot be changed: {e}")
+        return
+    st.rerun()
+
+
 col1, col2, col3, col4, col5 = st.columns([1, 1, 2, 1, 1])
 
 with col1:
     if st.button("❄️ --", help="Decrease by 1°C"):
-        target_temp = target_temp - 1.0
-        st.info(f"Target temperature set to {target_temp:.1f}°C (database connection required)")
-        st.rerun()
+        change_setpoint(-1.0)
 
 with col2:
     if st.button("🔽 -", help="Decrease by 0.5°C"):
-        target_temp = target_temp - 0.5
-        st.info(f"Target temperature set to {target_temp:.1f}°C (database connection required)")
-        st.rerun()
+        change_setpoint(-0.5)
 
 with col3:
     st.markdown(f"<h2 style='text-align: center; color: #00d4ff; font-size: 3rem; margin: 0;'>{target_temp:.1f}°C</h2>", 
@@ -164,133 +229,95 @@ with col3:
 
 with col4:
     if st.button("🔼 +", help="Increase by 0.5°C"):
-        target_temp = target_temp + 0.5
-        st.info(f"Target temperature set to {target_temp:.1f}°C (database connection required)")
-        st.rerun()
+        change_setpoint(+0.5)
 
 with col5:
     if st.button("🔥 ++", help="Increase by 1°C"):
-        target_temp = target_temp + 1.0
-        st.info(f"Target temperature set to {target_temp:.1f}°C (database connection required)")
-        st.rerun()
+        change_setpoint(+1.0)
 
 st.markdown("---")
 
 # Graphs Section
 st.markdown("<h2>📈 Historical Data</h2>", unsafe_allow_html=True)
 
-if len(readings) > 0:
-    # Prepare data for plotting
-    df = pd.DataFrame(readings)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Create subplots with shared x-axis
-    fig = make_subplots(
-        rows=2, cols=1,
-        subplot_titles=('Temperature Over Time', 'Humidity Over Time'),
-        vertical_spacing=0.12,
-        specs=[[{"secondary_y": False}], [{"secondary_y": False}]]
-    )
-    
-    # Temperature graph
-    fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=df['temperature'],
-            mode='lines+markers',
-            name='Temperature',
-            line=dict(color='#00d4ff', width=3),
-            marker=dict(size=6, color='#00d4ff'),
-            hovertemplate='<b>Time:</b> %{x|%H:%M:%S}<br><b>Temp:</b> %{y:.1f}°C<extra></extra>'
-        ),
-        row=1, col=1
-    )
-    
-    # Add target temperature line
-    fig.add_hline(
-        y=target_temp,
-        line_dash="dash",
-        line_color="rgba(255, 100, 100, 0.5)",
-        annotation_text=f"Target: {target_temp:.1f}°C",
-        annotation_position="right",
-        row=1, col=1
-    )
-    
-    # Humidity graph
-    fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=df['humidity'],
-            mode='lines+markers',
-            name='Humidity',
-            line=dict(color='#00ff9f', width=3),
-            marker=dict(size=6, color='#00ff9f'),
-            hovertemplate='<b>Time:</b> %{x|%H:%M:%S}<br><b>Humidity:</b> %{y}%<extra></extra>'
-        ),
-        row=2, col=1
-    )
-    
-    # Update layout for dark theme
-    fig.update_layout(
-        height=700,
-        showlegend=False,
-        hovermode='x unified',
-        plot_bgcolor='rgba(20, 20, 40, 0.8)',
-        paper_bgcolor='rgba(0, 0, 0, 0)',
-        font=dict(color='#e0e0e0', size=12),
-        margin=dict(l=50, r=50, t=80, b=50)
-    )
-    
-    # Update x-axes
-    fig.update_xaxes(
-        showgrid=True,
-        gridwidth=1,
-        gridcolor='rgba(100, 100, 120, 0.2)',
-        showline=True,
-        linewidth=2,
-        linecolor='rgba(0, 212, 255, 0.3)',
-        color='#a0a0c0'
-    )
-    
-    # Update y-axes
-    fig.update_yaxes(
-        title_text="Temperature (°C)",
-        showgrid=True,
-        gridwidth=1,
-        gridcolor='rgba(100, 100, 120, 0.2)',
-        showline=True,
-        linewidth=2,
-        linecolor='rgba(0, 212, 255, 0.3)',
-        color='#a0a0c0',
-        row=1, col=1
-    )
-    
-    fig.update_yaxes(
-        title_text="Humidity (%)",
-        showgrid=True,
-        gridwidth=1,
-        gridcolor='rgba(100, 100, 120, 0.2)',
-        showline=True,
-        linewidth=2,
-        linecolor='rgba(0, 212, 255, 0.3)',
-        color='#a0a0c0',
-        row=2, col=1
-    )
-    
+range_col, sensor_col = st.columns([3, 1])
+with range_col:
+    history_range = st.radio("Time range", list(HISTORY_RANGES), index=0, horizontal=True)
+with sensor_col:
+    try:
+        sensors = list_sensors()
+    except DatabaseUnavailable:
+        sensors = []
+    sensor_id = st.selectbox("Sensor", sensors, format_func=lambda s: s or "default") if len(sensors) > 1 else None
+
+@st.cache_data(ttl=30, show_spinner=False)
+def history_figure(history, target_temp):
+    """Build the historical temperature/humidity figure, cached per series and target."""
+    return build_history_figure(history, target_temp)
+
+
+# Re-query the selected range at a fixed point budget. Both ends move in
+# 30 second steps, so reruns within a step reuse the cached result.
+now = time.time()
+history_until = now - now % 30 + 30
+history_since = history_until - HISTORY_RANGES[history_range]
+try:
+    history = load_history(history_since, history_until, CHART_POINT_BUDGET, sensor_id)
+except DatabaseUnavailable:
+    history = None
+
+if history is not None and len(history['temperature']) > 0:
+    fig = history_figure(history, target_temp)
     st.plotly_chart(fig, use_container_width=True)
     
-    # Statistics
+    # Statistics for the selected range, aggregated in DuckDB from the rollups
     st.markdown("<h3>📊 Statistics</h3>", unsafe_allow_html=True)
-    col1, col2, col3, col4 = st.columns(4)
-    
-    with col1:
-        st.metric("📈 Avg Temperature", f"{df['temperature'].mean():.1f}°C")
-    with col2:
-        st.metric("📉 Min Temperature", f"{df['temperature'].min():.1f}°C")
-    with col3:
-        st.metric("📈 Max Temperature", f"{df['temperature'].max():.1f}°C")
-    with col4:
-        st.metric("💧 Avg Humidity", f"{df['humidity'].mean():.0f}%")
+    try:
+        summary = load_stats(history_since, history_until, None, target_temp, DEADBAND, sensor_id).iloc[0]
+    except DatabaseUnavailable:
+        summary = None
+
+    if summary is not None and summary['count'] > 0:
+        col1, col2, col3, col4, col5 = st.columns(5)
+
+        with col1:
+            st.metric("📈 Avg Temperature", f"{summary['temperature_mean']:.1f}°C")
+        with col2:
+            st.metric("📉 Min Temperature", f"{summary['temperature_min']:.1f}°C")
+        with col3:
+            st.metric("📈 Max Temperature", f"{summary['temperature_max']:.1f}°C")
+        with col4:
+            st.metric("💧 Avg Humidity", f"{summary['humidity_mean']:.0f}%")
+        with col5:
+            st.metric(
+                f"🎯 In Deadband (±{DEADBAND}°C)",
+                f"{summary['deadband_fraction']:.0%}",
+                delta=f"{summary['deadband_minutes'] / 60:.1f} h",
+                delta_color="off"
+            )
+
+        day_tab, hour_tab = st.tabs(["Per day", "Per hour"])
+        for tab, period, label, time_format in ((day_tab, 86400, "Day", "%Y-%m-%d"),
+                                                (hour_tab, 3600, "Hour", "%Y-%m-%d %H:00")):
+            try:
+                breakdown = load_stats(history_since, history_until, period, target_temp, DEADBAND, sensor_id)
+            except DatabaseUnavailable as e:
+                with tab:
+                    st.warning(f"⚠️ {e}")
+                continue
+            with tab:
+                st.dataframe(
+                    pd.DataFrame({
+                        label: breakdown['period_start'].dt.strftime(time_format),
+                        "Avg °C": breakdown['temperature_mean'].round(1),
+                        "Min °C": breakdown['temperature_min'].round(1),
+                        "Max °C": breakdown['temperature_max'].round(1),
+                        "Avg Humidity %": breakdown['humidity_mean'].round(0),
+                        "In Deadband %": (breakdown['deadband_fraction'] * 100).round(0),
+                    }).iloc[::-1],
+                    hide_index=True,
+                    use_container_width=True
+                )
 else:
     st.info("📊 No data available yet. Start collecting sensor data to see graphs.")
 
@@ -302,11 +329,3 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Auto-refresh every 5 seconds
-st.markdown("""
-    <script>
-        setTimeout(function() {
-            window.location.reload();
-        }, 5000);
-    </script>
-""", unsafe_allow_html=True)
@@ -0,0 +1,41 @@
+import os
+import sys
+
+import pytest
+
+# the collector's modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from contants import Config  # noqa: E402
+from data_store import DataStore  # noqa: E402
+
+ADDRESSES = ["AA:00:00:00:00:01", "AA:00:00:00:00:02", "AA:00:00:00:00:03", "AA:00:00:00:00:04"]
+
+
+@pytest.fixture
+def make_config(monkeypatch):
+    """Build a Config for the fake sensors in the given read mode."""
+    def make(read_mode: str = "poll", addresses=ADDRESSES) -> Config:
+        monkeypatch.setenv("DEVICE_ADDRESSES", ",".join(addresses))
+        monkeypatch.setenv("READ_MODE", read_mode)
+        config = Config()
+        # poll every 10 ms rather than every second
+        config.packet_interval = 10
+        return config
+    return make
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "readings.duckdb")
+
+
+def readings_by_sensor(db_path: str) -> dict:
+    """Rows in sensor_readings per sensor_id."""
+    store = DataStore(db_path, read_only=True)
+    try:
+        return dict(store.conn.execute(
+            "SELECT sensor_id, count(*) FROM sensor_readings GROUP BY sensor_id"
+        ).fetchall())
+    finally:
+        store.close()
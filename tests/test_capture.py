@@ -0,0 +1,54 @@
+"""Capture files survive a collector killed mid-write."""
+
+import os
+
+import capture
+from capture import CAPTURE_MAGIC, CaptureWriter, read_capture
+from fake_client import encode_sensor_data
+
+
+def test_reopen_drops_partial_trailing_record(tmp_path):
+    path = str(tmp_path / "packets.cap")
+    with CaptureWriter(path) as writer:
+        writer.write(1.0, "AA", encode_sensor_data(24.0, 40))
+        writer.write(2.0, "BB", encode_sensor_data(25.0, 41))
+    complete = os.path.getsize(path)
+    # half a record, as if the process died during write()
+    with open(path, "ab") as f:
+        f.write(b"P\x00\x00\x00")
+
+    with CaptureWriter(path) as writer:
+        assert os.path.getsize(path) == complete
+        writer.write(3.0, "BB", encode_sensor_data(26.0, 42))
+        writer.write(4.0, "CC", encode_sensor_data(27.0, 43))
+
+    records = list(read_capture(path))
+    assert [(r.timestamp, r.device_id) for r in records] == [(1.0, "AA"), (2.0, "BB"), (3.0, "BB"), (4.0, "CC")]
+    assert records[2].payload == encode_sensor_data(26.0, 42)
+
+
+def test_reopen_after_partial_magic(tmp_path):
+    path = str(tmp_path / "packets.cap")
+    with open(path, "wb") as f:
+        f.write(CAPTURE_MAGIC[:3])
+
+    with CaptureWriter(path) as writer:
+        writer.write(1.0, "AA", encode_sensor_data(24.0, 40))
+
+    assert [r.device_id for r in read_capture(path)] == ["AA"]
+
+
+def test_read_capture_streams_records_across_chunks(tmp_path, monkeypatch):
+    path = str(tmp_path / "packets.cap")
+    with CaptureWriter(path) as writer:
+        for i in range(50):
+            writer.write(float(i), f"sensor-{i % 3}", encode_sensor_data(20.0 + i / 10, 40))
+    with open(path, "ab") as f:
+        f.write(b"P\x00\x00")
+    # chunks far smaller than a record, so every record straddles several
+    monkeypatch.setattr(capture, "_READ_CHUNK", 7)
+
+    records = list(read_capture(path))
+    assert [r.timestamp for r in records] == [float(i) for i in range(50)]
+    assert [r.device_id for r in records[:4]] == ["sensor-0", "sensor-1", "sensor-2", "sensor-0"]
+    assert records[-1].payload == encode_sensor_data(20.0 + 49 / 10, 40)
@@ -0,0 +1,106 @@
+"""GATT notification mode: subscribe_packets and collect_from_sensors over fake sensors."""
+
+import asyncio
+import datetime
+
+from conftest import ADDRESSES, readings_by_sensor
+from connection_handler import CONNECTION_ERRORS, collect_from_sensors
+from data_store import DataStore
+from fake_client import FakeBleakClient
+from packet_handler import PARSE_ERRORS, subscribe_packets
+from packet_timer import StreamingPacketTimer
+from persistence_queue import PersistenceQueue
+
+NOTIFY_INTERVAL = 0.01
+
+
+class GarblingClient(FakeBleakClient):
+    """Pushes a truncated payload every third notification."""
+
+    def next_payload(self) -> bytes:
+        payload = super().next_payload()
+        return payload[:3] if self.notifications % 3 == 0 else payload
+
+
+class UnreachableClient(FakeBleakClient):
+    async def connect(self):
+        raise ConnectionError(f"{self.address} is out of range")
+
+
+async def _with_persistence(db_path, fn):
+    persistence = PersistenceQueue(lambda: DataStore(db_path), max_batch=50)
+    await persistence.start()
+    try:
+        return await fn(persistence)
+    finally:
+        await persistence.close()
+
+
+def test_subscribe_packets_persists_notifications(make_config, db_path):
+    config = make_config("notify")
+    address = ADDRESSES[0]
+    client = FakeBleakClient(address, notify_interval=NOTIFY_INTERVAL, seed=0)
+    timer = StreamingPacketTimer()
+
+    async def run(persistence):
+        async with client:
+            end_time = datetime.datetime.now() + datetime.timedelta(seconds=0.3)
+            return await subscribe_packets(client, config, timer, end_time, persistence=persistence,
+                                           sensor_id=address)
+
+    errors = asyncio.run(_with_persistence(db_path, run))
+
+    assert errors == 0
+    assert client.notifications > 0
+    assert readings_by_sensor(db_path) == {address: client.notifications}
+    assert timer.packet_count == client.notifications
+    # unsubscribed on the way out
+    assert not client._notify_tasks
+
+
+def test_subscribe_packets_counts_parse_errors(make_config, db_path):
+    config = make_config("notify")
+    address = ADDRESSES[0]
+    client = GarblingClient(address, notify_interval=NOTIFY_INTERVAL, seed=0)
+    parse_errors_before = PARSE_ERRORS.labels(address).value
+
+    async def run(persistence):
+        async with client:
+            end_time = datetime.datetime.now() + datetime.timedelta(seconds=0.3)
+            return await subscribe_packets(client, config, StreamingPacketTimer(), end_time,
+                                           persistence=persistence, sensor_id=address)
+
+    errors = asyncio.run(_with_persistence(db_path, run))
+
+    garbled = client.notifications // 3
+    assert garbled > 0
+    assert errors == garbled
+    assert PARSE_ERRORS.labels(address).value == parse_errors_before + garbled
+    # a bad payload is skipped, the subscription carries on
+    assert readings_by_sensor(db_path) == {address: client.notifications - garbled}
+
+
+def test_collect_from_sensors_in_notify_mode(make_config, db_path):
+    config = make_config("notify")
+    unreachable = ADDRESSES[2]
+    errors_before = CONNECTION_ERRORS.labels(unreachable).value
+    clients = {}
+
+    def factory(address):
+        if address == unreachable:
+            return UnreachableClient(address)
+        clients[address] = FakeBleakClient(address, notify_interval=NOTIFY_INTERVAL, seed=0)
+        return clients[address]
+
+    timers = asyncio.run(_with_persistence(db_path, lambda persistence: collect_from_sensors(
+        config, ADDRESSES, 0.3 / 60, persistence, client_factory=factory, max_connections=len(ADDRESSES)
+    )))
+
+    assert CONNECTION_ERRORS.labels(unreachable).value == errors_before + 1
+    counts = readings_by_sensor(db_path)
+    assert set(counts) == set(ADDRESSES) - {unreachable}
+    for address, client in clients.items():
+        assert client.reads == 0
+        assert counts[address] == client.notifications > 0
+        assert timers[address].packet_count == client.notifications
+    assert timers[unreachable].packet_count == 0
@@ -0,0 +1,135 @@
+"""Polling several fake sensors through collect_from_sensors into a PersistenceQueue."""
+
+import asyncio
+
+import pytest
+
+from conftest import ADDRESSES, readings_by_sensor
+from connection_handler import CONNECTION_ERRORS, collect_from_sensors
+from contants import DeviceConnectionError
+from data_store import DataStore
+from fake_client import FakeBleakClient
+from packet_handler import PARSE_ERRORS
+from persistence_queue import PersistenceQueue
+
+DURATION_MINUTES = 0.3 / 60
+
+
+class TrackingFactory:
+    """Client factory that records every fake it builds and the peak number connected at once."""
+
+    def __init__(self, unreachable=()):
+        self.unreachable = set(unreachable)
+        self.clients = {}
+        self.connected = 0
+        self.peak = 0
+
+    def __call__(self, address):
+        if address in self.unreachable:
+            return UnreachableClient(address)
+        client = TrackedClient(self, address)
+        self.clients[address] = client
+        return client
+
+
+class TrackedClient(FakeBleakClient):
+    def __init__(self, factory, address):
+        super().__init__(address, seed=0)
+        self.factory = factory
+
+    async def connect(self):
+        self.factory.connected += 1
+        self.factory.peak = max(self.factory.peak, self.factory.connected)
+        return await super().connect()
+
+    async def disconnect(self):
+        self.factory.connected -= 1
+        return await super().disconnect()
+
+
+class GarblingClient(FakeBleakClient):
+    """Returns a truncated payload from every third read."""
+
+    def next_payload(self) -> bytes:
+        payload = super().next_payload()
+        return payload[:3] if self.reads % 3 == 0 else payload
+
+
+class UnreachableClient(FakeBleakClient):
+    async def connect(self):
+        raise ConnectionError(f"{self.address} is out of range")
+
+
+def collect(config, db_path, factory, max_connections, addresses=ADDRESSES):
+    async def run():
+        persistence = PersistenceQueue(lambda: DataStore(db_path), max_batch=50)
+        await persistence.start()
+        try:
+            return await collect_from_sensors(
+                config, addresses, DURATION_MINUTES, persistence,
+                client_factory=factory, max_connections=max_connections
+            )
+        finally:
+            await persistence.close()
+    return asyncio.run(run())
+
+
+def test_readings_are_tagged_with_their_sensor(make_config, db_path):
+    factory = TrackingFactory()
+    timers = collect(make_config("poll"), db_path, factory, max_connections=len(ADDRESSES))
+
+    counts = readings_by_sensor(db_path)
+    assert set(counts) == set(ADDRESSES)
+    for address, client in factory.clients.items():
+        assert client.reads > 0
+        assert counts[address] == client.reads
+        assert timers[address].packet_count == client.reads
+
+
+def test_max_connections_limits_simultaneous_clients(make_config, db_path):
+    factory = TrackingFactory()
+    collect(make_config("poll"), db_path, factory, max_connections=2)
+
+    assert factory.peak == 2
+    # the other sensors only get a slot once the first two finish, by which time the run is over
+    assert len(factory.clients) == 2
+    assert set(readings_by_sensor(db_path)) == set(factory.clients)
+
+
+def test_unreachable_sensor_is_recorded_without_stopping_the_rest(make_config, db_path):
+    unreachable = ADDRESSES[1]
+    errors_before = CONNECTION_ERRORS.labels(unreachable).value
+    factory = TrackingFactory(unreachable=[unreachable])
+
+    collect(make_config("poll"), db_path, factory, max_connections=len(ADDRESSES))
+
+    assert CONNECTION_ERRORS.labels(unreachable).value == errors_before + 1
+    counts = readings_by_sensor(db_path)
+    assert unreachable not in counts
+    assert set(counts) == set(ADDRESSES) - {unreachable}
+
+
+def test_fails_when_no_sensor_can_be_reached(make_config, db_path):
+    factory = TrackingFactory(unreachable=ADDRESSES)
+    with pytest.raises(DeviceConnectionError):
+        collect(make_config("poll"), db_path, factory, max_connections=2)
+
+
+def test_parse_errors_are_counted_without_stopping_the_sensor(make_config, db_path):
+    address = ADDRESSES[0]
+    parse_errors_before = PARSE_ERRORS.labels(address).value
+    connection_errors_before = CONNECTION_ERRORS.labels(address).value
+    clients = []
+
+    def factory(address):
+        clients.append(GarblingClient(address, seed=0))
+        return clients[-1]
+
+    collect(make_config("poll"), db_path, factory, max_connections=1, addresses=[address])
+
+    client, = clients
+    garbled = client.reads // 3
+    assert garbled > 0
+    assert PARSE_ERRORS.labels(address).value == parse_errors_before + garbled
+    assert CONNECTION_ERRORS.labels(address).value == connection_errors_before
+    assert readings_by_sensor(db_path) == {address: client.reads - garbled}
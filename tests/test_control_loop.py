@@ -0,0 +1,75 @@
+"""A failed transition sync keeps the transitions and does not break shutdown."""
+
+import asyncio
+
+import numpy as np
+
+from controller import HEAT_ON
+from data_store import DataStore
+from inference import ARTIFACT_VERSION, BatchingPredictor, ControlLoop, NumpyPredictor
+from persistence_queue import PersistenceQueue
+
+ZONES = ["zone-1", "zone-2"]
+
+
+class FlakyStore(DataStore):
+    """DataStore whose write_actions fails while fail is set."""
+
+    fail = True
+
+    def write_actions(self, *args, **kwargs):
+        if FlakyStore.fail:
+            raise OSError("disk full")
+        return super().write_actions(*args, **kwargs)
+
+
+def make_loop() -> ControlLoop:
+    config = {'schema_version': ARTIFACT_VERSION, 'history': 2, 'horizon': 1, 'target_index': 0,
+              'columns': ['temperature', 'humidity'], 'resolution': 60, 'pipeline': None}
+    predictor = NumpyPredictor(np.zeros(4), np.zeros(1), np.zeros(2), np.ones(2), config)
+    return ControlLoop(ZONES, BatchingPredictor(predictor))
+
+
+def test_failed_sync_keeps_transitions_until_shutdown(db_path):
+    async def run():
+        FlakyStore.fail = True
+        persistence = PersistenceQueue(lambda: FlakyStore(db_path))
+        await persistence.start()
+        loop = make_loop()
+        await loop.start(persistence, sync_interval=0.01)
+        loop.controller.step(1000.0, [15.0, np.nan], loop.setpoint)
+        # several periodic syncs fail; the task keeps running
+        await asyncio.sleep(0.1)
+        assert not loop._sync_task.done()
+        assert loop.logged == 0
+        assert loop.controller.pending_count == 1
+
+        FlakyStore.fail = False
+        await loop.close()
+        await persistence.close()
+        return loop.logged
+
+    assert asyncio.run(run()) == 1
+    store = DataStore(db_path, read_only=True)
+    actions = store.read_actions(action_name='HEAT_ON', format='numpy')
+    store.close()
+    assert len(actions['timestamp']) == 1
+    assert list(actions['zone']) == ['zone-1']
+
+
+def test_failed_final_sync_still_lets_persistence_close(db_path):
+    async def run():
+        FlakyStore.fail = True
+        persistence = PersistenceQueue(lambda: FlakyStore(db_path))
+        await persistence.start()
+        loop = make_loop()
+        await loop.start(persistence, sync_interval=0.01)
+        loop.controller.step(1000.0, [15.0, 30.0], loop.setpoint)
+        await loop.close()
+        await persistence.close()
+        return loop
+
+    loop = asyncio.run(run())
+    assert loop.logged == 0
+    assert loop.controller.modes[0] == HEAT_ON
+    assert loop.controller.pending_count == 2
@@ -0,0 +1,75 @@
+"""DataStore queries."""
+
+import duckdb
+import numpy as np
+import pytest
+
+from data_store import DataStore
+
+
+def test_iter_range_pages_through_duplicate_keys():
+    store = DataStore(':memory:')
+    # several readings share (timestamp, sensor_id), across page boundaries
+    timestamps = [1.0] * 5 + [2.0] * 3 + [3.0]
+    store.write_packets(timestamps, np.arange(9, dtype=float), [40] * 9, ['a'] * 8 + [None])
+
+    pages = list(store.iter_range(page_size=2))
+
+    assert [len(page['timestamp']) for page in pages] == [2, 2, 2, 2, 1]
+    assert all('rowid' not in page for page in pages)
+    temperatures = np.concatenate([page['temperature'] for page in pages])
+    assert sorted(temperatures) == list(range(9))
+
+
+def test_rebuild_rollups_keeps_buckets_outside_the_range():
+    store = DataStore(':memory:')
+    # two hours of readings, one a minute, rolled up as they are written
+    store.write_packets(60.0 * np.arange(120), np.full(120, 20.0), [40] * 120, 'a')
+    # the first hour's raw readings are archived away, its rollups stay
+    store.conn.execute('DELETE FROM sensor_readings WHERE timestamp < 3600;')
+    # a bulk load into the second hour skips the rollups
+    store.write_packets(3600.0 + 60.0 * np.arange(60) + 30.0, np.full(60, 22.0), [40] * 60, 'a', rollups=False)
+
+    store.rebuild_rollups(3600.0, 7199.0)
+
+    hourly = store.conn.execute('SELECT bucket, count FROM sensor_rollup_1h ORDER BY bucket;').fetchall()
+    assert hourly == [(0.0, 60), (3600.0, 120)]
+
+
+def test_failed_write_leaves_no_transaction_open():
+    store = DataStore(':memory:')
+    # a humidity that is not an integer fails the insert inside the write's transaction
+    with pytest.raises(duckdb.Error):
+        store.write_packet(1.0, 20.0, 'damp', 'a')
+
+    store.write_packet(2.0, 21.0, 40, 'a')
+    store.flush()
+    assert store.conn.execute('SELECT count(*) FROM sensor_readings;').fetchone()[0] == 1
+    assert store.conn.execute('SELECT sum(count) FROM sensor_rollup_1m;').fetchone()[0] == 1
+
+
+def test_single_row_writes_reach_the_rollups_in_bulk():
+    store = DataStore(':memory:', max_batch_age=3600.0)
+    for i in range(5):
+        store.write_packet(60.0 * i, 20.0 + i, 40, None if i % 2 else 'a')
+    # the rows are written at once, their rollups on the next flush
+    assert store.conn.execute('SELECT count(*) FROM sensor_readings;').fetchone()[0] == 5
+    assert store.conn.execute('SELECT count(*) FROM sensor_rollup_1m;').fetchone()[0] == 0
+
+    rollup = store.query_rollup(0.0, 300.0, 60.0, format='numpy')
+    assert sorted(zip(rollup['sensor_id'], rollup['temperature_mean'])) == [
+        ('', 21.0), ('', 23.0), ('a', 20.0), ('a', 22.0), ('a', 24.0)]
+
+
+def test_daily_stats_follow_the_local_calendar_across_daylight_saving():
+    store = DataStore(':memory:')
+    # one reading a minute from 2024-03-30 00:00 to 2024-04-02 00:00 Berlin time;
+    # clocks go forward on 2024-03-31, which has 23 hours
+    start = 1711753200.0
+    timestamps = start + 60.0 * np.arange(3 * 1440 - 60)
+    store.write_packets(timestamps, np.full(len(timestamps), 21.0), np.full(len(timestamps), 40), 'a')
+
+    stats = store.query_stats(start, timestamps[-1] + 60, 86400, timezone='Europe/Berlin', format='numpy')
+
+    np.testing.assert_array_equal(stats['period_start'], [1711753200.0, 1711839600.0, 1711922400.0])
+    np.testing.assert_array_equal(stats['minutes'], [1440, 1380, 1440])
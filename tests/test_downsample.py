@@ -0,0 +1,34 @@
+"""Largest-Triangle-Three-Buckets downsampling."""
+
+import numpy as np
+import pytest
+
+from downsample import lttb_indices
+
+
+@pytest.mark.parametrize("n, threshold", [(10000, 500), (1001, 3), (257, 100)])
+def test_keeps_endpoints_and_returns_the_budget_in_order(n, threshold):
+    rng = np.random.default_rng(0)
+    x = np.cumsum(rng.uniform(0.5, 1.5, n))
+    y = np.sin(x / 50) + rng.normal(0, 0.1, n)
+
+    kept = lttb_indices(x, y, threshold)
+
+    assert len(kept) == threshold
+    assert kept[0] == 0 and kept[-1] == n - 1
+    assert np.all(np.diff(kept) > 0)
+
+
+def test_short_series_and_tiny_budgets_are_returned_whole():
+    x = np.arange(50.0)
+    np.testing.assert_array_equal(lttb_indices(x, x, 50), np.arange(50))
+    np.testing.assert_array_equal(lttb_indices(x, x, 80), np.arange(50))
+    np.testing.assert_array_equal(lttb_indices(x, x, 2), np.arange(50))
+
+
+def test_keeps_a_spike():
+    x = np.arange(10000.0)
+    y = np.zeros(10000)
+    y[4321] = 10.0
+
+    assert 4321 in lttb_indices(x, y, 100)
@@ -0,0 +1,32 @@
+"""Calendar features follow the pipeline's time zone, daylight saving time included."""
+
+import numpy as np
+
+from features import FeaturePipeline, RAW_COLUMNS
+
+# 12:00 local time in Berlin: 11:00 UTC in winter (CET), 10:00 UTC in summer (CEST)
+WINTER_NOON = 1705316400.0  # 2024-01-15 11:00 UTC
+SUMMER_NOON = 1721037600.0  # 2024-07-15 10:00 UTC
+
+
+def _time_of_day(pipeline, timestamps):
+    features = pipeline.transform(timestamps, np.zeros((len(timestamps), len(RAW_COLUMNS))))
+    columns = pipeline.columns
+    return features[:, [columns.index('time_of_day_sin'), columns.index('time_of_day_cos')]]
+
+
+def test_calendar_follows_daylight_saving_time():
+    pipeline = FeaturePipeline(60, lags=(), windows=(), dew_point=False, actions=False,
+                               timezone='Europe/Berlin')
+    winter, summer = _time_of_day(pipeline, np.array([WINTER_NOON, SUMMER_NOON]))
+    np.testing.assert_allclose(winter, summer, atol=1e-6)
+    np.testing.assert_allclose(winter, [0.0, -1.0], atol=1e-6)
+
+
+def test_config_round_trip():
+    pipeline = FeaturePipeline(60, timezone='America/New_York')
+    assert pipeline.config()['timezone'] == 'America/New_York'
+    assert FeaturePipeline.from_config(pipeline.config()).config() == pipeline.config()
+    # pipelines exported with a fixed offset keep it
+    legacy = FeaturePipeline.from_config({**pipeline.config(), 'timezone': None, 'utc_offset': 3600.0})
+    np.testing.assert_allclose(_time_of_day(legacy, np.array([WINTER_NOON])), [[0.0, -1.0]], atol=1e-6)
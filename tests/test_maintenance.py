@@ -0,0 +1,59 @@
+"""Archiving and pruning old rows."""
+
+import os
+
+import numpy as np
+import pytest
+
+import maintenance
+from data_store import DataStore
+from maintenance import run_maintenance
+
+NOW = 1_700_000_000.0
+
+
+def _archived_files(directory):
+    return [name for _, _, files in os.walk(directory) for name in files]
+
+
+def _seed(db_path):
+    with DataStore(db_path) as store:
+        timestamps = NOW - 86400 * np.arange(10, 0, -1)
+        store.write_packets(timestamps, np.full(10, 21.0), np.full(10, 40), 'a')
+        store.write_actions([NOW - 400 * 86400], ['HEAT_ON'], [21.0], ['a'])
+
+
+def test_old_rows_are_archived_and_deleted(tmp_path):
+    # quotes in paths end up inside SQL string literals
+    db_path = str(tmp_path / "it's.duckdb")
+    archive_dir = str(tmp_path / "o'archive")
+    _seed(db_path)
+
+    report = run_maintenance(db_path, raw_retention_days=5, archive_dir=archive_dir, compact=True, now=NOW)
+
+    assert report["readings_deleted"] == 5
+    assert report["actions_deleted"] == 1
+    assert len(_archived_files(archive_dir)) == 6
+    with DataStore(db_path) as store:
+        assert store.conn.execute('SELECT count(*) FROM sensor_readings;').fetchone()[0] == 5
+
+
+def test_failed_run_deletes_nothing_and_leaves_no_archive(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "hvac.duckdb")
+    archive_dir = str(tmp_path / "archive")
+    _seed(db_path)
+    archive = maintenance._archive
+
+    def fail_on_actions(conn, table, *args):
+        if table == 'actions':
+            raise OSError("disk full")
+        archive(conn, table, *args)
+
+    monkeypatch.setattr(maintenance, "_archive", fail_on_actions)
+    with pytest.raises(OSError):
+        run_maintenance(db_path, raw_retention_days=5, archive_dir=archive_dir, now=NOW)
+
+    assert _archived_files(archive_dir) == []
+    with DataStore(db_path) as store:
+        assert store.conn.execute('SELECT count(*) FROM sensor_readings;').fetchone()[0] == 10
+        assert store.conn.execute('SELECT count(*) FROM actions;').fetchone()[0] == 1
@@ -0,0 +1,47 @@
+"""Streaming interval statistics: P² quantiles and the shared timer report."""
+
+import numpy as np
+import pytest
+
+from packet_timer import P2Quantile, PacketTimer, StreamingPacketTimer
+
+
+@pytest.mark.parametrize("quantile", [0.5, 0.95, 0.99])
+@pytest.mark.parametrize("distribution", ["uniform", "exponential", "normal"])
+def test_p2_quantile_tracks_the_exact_percentile(quantile, distribution):
+    rng = np.random.default_rng(0)
+    values = {
+        "uniform": lambda: rng.uniform(0.0, 1.0, 20000),
+        "exponential": lambda: rng.exponential(1.0, 20000),
+        "normal": lambda: rng.normal(10.0, 2.0, 20000),
+    }[distribution]()
+    estimator = P2Quantile(quantile)
+    for value in values:
+        estimator.add(float(value))
+
+    exact = np.percentile(values, quantile * 100)
+    # within 2% of the spread of the data
+    assert abs(estimator.value() - exact) < 0.02 * (values.max() - values.min())
+
+
+def test_p2_quantile_is_exact_before_five_values():
+    estimator = P2Quantile(0.5)
+    assert estimator.value() == 0.0
+    for value in (3.0, 1.0, 2.0):
+        estimator.add(value)
+    assert estimator.value() == 2.0
+
+
+def test_streaming_timer_matches_the_full_timer():
+    intervals = np.random.default_rng(1).exponential(0.5, 1000)
+    full, streaming = PacketTimer(), StreamingPacketTimer()
+    full.intervals = list(intervals)
+    for interval in intervals:
+        streaming._add_interval(float(interval))
+
+    assert streaming.get_average_interval() == pytest.approx(full.get_average_interval())
+    assert streaming.get_interval_std() == pytest.approx(np.std(intervals, ddof=1))
+    assert streaming.get_packets_per_hour() == pytest.approx(full.get_packets_per_hour())
+    report = streaming.format_stats()
+    assert "p50 / p95 / p99" in report and "σ" in report
+    assert "p50" not in full.format_stats()
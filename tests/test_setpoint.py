@@ -0,0 +1,47 @@
+"""The setpoint comes from SET_TARGET actions only."""
+
+import time
+
+import numpy as np
+
+from controller import setpoint_history
+from data_store import DataStore
+from features import action_states
+from maintenance import run_maintenance
+from setpoint import DEFAULT_SETPOINT, SETPOINT_ACTION, SetpointService
+
+
+def test_transitions_do_not_change_the_setpoint(db_path):
+    store = DataStore(db_path)
+    setpoints = SetpointService(store)
+    version = setpoints.set(23.0)
+    # a transition logged under a stale target, after the change
+    store.write_actions([version + 1.0], ['HEAT_ON'], [21.0], ['zone-1'])
+
+    assert not setpoints.refresh()
+    assert setpoints.setpoint == 23.0
+    assert SetpointService(store).get() == (23.0, version)
+    # adjust starts from the last setpoint change, not from the transition
+    adjusted = setpoints.adjust(0.5)
+    assert setpoints.setpoint == 23.5
+
+    actions = store.read_actions(format='numpy')
+    # before the change, after it, after the transition, after the adjustment
+    probe = [version - 1.0, version + 0.5, (version + 1.0 + adjusted) / 2, adjusted + 1.0]
+    assert action_states(actions, 'zone-1', probe)[:, 0].tolist() == [DEFAULT_SETPOINT, 23.0, 23.0, 23.5]
+    assert setpoint_history(store, probe, DEFAULT_SETPOINT).tolist() == [DEFAULT_SETPOINT, 23.0, 23.0, 23.5]
+
+
+def test_maintenance_keeps_the_newest_setpoint_change(db_path):
+    store = DataStore(db_path)
+    old = time.time() - 400 * 86400
+    store.write_actions(np.array([old, old + 1, old + 2]), [SETPOINT_ACTION, SETPOINT_ACTION, 'COOL_ON'],
+                        [20.0, 24.0, 24.0])
+    store.close()
+
+    report = run_maintenance(db_path, action_retention_days=365)
+
+    store = DataStore(db_path)
+    assert report['actions_deleted'] == 2
+    assert store.read_actions() == [(old + 1, SETPOINT_ACTION, 24.0, None)]
+    assert SetpointService(store).setpoint == 24.0
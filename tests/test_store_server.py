@@ -0,0 +1,100 @@
+"""The collector's store endpoint, which serves the database to the dashboard."""
+
+import asyncio
+import json
+import os
+import urllib.error
+import urllib.request
+
+import numpy as np
+import pytest
+
+from data_store import DataStore
+from persistence_queue import PersistenceQueue
+from setpoint import DEFAULT_SETPOINT
+from store_server import StoreNotServed, StoreRequestError, StoreServer, call_store, run_method
+
+
+def test_serves_queries_and_setpoint_changes_from_the_writer_thread(db_path, tmp_path):
+    async def run():
+        persistence = PersistenceQueue(lambda: DataStore(db_path))
+        await persistence.start()
+        server = StoreServer(persistence, db_path, port=0).start()
+        url = f"http://127.0.0.1:{server.port}"
+        try:
+            for i in range(10):
+                await persistence.put(1000.0 + i, 20.0 + i, 40, 'a' if i % 2 else None)
+            await persistence.join()
+
+            def call(method, **kwargs):
+                return asyncio.to_thread(call_store, url, method, kwargs, db_path)
+
+            rows = await call('read_range', since=1002.0, until=1006.0, with_rowid=True)
+            local = await persistence.run_with_store(
+                lambda store: run_method(store, 'read_range', {'since': 1002.0, 'until': 1006.0, 'with_rowid': True}))
+            assert rows.keys() == local.keys()
+            for column in rows:
+                np.testing.assert_array_equal(rows[column], local[column])
+
+            stats = await call('query_stats', since=900.0, until=2000.0)
+            assert stats['count'][0] == 10
+            assert await call('list_sensors') == ['', 'a']
+
+            assert (await call('get_setpoint'))[0] == DEFAULT_SETPOINT
+            setpoint, version = await call('adjust_setpoint', delta=1.5)
+            assert setpoint == DEFAULT_SETPOINT + 1.5
+            assert await call('get_setpoint') == (setpoint, version)
+
+            with pytest.raises(StoreNotServed):
+                await asyncio.to_thread(call_store, url, 'list_sensors', {}, str(tmp_path / "other.duckdb"))
+        finally:
+            server.close()
+            await persistence.close()
+
+    asyncio.run(run())
+
+
+def test_call_store_without_a_collector(db_path):
+    with pytest.raises(OSError):
+        call_store("http://127.0.0.1:9", 'list_sensors', {}, db_path, timeout=1.0)
+
+
+def _post(url, body, headers):
+    request = urllib.request.Request(f"{url}/call", data=body, headers=headers, method='POST')
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def test_rejects_requests_a_browser_could_forge(db_path):
+    async def run():
+        persistence = PersistenceQueue(lambda: DataStore(db_path))
+        await persistence.start()
+        server = StoreServer(persistence, db_path, port=0).start()
+        url = f"http://127.0.0.1:{server.port}"
+        body = json.dumps({'method': 'adjust_setpoint', 'kwargs': {'delta': 5.0},
+                           'db_path': os.path.realpath(db_path)}).encode()
+        try:
+            def post(headers):
+                return asyncio.to_thread(_post, url, body, headers)
+
+            # a cross-site "simple" request
+            assert await post({'Content-Type': 'text/plain'}) == 415
+            # a DNS-rebound page reaches the port under its own host name
+            assert await post({'Content-Type': 'application/json', 'Host': 'evil.example:8766'}) == 403
+            assert await post({'Content-Type': 'application/json', 'Host': f'localhost:{server.port}'}) == 200
+
+            with pytest.raises(StoreRequestError, match="keyword arguments"):
+                await asyncio.to_thread(call_store, url, 'read_range', {'format': 'tuples'}, db_path)
+            with pytest.raises(StoreRequestError, match="keyword arguments"):
+                await asyncio.to_thread(call_store, url, 'adjust_setpoint', {'delta': 1.0, 'unknown': 1}, db_path)
+
+            setpoint, _ = await asyncio.to_thread(call_store, url, 'get_setpoint', {}, db_path)
+            assert setpoint == DEFAULT_SETPOINT + 5.0
+        finally:
+            server.close()
+            await persistence.close()
+
+    asyncio.run(run())
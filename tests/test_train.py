@@ -0,0 +1,52 @@
+"""Feature exports are refreshed when the database changes; normalization sees training windows only."""
+
+import numpy as np
+
+from data_store import DataStore
+from dataset import HvacDataset
+from features import FeaturePipeline
+from train import ensure_features, time_folds
+
+
+def _write_readings(db_path, start, count):
+    with DataStore(db_path) as store:
+        timestamps = start + 60.0 * np.arange(count)
+        store.write_packets(timestamps, np.full(count, 21.0), np.full(count, 40), ['a'] * count)
+
+
+def test_ensure_features_reexports_when_the_database_changes(db_path, tmp_path):
+    features = str(tmp_path / "features")
+    pipeline = FeaturePipeline(60, lags=(), windows=(), calendar=False, dew_point=False, actions=False)
+    _write_readings(db_path, 1_700_000_000.0, 100)
+
+    assert ensure_features(db_path, features, pipeline)
+    assert not ensure_features(db_path, features, pipeline)
+
+    _write_readings(db_path, 1_700_000_000.0 + 6000, 10)
+    assert ensure_features(db_path, features, pipeline)
+    assert not ensure_features(db_path, features, pipeline)
+
+    # the same export path fed from another database
+    other = str(tmp_path / "other.duckdb")
+    _write_readings(other, 1_700_000_000.0, 110)
+    assert ensure_features(other, features, pipeline)
+
+
+def test_normalization_comes_from_the_training_windows(db_path, tmp_path):
+    features = str(tmp_path / "features")
+    pipeline = FeaturePipeline(60, lags=(), windows=(), calendar=False, dew_point=False, actions=False)
+    with DataStore(db_path) as store:
+        # a steady rise: later (validation) steps are warmer than any training step
+        timestamps = 1_700_000_000.0 + 60.0 * np.arange(400)
+        store.write_packets(timestamps, 15.0 + 0.05 * np.arange(400), np.full(400, 40), ['a'] * 400)
+    ensure_features(db_path, features, pipeline)
+    dataset = HvacDataset(features, history=10, horizon=5)
+
+    train_index, val_index = time_folds(dataset, 3)[0]
+    mean, std = dataset.statistics(train_index)
+    starts = np.asarray(dataset.starts)[train_index]
+    rows = np.unique((starts[:, None] + np.arange(15)).ravel())
+    np.testing.assert_allclose(mean, dataset.features[rows].mean(axis=0), rtol=1e-5)
+    target = dataset.target_column
+    np.testing.assert_allclose(std[target], dataset.features[rows, target].std(), rtol=1e-4)
+    assert mean[target] < dataset.mean[target]
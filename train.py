@@ -1,11 +1,297 @@
-from model import Temp_Predictor
+#!/usr/bin/env python3
+"""
+Train Temp_Predictor on readings stored in DuckDB (CPU).
+
+Readings are exported once to memory-mapped files (see dataset.py) and
+served as sliding windows. The last part of every sensor's history is
+held out for validation, training stops early once the validation loss
+stops improving, and the best model is checkpointed together with
+everything needed to use it (window sizes, columns, normalization).
+
+    python train.py --db hvac_data.duckdb
+    python train.py --epochs 50 --batch-size 512 --workers 2 --history 30 --horizon 5
+"""
+
+import argparse
+import os
+import random
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
 import torch
-import torch.nn as nn
-from torch.utils.data import DataLoader
+from torch.utils.data import DataLoader, Subset
+
+from dataset import (DatabaseLocked, HvacDataset, collate_windows, export_features, load_meta, median_interval,
+                     source_state)
+from features import FeaturePipeline
+from model import Temp_Predictor, make_loss, make_optimizer
+
+
+def seed_everything(seed: int) -> torch.Generator:
+    """Seed Python, NumPy and torch and make torch kernels deterministic."""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+    torch.use_deterministic_algorithms(True)
+    return torch.Generator().manual_seed(seed)
+
+
+def _seed_worker(worker_id: int) -> None:
+    # DataLoader workers derive their seed from the loader's generator
+    worker_seed = torch.initial_seed() % 2 ** 32
+    np.random.seed(worker_seed)
+    random.seed(worker_seed)
+
+
+def time_split(dataset: HvacDataset, val_fraction: float) -> Tuple[np.ndarray, np.ndarray]:
+    """Window indices for training and validation.
+
+    The last val_fraction of each sensor's steps is held out; training
+    windows end before that point and validation windows start after it,
+    so no step is seen by both.
+    """
+    starts = np.asarray(dataset.starts)
+    length = dataset.history + dataset.horizon
+    sensor_first = np.array([sensor['start_row'] for sensor in dataset.meta['sensors']])
+    sensor_rows = np.array([sensor['rows'] for sensor in dataset.meta['sensors']])
+    split_row = (sensor_first + np.floor(sensor_rows * (1 - val_fraction))).astype(np.int64)
+    window_split = split_row[np.searchsorted(sensor_first, starts, side='right') - 1]
+    return np.flatnonzero(starts + length <= window_split), np.flatnonzero(starts >= window_split)
+
+
+def ensure_features(db_path: str, path: str, pipeline: FeaturePipeline, reexport: bool = False) -> bool:
+    """Export features to path unless it already holds an export of the same pipeline and database state.
+
+    The export is current if it was made from the same database file with
+    the same number of readings and actions and the same newest timestamps
+    (see dataset.source_state). If the database is locked by a running
+    collector, an existing export of the same pipeline is used as it is.
+
+    Returns:
+        True if the features were exported
+    """
+    if not reexport:
+        try:
+            meta = load_meta(path)
+        except (OSError, ValueError):
+            # missing, or written with an older schema
+            meta = None
+        if meta is not None and meta['pipeline'] == pipeline.config():
+            try:
+                if meta.get('source') == source_state(db_path):
+                    return False
+            except (DatabaseLocked, FileNotFoundError) as e:
+                print(f"⚠️  Using the existing features in {path} without checking that they are current: {e}")
+                return False
+    print(f"📦 Exporting features from {db_path} at {pipeline.resolution:g}s resolution...")
+    export_features(db_path, path, pipeline.resolution, pipeline=pipeline)
+    return True
+
+
+def _pipeline(args) -> FeaturePipeline:
+    return FeaturePipeline(args.resolution, args.lags, args.windows)
+
+
+def prepare_dataset(args) -> Optional[HvacDataset]:
+    """Export (if needed) and open the windowed dataset, adapting to small databases."""
+    ensure_features(args.db, args.features, _pipeline(args), args.reexport)
+
+    dataset = HvacDataset(args.features, args.history, args.horizon, max_missing=args.max_missing)
+    if len(dataset) == 0:
+        # too little history for one window at this resolution: try the sensors' own interval
+        interval = median_interval(args.db)
+        if interval > 0 and 2 * interval < args.resolution:
+            args.resolution = float(f"{2 * interval:.3g}")
+            print(f"⚠️  No complete windows; re-exporting at {args.resolution:g}s (twice the median reading interval)")
+            ensure_features(args.db, args.features, _pipeline(args))
+            dataset = HvacDataset(args.features, args.history, args.horizon, max_missing=args.max_missing)
+    if len(dataset) == 0:
+        longest = max((sensor['rows'] for sensor in load_meta(args.features)['sensors']), default=0)
+        if 1 < longest < args.history + args.horizon:
+            args.horizon = min(args.horizon, max(1, longest // 3))
+            args.history = longest - args.horizon
+            print(f"⚠️  Only {longest} steps available; using --history {args.history} --horizon {args.horizon}")
+            dataset = HvacDataset(args.features, args.history, args.horizon, max_missing=args.max_missing)
+    return dataset if len(dataset) else None
+
+
+def time_folds(dataset: HvacDataset, folds: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+    """Forward-chaining cross-validation folds over every sensor's history.
+
+    Each sensor's steps are cut into folds + 1 equal segments. Fold i
+    trains on segments 0..i and validates on segment i + 1, so a model is
+    always validated on time after everything it was trained on, and no
+    window crosses the boundary between the two.
+    """
+    starts = np.asarray(dataset.starts)
+    length = dataset.history + dataset.horizon
+    sensor_first = np.array([sensor['start_row'] for sensor in dataset.meta['sensors']])
+    sensor_rows = np.array([sensor['rows'] for sensor in dataset.meta['sensors']])
+    sensor = np.searchsorted(sensor_first, starts, side='right') - 1
+    result = []
+    for fold in range(1, folds + 1):
+        train_end = (sensor_first + np.floor(sensor_rows * fold / (folds + 1))).astype(np.int64)[sensor]
+        val_end = (sensor_first + np.floor(sensor_rows * (fold + 1) / (folds + 1))).astype(np.int64)[sensor]
+        result.append((np.flatnonzero(starts + length <= train_end),
+                       np.flatnonzero((starts >= train_end) & (starts + length <= val_end))))
+    return result
+
+
+def make_loaders(dataset: HvacDataset, train_index: np.ndarray, val_index: np.ndarray,
+                 batch_size: int, workers: int, generator: torch.Generator):
+    """Shuffled training and ordered validation loaders (None without validation windows)."""
+    loader_options = dict(
+        batch_size=batch_size,
+        num_workers=workers,
+        persistent_workers=workers > 0,
+        pin_memory=torch.cuda.is_available(),
+        worker_init_fn=_seed_worker,
+        collate_fn=collate_windows,
+    )
+    train_loader = DataLoader(Subset(dataset, train_index), shuffle=True, generator=generator, **loader_options)
+    val_loader = DataLoader(Subset(dataset, val_index), shuffle=False, **loader_options) if len(val_index) else None
+    return train_loader, val_loader
+
+
+def evaluate(model, loader, loss_fn) -> float:
+    model.eval()
+    total, count = 0.0, 0
+    with torch.inference_mode():
+        for x, y in loader:
+            total += loss_fn(model(x), y).item() * len(x)
+            count += len(x)
+    return total / max(count, 1)
+
+
+def fit(model, train_loader, val_loader, lr: float, epochs: int, patience: int, min_delta: float,
+        on_improvement: Optional[Callable] = None, verbose: bool = True) -> Dict[str, float]:
+    """Train with early stopping on the validation loss (the training loss without validation).
+
+    on_improvement(epoch, loss, optimizer) is called whenever the loss improves.
+
+    Returns:
+        Dict with best_loss, best_epoch, epochs (run) and samples_per_second
+    """
+    optimizer = make_optimizer(model, lr)
+    loss_fn = make_loss()
+    best_loss, best_epoch, stale_epochs = float('inf'), 0, 0
+    total_samples, total_seconds, epoch = 0, 0.0, 0
+    for epoch in range(1, epochs + 1):
+        model.train()
+        epoch_started = time.perf_counter()
+        total_loss, samples = 0.0, 0
+        for x, y in train_loader:
+            optimizer.zero_grad(set_to_none=True)
+            loss = loss_fn(model(x), y)
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(x)
+            samples += len(x)
+        elapsed = time.perf_counter() - epoch_started
+        total_samples, total_seconds = total_samples + samples, total_seconds + elapsed
+        train_loss = total_loss / max(samples, 1)
+        val_loss = evaluate(model, val_loader, loss_fn) if val_loader is not None else train_loss
+
+        if verbose:
+            print(f"📈 Epoch {epoch:3d}: train {train_loss:.4f}  val {val_loss:.4f}  "
+                  f"{samples / elapsed:,.0f} samples/s  {elapsed:.2f}s")
+
+        if val_loss < best_loss - min_delta:
+            best_loss, best_epoch, stale_epochs = val_loss, epoch, 0
+            if on_improvement is not None:
+                on_improvement(epoch, val_loss, optimizer)
+        else:
+            stale_epochs += 1
+            if stale_epochs >= patience:
+                if verbose:
+                    print(f"⏹️  Early stop: no improvement for {patience} epochs")
+                break
+    return {
+        'best_loss': best_loss,
+        'best_epoch': best_epoch,
+        'epochs': epoch,
+        'samples_per_second': total_samples / total_seconds if total_seconds else 0.0,
+    }
+
+
+def train(args) -> Optional[str]:
+    """Run the training loop, return the checkpoint path (None if there was no data)."""
+    generator = seed_everything(args.seed)
+    dataset = prepare_dataset(args)
+    if dataset is None:
+        print("📭 Not enough readings to build a single training window")
+        return None
+
+    train_index, val_index = time_split(dataset, args.val_fraction)
+    if len(train_index) == 0:
+        # tiny databases: train on everything and stop on the training loss
+        train_index, val_index = np.arange(len(dataset)), np.empty(0, dtype=np.int64)
+    print(f"🧮 {len(train_index):,} training and {len(val_index):,} validation windows "
+          f"(history {args.history}, horizon {args.horizon}, {len(dataset.columns)} features)")
+
+    train_loader, val_loader = make_loaders(dataset, train_index, val_index, args.batch_size, args.workers, generator)
+    model = Temp_Predictor(in_features=len(dataset.columns), history=args.history,
+                           target_index=dataset.target_column, hidden=args.hidden)
+    # from the training windows only: the validation steps stay unseen
+    model.set_normalization(*dataset.statistics(train_index))
 
+    def save_checkpoint(epoch, val_loss, optimizer):
+        torch.save({
+            'model_state': model.state_dict(),
+            'optimizer_state': optimizer.state_dict(),
+            'epoch': epoch,
+            'val_loss': val_loss,
+            'config': {
+                'in_features': len(dataset.columns),
+                'history': args.history,
+                'horizon': args.horizon,
+                'target_index': dataset.target_column,
+                'hidden': args.hidden,
+                'columns': dataset.columns,
+                'resolution': dataset.meta['resolution'],
+                'pipeline': dataset.meta['pipeline'],
+                'seed': args.seed,
+            },
+        }, args.checkpoint)
 
+    os.makedirs(os.path.dirname(args.checkpoint) or '.', exist_ok=True)
+    training_started = time.perf_counter()
+    result = fit(model, train_loader, val_loader, args.lr, args.epochs, args.patience, args.min_delta,
+                 on_improvement=save_checkpoint)
 
+    print(f"⏱️  Training took {time.perf_counter() - training_started:.2f}s")
+    print(f"💾 Best model (epoch {result['best_epoch']}, loss {result['best_loss']:.4f}) saved to {args.checkpoint}")
+    return args.checkpoint
 
 
+def main():
+    parser = argparse.ArgumentParser(description="Train the temperature predictor")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'HVAC_Data.duckdb'), help="DuckDB database file")
+    parser.add_argument('--features', default='features', help="directory of the exported features")
+    parser.add_argument('--reexport', action='store_true', help="export the features again even if present")
+    parser.add_argument('--resolution', type=float, default=60, help="seconds per step")
+    parser.add_argument('--history', type=int, default=30, help="steps of history per window")
+    parser.add_argument('--horizon', type=int, default=5, help="steps ahead to predict")
+    parser.add_argument('--max-missing', type=int, default=0, help="gap steps tolerated per window")
+    parser.add_argument('--lags', type=int, nargs='*', default=[1, 5, 15], help="lagged temperature features, in steps")
+    parser.add_argument('--windows', type=int, nargs='*', default=[15, 60], help="rolling mean/slope features, in steps")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--lr', type=float, default=0.01)
+    parser.add_argument('--hidden', type=int, default=0, help="width of a hidden ReLU layer, 0 for the linear model")
+    parser.add_argument('--workers', type=int, default=0, help="DataLoader worker processes")
+    parser.add_argument('--val-fraction', type=float, default=0.2, help="share of each sensor's history held out")
+    parser.add_argument('--patience', type=int, default=3, help="epochs without improvement before stopping")
+    parser.add_argument('--min-delta', type=float, default=1e-4, help="smallest loss decrease counted as improvement")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--checkpoint', default='checkpoints/temp_predictor.pt')
+    try:
+        train(parser.parse_args())
+    except (DatabaseLocked, FileNotFoundError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
 
 
+if __name__ == "__main__":
+    main()
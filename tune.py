@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Hyperparameter search for Temp_Predictor with time-series cross-validation.
+
+Every combination of the grid is trained on each forward-chaining fold
+(see train.time_folds) and scored by its validation loss averaged over the
+folds. A trial, one combination on one fold, is the unit of work handed
+to a process pool; each worker limits torch to `threads` intra-op threads
+so that processes × threads matches the machine's cores instead of every
+process starting a thread per core.
+
+The features are exported from DuckDB once (and reused by later runs
+while the export is current), and the window index for every history
+length is built before the pool starts, so trials only memory-map files
+that all workers share through the page cache.
+
+    python tune.py --db hvac_data.duckdb --history 15 30 60 --hidden 0 16 --lr 0.01 0.003 --folds 3
+"""
+
+import argparse
+import csv
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import torch
+
+from dataset import DatabaseLocked, HvacDataset, window_starts
+from features import FeaturePipeline
+from model import Temp_Predictor
+from train import ensure_features, fit, make_loaders, seed_everything, time_folds
+
+# grid parameters, all keyword arguments of run_trial's params
+GRID_PARAMETERS = ('history', 'hidden', 'lr', 'batch_size')
+
+
+def _init_worker(threads: int) -> None:
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+
+def run_trial(features: str, params: Dict, fold: int, folds: int, horizon: int = 5,
+              max_missing: int = 0, epochs: int = 20, patience: int = 3,
+              min_delta: float = 1e-4, seed: int = 0) -> Dict[str, float]:
+    """Train one combination on one cross-validation fold.
+
+    Returns:
+        Dict with the fold's best validation loss, best epoch, epochs run,
+        window counts, seconds and training throughput
+    """
+    generator = seed_everything(seed)
+    dataset = HvacDataset(features, params['history'], horizon, max_missing=max_missing)
+    train_index, val_index = time_folds(dataset, folds)[fold]
+    result = {'fold': fold, 'train_windows': len(train_index), 'val_windows': len(val_index)}
+    if len(train_index) == 0 or len(val_index) == 0:
+        return {**result, 'val_loss': float('nan'), 'best_epoch': 0, 'epochs': 0,
+                'seconds': 0.0, 'samples_per_second': 0.0}
+
+    train_loader, val_loader = make_loaders(dataset, train_index, val_index, params['batch_size'], 0, generator)
+    model = Temp_Predictor(in_features=len(dataset.columns), history=params['history'],
+                           target_index=dataset.target_column, hidden=params['hidden'])
+    # from the fold's training windows only: the validation steps stay unseen
+    model.set_normalization(*dataset.statistics(train_index))
+    started = time.perf_counter()
+    fitted = fit(model, train_loader, val_loader, params['lr'], epochs, patience, min_delta, verbose=False)
+    return {**result, 'val_loss': fitted['best_loss'], 'best_epoch': fitted['best_epoch'],
+            'epochs': fitted['epochs'], 'seconds': time.perf_counter() - started,
+            'samples_per_second': fitted['samples_per_second']}
+
+
+def tune(features: str, grid: Dict[str, Sequence], folds: int = 3, horizon: int = 5,
+         max_missing: int = 0, epochs: int = 20, patience: int = 3, min_delta: float = 1e-4,
+         seed: int = 0, processes: Optional[int] = None, threads: int = 1) -> List[Dict[str, float]]:
+    """Cross-validate every combination of a grid across a process pool.
+
+    Args:
+        features: Exported feature directory (see dataset.export_features)
+        grid: Parameter name -> values for each of GRID_PARAMETERS
+        folds: Forward-chaining folds per combination
+        processes: Worker processes, defaults to the CPU count divided by threads
+        threads: torch intra-op threads per worker
+
+    Returns:
+        One dictionary per combination with its parameters, mean and
+        standard deviation of the validation loss, per-fold losses, mean
+        best epoch and total training seconds, best combination first
+    """
+    names = list(GRID_PARAMETERS)
+    combinations = [dict(zip(names, values)) for values in itertools.product(*(grid[name] for name in names))]
+    # built once here: workers would otherwise race to write the same cache files
+    for history in sorted({params['history'] for params in combinations}):
+        window_starts(features, history + horizon, max_missing)
+
+    trials = [(index, fold) for index in range(len(combinations)) for fold in range(folds)]
+    processes = max(1, min(processes or (os.cpu_count() or 1) // max(threads, 1), len(trials)))
+    options = dict(folds=folds, horizon=horizon, max_missing=max_missing, epochs=epochs,
+                   patience=patience, min_delta=min_delta, seed=seed)
+
+    results: Dict[tuple, Dict[str, float]] = {}
+    if processes == 1:
+        _init_worker(threads)
+        for index, fold in trials:
+            results[index, fold] = run_trial(features, combinations[index], fold, **options)
+    else:
+        # spawned rather than forked: torch's thread pools do not survive a fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(processes, mp_context=context, initializer=_init_worker,
+                                 initargs=(threads,)) as pool:
+            futures = {pool.submit(run_trial, features, combinations[index], fold, **options): (index, fold)
+                       for index, fold in trials}
+            for done, future in enumerate(as_completed(futures), 1):
+                results[futures[future]] = future.result()
+                if done % max(len(trials) // 10, 1) == 0 or done == len(trials):
+                    print(f"   {done}/{len(trials)} trials done")
+
+    rows = []
+    for index, params in enumerate(combinations):
+        fold_results = [results[index, fold] for fold in range(folds)]
+        losses = np.array([result['val_loss'] for result in fold_results])
+        scored = losses[~np.isnan(losses)]
+        rows.append({
+            **params,
+            'mean_val_loss': float(scored.mean()) if len(scored) else float('nan'),
+            'std_val_loss': float(scored.std()) if len(scored) else float('nan'),
+            **{f'fold_{fold}_loss': float(loss) for fold, loss in enumerate(losses)},
+            'mean_best_epoch': float(np.mean([result['best_epoch'] for result in fold_results])),
+            'seconds': float(sum(result['seconds'] for result in fold_results)),
+        })
+    rows.sort(key=lambda row: (np.isnan(row['mean_val_loss']), row['mean_val_loss']))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cross-validated hyperparameter search for the temperature predictor")
+    parser.add_argument('--db', default=os.getenv('DB_PATH', 'HVAC_Data.duckdb'), help="DuckDB database file")
+    parser.add_argument('--features', default='features', help="directory of the exported features")
+    parser.add_argument('--reexport', action='store_true', help="export the features again even if current")
+    parser.add_argument('--resolution', type=float, default=60, help="seconds per step")
+    parser.add_argument('--lags', type=int, nargs='*', default=[1, 5, 15], help="lagged temperature features, in steps")
+    parser.add_argument('--windows', type=int, nargs='*', default=[15, 60], help="rolling mean/slope features, in steps")
+    parser.add_argument('--horizon', type=int, default=5, help="steps ahead to predict")
+    parser.add_argument('--max-missing', type=int, default=0, help="gap steps tolerated per window")
+    parser.add_argument('--history', type=int, nargs='+', default=[15, 30, 60], help="steps of history per window")
+    parser.add_argument('--hidden', type=int, nargs='+', default=[0, 16], help="hidden layer widths, 0 for linear")
+    parser.add_argument('--lr', type=float, nargs='+', default=[0.01, 0.003])
+    parser.add_argument('--batch-size', type=int, nargs='+', default=[256])
+    parser.add_argument('--folds', type=int, default=3, help="forward-chaining cross-validation folds")
+    parser.add_argument('--epochs', type=int, default=20)
+    parser.add_argument('--patience', type=int, default=3, help="epochs without improvement before stopping")
+    parser.add_argument('--min-delta', type=float, default=1e-4, help="smallest loss decrease counted as improvement")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--processes', type=int, default=None)
+    parser.add_argument('--threads', type=int, default=1, help="torch threads per worker process")
+    parser.add_argument('--output', default=None, help="write all results to this CSV file")
+    args = parser.parse_args()
+
+    try:
+        ensure_features(args.db, args.features, FeaturePipeline(args.resolution, args.lags, args.windows),
+                        args.reexport)
+    except (DatabaseLocked, FileNotFoundError) as e:
+        print(f"❌ {e}")
+        raise SystemExit(1)
+    grid = {'history': args.history, 'hidden': args.hidden, 'lr': args.lr, 'batch_size': args.batch_size}
+    combinations = int(np.prod([len(values) for values in grid.values()]))
+    print(f"🔬 {combinations} combinations × {args.folds} folds")
+
+    started = time.perf_counter()
+    rows = tune(args.features, grid, args.folds, args.horizon, args.max_missing, args.epochs, args.patience,
+                args.min_delta, args.seed, args.processes, args.threads)
+    print(f"⏱️  {len(rows) * args.folds} trials done in {time.perf_counter() - started:.2f}s")
+
+    print(f"{'history':>7} {'hidden':>6} {'lr':>8} {'batch':>6} {'val loss':>9} {'± std':>8} {'epoch':>6} {'secs':>7}")
+    for row in rows[:10]:
+        print(f"{row['history']:>7} {row['hidden']:>6} {row['lr']:>8.4g} {row['batch_size']:>6} "
+              f"{row['mean_val_loss']:>9.4f} {row['std_val_loss']:>8.4f} {row['mean_best_epoch']:>6.1f} "
+              f"{row['seconds']:>7.1f}")
+
+    if args.output and rows:
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"💾 Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()